@@ -8,22 +8,37 @@ AI航班规划模块
 import json
 import os
 from typing import List, Dict, Tuple, Optional
-from collections import defaultdict, deque
+from collections import defaultdict
 from openai import OpenAI
 import re
+from flight_dataset import get_flight_dataset, on_dataset_swap
+from flight_timetable import (FlightTimetable, Itinerary, SearchBounds, MAX_STOPS, itinerary_cost,
+                              meet_in_the_middle)
+from airport_distances import get_airport_distances
+from flight_reachability import get_flight_reachability
+
+# 推荐路线数（交给AI分析和界面展示的候选路线）
+ROUTE_CANDIDATES = 10
 
 class FlightPlanner:
-    def __init__(self, flights_data: List[Dict], openai_api_key: str = None, openai_base_url: str = None):
+    def __init__(self, flights_data: Optional[List[Dict]] = None, openai_api_key: str = None, openai_base_url: str = None):
         """
         初始化航班规划器
         
         Args:
-            flights_data: 航班数据列表
+            flights_data: 航班数据列表，如果为None则使用共享的航班数据快照（数据热加载后自动切换）
             openai_api_key: OpenAI API密钥，如果为None则从环境变量获取
             openai_base_url: OpenAI API基础URL，如果为None则使用默认值
         """
-        self.flights = flights_data
+        self.flights = flights_data if flights_data is not None else get_flight_dataset().flights
         self.flight_graph = self._build_flight_graph()
+        # 反向索引：到达各机场的航班（多段路线从两端同时扩展）
+        self.arrival_graph = self._build_arrival_graph()
+        # 每段航班的飞行时间按机场间大圆距离估算
+        self.distances = get_airport_distances()
+        self.timetable = FlightTimetable(self.flights, block_minutes=self.distances.block_minutes)
+        # 机场两两之间最少中转次数，不可达时不启动搜索
+        self.reachability = get_flight_reachability(self.flights)
         
         # 设置OpenAI API
         api_key = openai_api_key or os.getenv('OPENAI_API_KEY')
@@ -34,93 +49,139 @@ class FlightPlanner:
         
         # 初始化OpenAI客户端
         self.client = OpenAI(api_key=api_key, base_url=base_url)
+
+        # 初始化成功后再注册，避免初始化失败的实例仍被数据集切换回调引用
+        if flights_data is None:
+            on_dataset_swap(self._on_dataset_swapped)
     
-    def _build_flight_graph(self) -> Dict[str, List[Dict]]:
+    def _build_flight_graph(self, flights=None) -> Dict[str, List[Dict]]:
         """
         构建航班网络图
         返回格式: {机场名: [从该机场出发的航班列表]}
         """
         graph = defaultdict(list)
-        for flight in self.flights:
+        for flight in (self.flights if flights is None else flights):
             departure = flight['起飞机场']
             graph[departure].append(flight)
         return dict(graph)
     
-    def find_all_routes(self, start_airport: str, end_airport: str, max_stops: int = 2) -> List[List[Dict]]:
+    def _build_arrival_graph(self, flights=None) -> Dict[str, List[Dict]]:
+        """
+        构建到达航班索引
+        返回格式: {机场名: [到达该机场的航班列表]}
+        """
+        graph = defaultdict(list)
+        for flight in (self.flights if flights is None else flights):
+            arrival = flight['降落机场']
+            graph[arrival].append(flight)
+        return dict(graph)
+    
+    def _on_dataset_swapped(self, old_dataset, dataset):
+        """
+        数据集切换后在后台重建航班网络图，构建完成后再替换，查询中的请求不受影响
+
+        时刻表和可达矩阵都需要全量重建，网络图同样一次性全量重建（增量更新与完整加载处理相同）
         """
-        查找从起点到终点的所有可能路线
+        if dataset is not get_flight_dataset():
+            return
+        flights = dataset.flights
+        graph = self._build_flight_graph(flights)
+        arrival_graph = self._build_arrival_graph(flights)
+        distances = get_airport_distances(dataset.airport_coords)
+        timetable = FlightTimetable(flights, block_minutes=distances.block_minutes)
+        reachability = get_flight_reachability(flights)
+        (self.flights, self.flight_graph, self.arrival_graph, self.distances, self.timetable,
+         self.reachability) = flights, graph, arrival_graph, distances, timetable, reachability
+        print(f"✈️ 航班网络图已切换到数据版本 {dataset.version}")
+    
+    def search_itineraries(self, start_airport: str, end_airport: str, max_stops: int = 2) -> List[Itinerary]:
+        """
+        查找考虑起飞时间和班期的可行行程（连接扫描，见 FlightTimetable.search）
         
         Args:
             start_airport: 起飞机场
             end_airport: 目标机场
-            max_stops: 最大中转次数
+            max_stops: 最大中转次数（0为直飞，最多 MAX_STOPS 次）
             
         Returns:
-            所有可能路线的列表，每个路线是一个航班列表
+            行程列表，按中转次数、总耗时排序
         """
-        if start_airport not in self.flight_graph:
+        max_stops = _normalize_max_stops(max_stops)
+        bounds = self._search_bounds(start_airport, end_airport, max_stops)
+        if bounds is None:
             return []
+        return self.timetable.search(start_airport, end_airport, max_stops, bounds=bounds)
+    
+    def _search_bounds(self, start_airport: str, end_airport: str, max_stops: int) -> Optional[SearchBounds]:
+        """
+        从起点沿航班网络图、从终点沿到达航班索引各扩展一半航段数，在中间机场会合（见 meet_in_the_middle），
+        得到的航段数下界用来剪枝；max_stops 次中转内不可达时返回None
+        """
+        flight_graph, arrival_graph = self.flight_graph, self.arrival_graph
+        return meet_in_the_middle(
+            start_airport, end_airport, max_stops + 1,
+            lambda airport: [flight['降落机场'] for flight in flight_graph.get(airport, ())],
+            lambda airport: [flight['起飞机场'] for flight in arrival_graph.get(airport, ())]
+        )
+    
+    def find_all_routes(self, start_airport: str, end_airport: str, max_stops: int = 2) -> List[List[Dict]]:
+        """
+        查找从起点到终点的可行路线
         
-        all_routes = []
-        queue = deque([(start_airport, [], 0)])  # (当前机场, 已飞路线, 中转次数)
-        visited = set()
+        每条路线都能按班期和起飞时间衔接（满足最短转机时间），
+        同一出发时刻只保留最早到达的航班组合
         
-        while queue:
-            current_airport, current_route, stops = queue.popleft()
-            
-            # 如果到达目标机场
-            if current_airport == end_airport and current_route:
-                all_routes.append(current_route)
-                continue
-            
-            # 如果中转次数超过限制
-            if stops >= max_stops:
-                continue
-            
-            # 避免循环
-            route_key = (current_airport, stops)
-            if route_key in visited:
-                continue
-            visited.add(route_key)
-            
-            # 查找从当前机场出发的所有航班
-            available_flights = self.flight_graph.get(current_airport, [])
+        Args:
+            start_airport: 起飞机场
+            end_airport: 目标机场
+            max_stops: 最大中转次数
             
-            for flight in available_flights:
-                next_airport = flight['降落机场']
-                new_route = current_route + [flight]
-                queue.append((next_airport, new_route, stops + 1))
-        
-        return all_routes
+        Returns:
+            路线列表，每个路线是一个航班列表
+        """
+        # 取当前时刻表的引用，数据热加载不影响本次查询
+        timetable = self.timetable
+        max_stops = _normalize_max_stops(max_stops)
+        bounds = self._search_bounds(start_airport, end_airport, max_stops)
+        if bounds is None:
+            return []
+        itineraries = timetable.search(start_airport, end_airport, max_stops, bounds=bounds)
+        return [[timetable.flights[flight_id] for flight_id in itinerary.flight_ids] for itinerary in itineraries]
     
+    def find_best_routes(self, start_airport: str, end_airport: str, max_stops: int = 2,
+                         k: int = ROUTE_CANDIDATES) -> List[List[Dict]]:
+        """
+        代价最低的前K条路线（见 FlightTimetable.best_itineraries，代价综合总耗时、中转次数和转机等待）
+        
+        Args:
+            start_airport: 起飞机场
+            end_airport: 目标机场
+            max_stops: 最大中转次数
+            k: 路线数
+            
+        Returns:
+            路线列表，按代价从低到高排序
+        """
+        timetable = self.timetable
+        max_stops = _normalize_max_stops(max_stops)
+        bounds = self._search_bounds(start_airport, end_airport, max_stops)
+        if bounds is None:
+            return []
+        itineraries = timetable.best_itineraries(start_airport, end_airport, k, max_stops, bounds=bounds)
+        return [[timetable.flights[flight_id] for flight_id in itinerary.flight_ids] for itinerary in itineraries]
     
     def _is_valid_connection(self, flight1: Dict, flight2: Dict) -> bool:
         """
-        检查两个航班是否可以连接（考虑时间间隔）
+        检查两个航班是否可以连接（机场相接，某天的班次满足最短转机时间和最长等待时间）
         """
-        # 简单的时间检查：第二个航班起飞时间应该晚于第一个航班降落时间
-        # 这里简化处理，实际应该考虑机场间转机时间
-        return True
+        return self.timetable.is_valid_connection(flight1, flight2)
     
     def filter_valid_routes(self, routes: List[List[Dict]]) -> List[List[Dict]]:
         """
-        过滤出有效的路线（考虑时间合理性）
+        过滤出有效的路线（整条路线能按班期和转机时间依次衔接）
         """
-        valid_routes = []
-        
-        for route in routes:
-            is_valid = True
-            
-            # 检查每个连接是否合理
-            for i in range(len(route) - 1):
-                if not self._is_valid_connection(route[i], route[i + 1]):
-                    is_valid = False
-                    break
-            
-            if is_valid:
-                valid_routes.append(route)
-        
-        return valid_routes
+        timetable = self.timetable
+        return [route for route in routes if timetable.evaluate(route) is not None]
     
     def get_route_summary(self, route: List[Dict]) -> Dict:
         """
@@ -133,19 +194,28 @@ class FlightPlanner:
         airports = [route[0]['起飞机场']] + [flight['降落机场'] for flight in route]
         unique_airports = list(set(airports))
         
-        # 计算总飞行时间（简化计算）
-        total_duration = 0
-        for flight in route:
-            # 这里简化处理，实际应该根据机场坐标计算飞行时间
-            total_duration += 120  # 假设每个航班2小时
+        # 飞行时间按机场间距离估算（缺少坐标的航段按默认时间）
+        timetable, distances = self.timetable, self.distances
+        flight_duration = distances.route_block_minutes(route)
         
-        return {
+        summary = {
             'total_flights': total_flights,
             'total_airports': len(unique_airports),
             'route_airports': airports,
-            'estimated_duration': total_duration,
+            'estimated_duration': flight_duration,
+            'flight_duration': flight_duration,
+            'distance_km': distances.route_distance(route),
             'stops': total_flights - 1
         }
+        
+        # 能按班期衔接时，总耗时包含转机等待
+        itinerary = timetable.evaluate(route)
+        if itinerary is not None:
+            schedule = timetable.describe(itinerary)
+            summary.update(schedule)
+            summary['estimated_duration'] = schedule['total_minutes']
+            summary['cost'] = itinerary_cost(itinerary)
+        return summary
     
     def ai_optimize_routes(self, routes: List[List[Dict]], user_preferences: str = "") -> List[Dict]:
         """
@@ -163,7 +233,7 @@ class FlightPlanner:
         
         # 准备路线数据给AI分析
         route_data = []
-        for i, route in enumerate(routes[:10]):  # 限制前10条路线给AI分析
+        for i, route in enumerate(routes[:ROUTE_CANDIDATES]):  # 限制前10条路线给AI分析
             summary = self.get_route_summary(route)
             route_info = {
                 'route_id': i + 1,
@@ -228,7 +298,7 @@ class FlightPlanner:
 - 总航班数: {route_info['summary']['total_flights']}
 - 中转次数: {route_info['summary']['stops']}
 - 涉及机场: {', '.join(route_info['summary']['route_airports'])}
-- 航班详情:
+{_format_distance_line(route_info['summary'])}{_format_schedule_line(route_info['summary'])}- 航班详情:
 """
             for flight in route_info['flights']:
                 prompt += f"  * {flight['航班号']}: {flight['起飞机场']} → {flight['降落机场']} ({flight['起飞时间']}, {flight['班期']})\n"
@@ -281,14 +351,19 @@ class FlightPlanner:
         """
         AI API失败时的备用排序方法
         """
-        # 按中转次数和总航班数排序
-        sorted_routes = sorted(route_data, key=lambda x: (x['summary']['stops'], x['summary']['total_flights']))
+        # 按路线代价（总耗时、中转次数、转机等待）排序，不能按班期衔接的路线排在最后
+        sorted_routes = sorted(route_data, key=lambda x: (x['summary'].get('cost', float('inf')),
+                                                          x['summary']['stops'], x['summary']['total_flights']))
         
         recommendations = []
         for i, route in enumerate(sorted_routes[:5]):  # 返回前5条
+            reason = f"中转{route['summary']['stops']}次，共{route['summary']['total_flights']}个航班"
+            if 'total_minutes' in route['summary']:
+                hours, minutes = divmod(route['summary']['total_minutes'], 60)
+                reason += f"，总耗时{hours}小时{minutes}分"
             recommendations.append({
                 'route_id': route['route_id'],
-                'reason': f"中转{route['summary']['stops']}次，共{route['summary']['total_flights']}个航班",
+                'reason': reason,
                 'priority': i + 1
             })
         
@@ -307,24 +382,24 @@ class FlightPlanner:
         Returns:
             规划结果字典
         """
-        # 查找所有可能路线
-        all_routes = self.find_all_routes(start_airport, end_airport, max_stops)
-        
-        if not all_routes:
+        # 先查可达性矩阵，中转次数内不可达时直接返回
+        min_stops = self.reachability.min_stops(start_airport, end_airport)
+        if min_stops is None or min_stops > _normalize_max_stops(max_stops):
+            reason = f'{MAX_STOPS}次中转内无法到达' if min_stops is None else f'最少需要中转{min_stops}次'
             return {
                 'success': False,
-                'message': f'未找到从 {start_airport} 到 {end_airport} 的路线',
+                'message': f'未找到从 {start_airport} 到 {end_airport} 的路线（{reason}）',
                 'routes': [],
                 'recommendations': []
             }
         
-        # 过滤有效路线
-        valid_routes = self.filter_valid_routes(all_routes)
+        # 代价最低的前K条可行路线（不再枚举所有路线）
+        valid_routes = self.find_best_routes(start_airport, end_airport, max_stops)
         
         if not valid_routes:
             return {
                 'success': False,
-                'message': '未找到有效的飞行路线',
+                'message': f'未找到从 {start_airport} 到 {end_airport} 的路线',
                 'routes': [],
                 'recommendations': []
             }
@@ -334,8 +409,31 @@ class FlightPlanner:
         
         return {
             'success': True,
-            'message': f'找到 {len(valid_routes)} 条可能的路线',
+            'message': f'找到 {len(valid_routes)} 条推荐路线',
             'routes': valid_routes,
             'recommendations': recommendations,
             'total_routes': len(valid_routes)
         }
+
+def _normalize_max_stops(max_stops) -> int:
+    """界面滑块可能传入浮点数，限制在 0..MAX_STOPS"""
+    return max(0, min(int(max_stops), MAX_STOPS))
+
+def _format_distance_line(summary: Dict) -> str:
+    """AI提示中的航程和飞行时间"""
+    hours, minutes = divmod(summary['flight_duration'], 60)
+    distance = f"{summary['distance_km']:.0f}公里，" if summary.get('distance_km') is not None else ''
+    return f"- 航程: {distance}飞行约{hours}小时{minutes}分\n"
+
+def _format_schedule_line(summary: Dict) -> str:
+    """AI提示中的出发星期和总耗时（路线不能按班期衔接时为空）"""
+    if 'weekday_names' not in summary:
+        return ''
+    hours, minutes = divmod(summary['total_minutes'], 60)
+    waits = '、'.join(f"{wait // 60}小时{wait % 60}分" for wait in summary['wait_minutes'])
+    arrival = summary['arrival_time'] + (f"（+{summary['arrival_day_offset']}天）" if summary['arrival_day_offset'] else '')
+    line = (f"- 可出发: {' '.join(summary['weekday_names'])}，{summary['departure_time']} 起飞，{arrival} 到达\n"
+            f"- 总耗时: {hours}小时{minutes}分")
+    if waits:
+        line += f"（转机等待 {waits}）"
+    return line + "\n"
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+机场距离矩阵与飞行时间模型
+用NumPy按机场坐标一次性计算所有机场两两之间的大圆距离，再换算为轮挡时间（滑行 + 巡航），
+结果按机场坐标缓存（坐标更新后自动重算），路线评分时每段航班只需一次数组查找
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from flight_table import FIELD_ARRIVAL, FIELD_DEPARTURE
+from flight_timetable import DEFAULT_BLOCK_MINUTES
+
+EARTH_RADIUS_KM = 6371.0
+
+# 轮挡时间 = 滑行及起降耗时 + 距离 / 巡航速度，按5分钟取整
+TAXI_MINUTES = 30
+CRUISE_SPEED_KMH = 800
+BLOCK_ROUNDING_MINUTES = 5
+MIN_BLOCK_MINUTES = 45
+
+
+def haversine_matrix(coords):
+    """
+    两两大圆距离
+
+    Args:
+        coords: 形状 (n, 2) 的 [纬度, 经度] 数组（度）
+
+    Returns:
+        形状 (n, n) 的距离数组（公里）
+    """
+    import numpy as np
+
+    coords = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    lat = coords[:, 0][:, None]
+    lon = coords[:, 1][:, None]
+    a = (np.sin((lat - lat.T) / 2) ** 2
+         + np.cos(lat) * np.cos(lat.T) * np.sin((lon - lon.T) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def block_minutes_for_distance(distances):
+    """由距离（公里，标量或数组）估算轮挡时间（分钟）"""
+    import numpy as np
+
+    minutes = TAXI_MINUTES + np.asarray(distances, dtype=np.float64) / CRUISE_SPEED_KMH * 60
+    minutes = np.round(minutes / BLOCK_ROUNDING_MINUTES) * BLOCK_ROUNDING_MINUTES
+    return np.maximum(minutes, MIN_BLOCK_MINUTES).astype(np.int32)
+
+
+class AirportDistances:
+    """
+    机场距离矩阵
+
+    Args:
+        airport_coords: 机场坐标 {机场: [纬度, 经度]}
+    """
+
+    def __init__(self, airport_coords: Dict[str, List[float]]):
+        import numpy as np
+
+        self.airport_coords = airport_coords
+        self.airports = [airport for airport, coords in airport_coords.items()
+                         if coords is not None and len(coords) == 2]
+        self.index = {airport: position for position, airport in enumerate(self.airports)}
+        coords = np.array([airport_coords[airport] for airport in self.airports], dtype=np.float64)
+        self.distances_km = haversine_matrix(coords).astype(np.float32)
+        self.block_minutes_matrix = block_minutes_for_distance(self.distances_km)
+        self.distances_km.setflags(write=False)
+        self.block_minutes_matrix.setflags(write=False)
+        # 逐段查询用的Python列表（比逐个索引NumPy数组快）
+        self._distance_rows = self.distances_km.tolist()
+        self._block_rows = self.block_minutes_matrix.tolist()
+
+    def __len__(self) -> int:
+        return len(self.airports)
+
+    def distance(self, departure: str, arrival: str) -> Optional[float]:
+        """两机场间的大圆距离（公里），缺少坐标时返回None"""
+        i, j = self.index.get(departure), self.index.get(arrival)
+        if i is None or j is None:
+            return None
+        return self._distance_rows[i][j]
+
+    def block_minutes(self, departure: str, arrival: str) -> int:
+        """两机场间的估算飞行时间（分钟），缺少坐标时为 DEFAULT_BLOCK_MINUTES"""
+        i, j = self.index.get(departure), self.index.get(arrival)
+        if i is None or j is None:
+            return DEFAULT_BLOCK_MINUTES
+        return self._block_rows[i][j]
+
+    def route_distance(self, route: Sequence[Dict]) -> Optional[float]:
+        """路线总距离（公里），有航段缺少坐标时返回None"""
+        total = 0.0
+        for flight in route:
+            distance = self.distance(flight[FIELD_DEPARTURE], flight[FIELD_ARRIVAL])
+            if distance is None:
+                return None
+            total += distance
+        return total
+
+    def route_block_minutes(self, route: Sequence[Dict]) -> int:
+        """路线各段飞行时间之和（分钟）"""
+        return sum(self.block_minutes(flight[FIELD_DEPARTURE], flight[FIELD_ARRIVAL]) for flight in route)
+
+    def get_stats(self) -> Dict:
+        return {
+            'airports': len(self.airports),
+            'bytes': int(self.distances_km.nbytes + self.block_minutes_matrix.nbytes)
+        }
+
+
+class AirportDistanceCache:
+    """按机场坐标缓存的距离矩阵"""
+
+    def __init__(self):
+        self._coords = None
+        self._distances: Optional[AirportDistances] = None
+        self._lock = threading.Lock()
+
+    def get(self, airport_coords: Dict[str, List[float]]) -> AirportDistances:
+        """
+        获取距离矩阵
+
+        Args:
+            airport_coords: 机场坐标（数据集更新坐标后为新对象，矩阵随之重算）
+        """
+        with self._lock:
+            if airport_coords is not self._coords or self._distances is None:
+                self._distances = AirportDistances(airport_coords)
+                self._coords = airport_coords
+                print(f"📏 机场距离矩阵: {len(self._distances)} 个机场")
+            return self._distances
+
+    def clear(self):
+        with self._lock:
+            self._coords = None
+            self._distances = None
+
+    def get_stats(self):
+        distances = self._distances
+        return distances.get_stats() if distances is not None else {'airports': 0, 'bytes': 0}
+
+
+# 全局距离矩阵缓存实例
+_airport_distance_cache = AirportDistanceCache()
+
+def get_airport_distance_cache() -> AirportDistanceCache:
+    """获取距离矩阵缓存实例"""
+    return _airport_distance_cache
+
+def get_airport_distances(airport_coords: Optional[Dict[str, List[float]]] = None) -> AirportDistances:
+    """获取机场距离矩阵（默认使用当前航班数据集的机场坐标）"""
+    if airport_coords is None:
+        from flight_dataset import get_flight_dataset
+        airport_coords = get_flight_dataset().airport_coords
+    return _airport_distance_cache.get(airport_coords)
@@ -13,18 +13,33 @@ Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查
 """
 
 import gradio as gr
-from utils import create_route_network_chart,create_airport_bubble_chart,create_airport_distribution_map,load_flight_data, get_unique_airports, query_flights, create_flight_map, create_stats_chart, get_cached_tab_map, beautify_schedule, force_clear_all_caches
+from utils import create_route_network_chart,create_airport_bubble_chart,create_airport_distribution_map, get_unique_airports, query_flights_with_explain, create_flight_map, create_stats_chart, get_cached_tab_map, beautify_schedule, force_clear_all_caches, get_product_category_choices, flights_to_table_rows, normalize_flight_query, get_cached_render, get_system_stats, WEEKDAY_CHOICES, DEPARTURE_TIME_CHOICES
 from app_resource_manager import get_app_global_resources_html
 from ai_planner import FlightPlanner
+from flight_dataset import get_flight_dataset, start_dataset_watcher
+from flight_reachability import get_flight_reachability
+from flight_timetable import MAX_STOPS
+from map_data import enable_map_data_endpoint, create_map_data_router
+from static_assets import enable_static_assets, create_static_assets_router
 import os
 import base64
 
+if __name__ == "__main__":
+    # 直接运行时挂载地图数据接口，地图外壳和叠加层数据通过接口加载（须在创建界面前启用）
+    enable_map_data_endpoint()
+    # 前端库使用本地静态资源，不依赖第三方CDN
+    enable_static_assets()
+
 
 
-# 加载航班数据
-flights = load_flight_data(r'data/hainan_plus_flights.jsonl')
+# 加载航班数据（共享只读快照，地图、统计和AI规划器使用同一份数据）
+flight_dataset = get_flight_dataset()
+flights = flight_dataset.flights
 departure_airports, arrival_airports = get_unique_airports(flights)
 
+# 监视数据文件，变化后在后台重新加载并切换快照
+start_dataset_watcher()
+
 # 清理地图缓存，确保新的CDN配置生效
 force_clear_all_caches()
 
@@ -40,7 +55,7 @@ try:
         api_key = "sk-"
         base_url = "https://api.siliconflow.cn/v1"
     
-    planner = FlightPlanner(flights, api_key, base_url)
+    planner = FlightPlanner(openai_api_key=api_key, openai_base_url=base_url)
     ai_available = True
     print(f"✅ AI规划器初始化成功，使用API: {base_url}")
 except Exception as e:
@@ -477,48 +492,45 @@ footer.gradio-footer-custom {{
 }}
 """
 
-def update_all(dep, arr, cat):
+def update_all(dep, arr, cat, weekday=None, time_from=None, time_to=None):
     """统一更新查询结果、地图和统计图"""
     # Clean inputs
     dep = dep.strip() if dep else ""
     arr = arr.strip() if arr else ""
+    weekday = weekday.strip() if weekday else ""
+    time_from = time_from.strip() if time_from else ""
+    time_to = time_to.strip() if time_to else ""
+    
+    # 本次请求固定使用当前数据快照
+    dataset = get_flight_dataset()
+    flights = dataset.flights
     
     # Query flights
-    if not dep and not arr:
+    if not dep and not arr and not weekday and not time_from and not time_to:
         # 如果没有选择机场，显示所有航班（限制数量以避免性能问题）
         results = flights[:100]  # 显示前100个航班作为示例
         message = f"🗺️ 显示所有航班示例（前100条），请选择机场进行精确查询"
     else:
         # 有选择机场时，进行精确查询
-        results = query_flights(flights, dep if dep else None, arr if arr else None, None, cat if cat else None)
+        results, explain = query_flights_with_explain(flights, dep or None, arr or None, None, cat or None,
+                                                      weekday or None, time_from or None, time_to or None)
+        if explain:
+            print(f"🔍 索引查询: 候选集 {explain['candidates']}，结果 {explain['result_count']} 条，耗时 {explain['elapsed_us']}μs")
         if len(results) == 0:
             message = f"⚠️ 未找到符合条件的航班，请尝试其他机场组合"
         else:
             message = f"✅ 查询完成，找到 {len(results)} 条航班记录"
     
     # Convert results to array format for Dataframe
-    if results:
-        array_results = []
-        for flight in results:
-            row = [flight['航班号'], flight['起飞机场'], flight['降落机场'], 
-                   flight['起飞时间'], beautify_schedule(flight['班期']), flight['适用产品']]
-            array_results.append(row)
-    else:
-        array_results = []
+    array_results = flights_to_table_rows(results) if results else []
     
     # Create map and stats (使用缓存优化)
-    from utils import _map_cache
-    
-    # 生成缓存键
-    cache_key = f"flight_map_{hash(str(results))}"
-    
-    # 检查地图缓存
-    if cache_key in _map_cache:
-        map_html = _map_cache[cache_key]
+    # 规范化的查询条件唯一确定结果；缓存记录起降机场，增量更新时只失效涉及的机场
+    if not (dep or arr or weekday or time_from or time_to):
+        query = {'sample': 100}
     else:
-        map_html = create_flight_map(results)
-        # 缓存地图HTML
-        _map_cache[cache_key] = map_html
+        query = normalize_flight_query(dep, arr, cat, weekday, time_from, time_to)
+    map_html = get_cached_render('flight_map', query, lambda: create_flight_map(results, query, dataset), dataset, airports=(dep, arr))
     
     stats_plot = create_stats_chart(results if results else None)
     return array_results, map_html, stats_plot, gr.update(visible=True, value=message)
@@ -526,24 +538,20 @@ def update_all(dep, arr, cat):
 def clear_all():
     """清空所有输入和输出"""
     # Convert sample flights to array format
-    sample_flights = flights[:100]
-    array_sample = []
-    for flight in sample_flights:
-        row = [flight['航班号'], flight['起飞机场'], flight['降落机场'], 
-               flight['起飞时间'], beautify_schedule(flight['班期']), flight['适用产品']]
-        array_sample.append(row)
+    dataset = get_flight_dataset()
+    sample_flights = dataset.flights[:100]
+    array_sample = flights_to_table_rows(sample_flights)
     
     # 使用缓存优化
-    from utils import _map_cache
-    cache_key = "flight_map_default"
-    
-    if cache_key in _map_cache:
-        map_html = _map_cache[cache_key]
-    else:
-        map_html = create_flight_map(sample_flights)
-        _map_cache[cache_key] = map_html
+    map_html = get_cached_render('flight_map', {'sample': 100}, lambda: create_flight_map(sample_flights, {'sample': 100}, dataset), dataset)
     
-    return None, None, None, array_sample, map_html, create_stats_chart(None)
+    return None, None, None, None, None, None, array_sample, map_html, create_stats_chart(None)
+def update_product_facets(dep, arr):
+    """根据当前起降机场更新会员类型选项中的航班数"""
+    dep = dep.strip() if dep else None
+    arr = arr.strip() if arr else None
+    return gr.update(choices=get_product_category_choices(get_flight_dataset().flights, dep, arr))
+
 def clear_departure():
     """清除起飞机场选择"""
     return gr.update(value=None)
@@ -552,6 +560,23 @@ def clear_arrival():
     """清除降落机场选择"""
     return gr.update(value=None)
 
+def update_ai_reachability(start_airport, end_airport):
+    """AI规划：选好起降机场后在目标机场下方提示最少中转次数（查可达性矩阵）"""
+    start_airport = start_airport.strip() if start_airport else None
+    end_airport = end_airport.strip() if end_airport else None
+    if not start_airport or not end_airport:
+        return gr.update(info="选择您的目标机场")
+    if start_airport == end_airport:
+        return gr.update(info="⚠️ 起飞机场和目标机场相同")
+    min_stops = get_flight_reachability().min_stops(start_airport, end_airport)
+    if min_stops is None:
+        info = f"⚠️ {MAX_STOPS}次中转内无法到达"
+    elif min_stops == 0:
+        info = "✈️ 有直飞航班"
+    else:
+        info = f"🔄 最少需要中转{min_stops}次"
+    return gr.update(info=info)
+
 def ai_plan_route(start_airport, end_airport, preferences, max_stops):
     """AI路线规划"""
     if not ai_available or not planner:
@@ -944,13 +969,35 @@ with gr.Blocks(css=css, theme=gr.themes.Soft()) as demo:
                     
                     with gr.Row():
                         product_category = gr.Dropdown(
-                            choices=["666", "2666", "666/2666"],
+                            choices=get_product_category_choices(flights, "成都天府"),
                             label="会员类型（选填）",
                             allow_custom_value=True,
-                            info="选择会员类型",
+                            info="选择会员类型（括号内为当前机场条件下的航班数）",
                             value="666/2666"
                         )
 
+                    with gr.Row():
+                        weekday_filter = gr.Dropdown(
+                            choices=WEEKDAY_CHOICES,
+                            label="执飞日期（选填）",
+                            info="只显示该星期执飞的航班",
+                            value=""
+                        )
+
+                    with gr.Row():
+                        time_from_filter = gr.Dropdown(
+                            choices=DEPARTURE_TIME_CHOICES,
+                            label="最早起飞（选填）",
+                            allow_custom_value=True,
+                            value=None
+                        )
+                        time_to_filter = gr.Dropdown(
+                            choices=DEPARTURE_TIME_CHOICES,
+                            label="最晚起飞（选填）",
+                            allow_custom_value=True,
+                            value=None
+                        )
+
                     with gr.Row():
                         submit_button = gr.Button("🔍 查询航班", variant="primary", size="lg")
                         clear_button = gr.Button("🗑️ 清空", variant="secondary")
@@ -961,6 +1008,7 @@ with gr.Blocks(css=css, theme=gr.themes.Soft()) as demo:
                         > - 可以只选择降落机场查看所有到达该机场的航班
                         > - 也可以同时选择两个机场查看特定航线
                         > - 会员类型为选填项
+                        > - 可按执飞日期和起飞时间段筛选，如周五 6:00–10:00
                         """)
                     
                 with gr.Column(scale=2):
@@ -1007,7 +1055,7 @@ with gr.Blocks(css=css, theme=gr.themes.Soft()) as demo:
                         
                         with gr.Tab("🗺️ 航班路线图"):
                             map_output = gr.HTML(
-                                value=create_flight_map(flights[:100]),  # 初始显示前100个航班
+                                value=get_cached_render('flight_map', {'sample': 100}, lambda: create_flight_map(flights[:100], {'sample': 100})),  # 初始显示前100个航班
                                 label="航班地图",
                                 show_label=True
                             )
@@ -1051,13 +1099,26 @@ with gr.Blocks(css=css, theme=gr.themes.Soft()) as demo:
     # 事件绑定
     submit_button.click(
         update_all,
-        inputs=[departure_airport, arrival_airport, product_category],
+        inputs=[departure_airport, arrival_airport, product_category, weekday_filter, time_from_filter, time_to_filter],
         outputs=[output, map_output, stats_output]
     )
     
     clear_button.click(
         clear_all,
-        outputs=[departure_airport, arrival_airport, product_category, output, map_output, stats_output]
+        outputs=[departure_airport, arrival_airport, product_category, weekday_filter, time_from_filter, time_to_filter,
+                 output, map_output, stats_output]
+    )
+
+    departure_airport.change(
+        update_product_facets,
+        inputs=[departure_airport, arrival_airport],
+        outputs=[product_category]
+    )
+
+    arrival_airport.change(
+        update_product_facets,
+        inputs=[departure_airport, arrival_airport],
+        outputs=[product_category]
     )
 
     dep_clear_btn.click(
@@ -1071,6 +1132,18 @@ with gr.Blocks(css=css, theme=gr.themes.Soft()) as demo:
     )
     
     # AI规划功能事件绑定
+    ai_start_airport.change(
+        update_ai_reachability,
+        inputs=[ai_start_airport, ai_end_airport],
+        outputs=[ai_end_airport]
+    )
+    
+    ai_end_airport.change(
+        update_ai_reachability,
+        inputs=[ai_start_airport, ai_end_airport],
+        outputs=[ai_end_airport]
+    )
+    
     ai_plan_button.click(
         ai_plan_route,
         inputs=[ai_start_airport, ai_end_airport, ai_preferences, ai_max_stops],
@@ -1107,13 +1180,20 @@ with gr.Blocks(css=css, theme=gr.themes.Soft()) as demo:
     )
 
 if __name__ == "__main__":
+    import uvicorn
+    from fastapi import FastAPI
 
-    
-    # 启动 Gradio
-    demo.launch(
-        server_name="0.0.0.0",
-        server_port=7171,
-        share=False,
+    # 启动 Gradio（与地图数据接口、本地静态资源挂载在同一个服务上）
+    server = FastAPI()
+    server.include_router(create_map_data_router())
+    server.include_router(create_static_assets_router())
+    # 运行状态（数据集、各级缓存、CDN改写和本地资源统计）
+    server.add_api_route('/status.json', get_system_stats, methods=['GET'])
+    server = gr.mount_gradio_app(
+        server,
+        demo,
+        path="/",
         show_error=True,
         allowed_paths=["data"]
     )
+    uvicorn.run(server, host="0.0.0.0", port=7171)
@@ -7,7 +7,12 @@
 
 import uuid
 from typing import Dict, Set
-from cdn_replacer import optimize_html_for_china
+from cdn_replacer import get_map_html_rewriter
+from static_assets import get_local_asset_url
+from html_minifier import minify_html
+
+# 地图容器模板中地图iframe的位置
+_MAP_HTML_SLOT = '__APP_MAP_HTML__'
 
 class AppResourceManager:
     """应用级资源管理器"""
@@ -16,6 +21,7 @@ class AppResourceManager:
         self._global_resources_loaded = False
         self._global_resources_html = None
         self._loaded_maps = set()
+        self._container_templates: Dict[tuple, str] = {}
         
     def get_global_resources_html(self) -> str:
         """获取全局资源HTML（只生成一次）"""
@@ -25,21 +31,18 @@ class AppResourceManager:
         # 全局资源ID
         global_id = "app_global_resources"
         
-        # 共享的CDN资源（使用中国可访问的CDN）
+        # 共享的CDN资源（使用中国可访问的CDN，启用本地静态资源后已下载的改为本地地址）
         resources = [
             ('https://cdn.bootcdn.net/ajax/libs/leaflet/1.9.3/leaflet.js', 'script'),
             ('https://cdn.bootcdn.net/ajax/libs/leaflet/1.9.3/leaflet.css', 'style'),
             ('https://cdn.bootcdn.net/ajax/libs/jquery/3.7.1/jquery.min.js', 'script'),
-            ('https://cdn.bootcdn.net/ajax/libs/twitter-bootstrap/5.2.2/js/bootstrap.bundle.min.js', 'script'),
-            ('https://cdn.bootcdn.net/ajax/libs/twitter-bootstrap/5.2.2/css/bootstrap.min.css', 'style'),
-            ('https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.min.js', 'script'),
-            ('https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.css', 'style'),
-            ('https://cdn.bootcdn.net/ajax/libs/bootstrap/3.0.0/css/bootstrap-glyphicons.css', 'style')
+            ('https://cdn.bootcdn.net/ajax/libs/twitter-bootstrap/5.2.2/css/bootstrap.min.css', 'style')
         ]
         
         # 生成资源HTML
         resource_html = []
         for url, resource_type in resources:
+            url = get_local_asset_url(url)
             if resource_type == 'script':
                 resource_html.append(f'<script src="{url}" defer></script>')
             elif resource_type == 'style':
@@ -276,7 +279,7 @@ class AppResourceManager:
         创建优化的地图HTML，使用全局资源
         
         Args:
-            map_obj: Folium地图对象
+            map_obj: Folium地图对象或叠加层地图（create_base_map 创建）
             map_type: 地图类型（用于生成唯一ID）
             width: 地图宽度
             height: 地图高度
@@ -284,28 +287,49 @@ class AppResourceManager:
         Returns:
             优化后的地图HTML字符串
         """
-        # 生成固定ID（基于地图类型）
-        map_id = f"app_map_{map_type}"
+        map_shell = getattr(map_obj, 'map_shell', None)
+        if map_shell is not None:
+            # 叠加层地图：底图外壳已预先渲染并做过CDN优化，只渲染叠加层
+            map_html = map_shell.render(map_obj)
+        else:
+            # 获取原始地图HTML
+            map_html = map_obj._repr_html_()
+            
+            # 一遍完成：CDN替换为中国可访问的CDN、移除信任属性和重复的资源引用
+            map_html = get_map_html_rewriter().rewrite(map_html).html
         
-        # 获取原始地图HTML
-        map_html = map_obj._repr_html_()
+        return self.create_map_container_html(map_html, map_type, width, height)
+    
+    def create_map_container_html(self, map_html: str, map_type="map", width="100%", height="500px") -> str:
+        """
+        把地图iframe HTML包装到应用地图容器中
         
-        # 处理信任相关问题（简化版本）
-        import re
-        map_html = re.sub(r'data-notebook-trusted="[^"]*"', '', map_html)
-        map_html = re.sub(r'data-notebook-trusted', '', map_html)
+        Args:
+            map_html: 地图iframe HTML（已做CDN优化）
+            map_type: 地图类型（用于生成唯一ID）
+        """
+        map_id = f"app_map_{map_type}"
         
-        # 优化CDN资源为中国可访问的CDN
-        map_html = optimize_html_for_china(map_html)
+        # 创建优化的HTML结构（容器模板按参数压缩一次，地图HTML已压缩）
+        template_key = (map_id, width, height)
+        template = self._container_templates.get(template_key)
+        if template is None:
+            template = minify_html(self._build_container_template(map_id, width, height))
+            self._container_templates[template_key] = template
+        optimized_html = template.replace(_MAP_HTML_SLOT, map_html, 1)
         
-        # 移除重复的资源引用
-        map_html = self._remove_duplicate_resources(map_html)
+        # 标记资源已加载
+        self._global_resources_loaded = True
+        self._loaded_maps.add(map_id)
         
-        # 创建优化的HTML结构
-        optimized_html = f"""
+        return optimized_html
+    
+    def _build_container_template(self, map_id: str, width: str, height: str) -> str:
+        """地图容器模板，地图iframe位置为 _MAP_HTML_SLOT"""
+        return f"""
         <div id="{map_id}" class="app-map-container" 
              style="width: {width}; height: {height}; border: 1px solid #ddd; border-radius: 5px; position: relative; overflow: hidden;">
-            {map_html}
+            {_MAP_HTML_SLOT}
         </div>
         
         <script>
@@ -357,34 +381,6 @@ class AppResourceManager:
         }}
         </style>
         """
-        
-        # 标记资源已加载
-        self._global_resources_loaded = True
-        self._loaded_maps.add(map_id)
-        
-        return optimized_html
-    
-    def _remove_duplicate_resources(self, html_content: str) -> str:
-        """移除所有资源引用，因为全局资源已在应用级别加载"""
-        import re
-        
-        # 要移除的所有资源模式（完全移除，因为全局资源已加载）
-        resource_patterns = [
-            r'<script[^>]*src=["\'][^"\']*leaflet[^"\']*["\'][^>]*></script>',
-            r'<link[^>]*href=["\'][^"\']*leaflet[^"\']*["\'][^>]*>',
-            r'<script[^>]*src=["\'][^"\']*jquery[^"\']*["\'][^>]*></script>',
-            r'<script[^>]*src=["\'][^"\']*bootstrap[^"\']*["\'][^>]*></script>',
-            r'<link[^>]*href=["\'][^"\']*bootstrap[^"\']*["\'][^>]*>',
-            r'<script[^>]*src=["\'][^"\']*awesome-markers[^"\']*["\'][^>]*></script>',
-            r'<link[^>]*href=["\'][^"\']*awesome-markers[^"\']*["\'][^>]*>',
-            r'<link[^>]*href=["\'][^"\']*bootstrap-glyphicons[^"\']*["\'][^>]*>'
-        ]
-        
-        # 移除所有资源引用
-        for pattern in resource_patterns:
-            html_content = re.sub(pattern, '', html_content, flags=re.IGNORECASE)
-        
-        return html_content
 
 # 全局应用资源管理器实例
 _app_resource_manager = AppResourceManager()
@@ -409,6 +405,10 @@ def create_optimized_map_html_app(map_obj, map_type="map", width="100%", height=
     # 创建地图HTML（不包含全局资源，因为全局资源在应用级别加载）
     return _app_resource_manager.create_optimized_map_html(map_obj, map_type, width, height)
 
+def create_map_container_html_app(map_html: str, map_type="map", width="100%", height="500px") -> str:
+    """把地图iframe HTML（如从地图数据接口加载的外壳）包装到应用地图容器中"""
+    return _app_resource_manager.create_map_container_html(map_html, map_type, width, height)
+
 def get_app_global_resources_html() -> str:
     """获取应用全局资源HTML"""
     return _app_resource_manager.get_global_resources_html()
@@ -2,11 +2,16 @@
 # -*- coding: utf-8 -*-
 """
 CDN替换工具
-将国外CDN替换为中国可访问的CDN或本地资源
+将国外CDN替换为中国可访问的CDN或本地资源。
+URL替换、重复资源移除和信任属性清理编译为一个正则，对HTML只扫描一遍，
+iframe srcdoc 中转义过的URL直接按转义形式匹配，不再解码再编码。
+启用本地静态资源（static_assets）后，已下载到本地的库直接改写为本地地址
 """
 
+import html
 import re
-from typing import Dict, List, Tuple
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 # 中国可访问的CDN映射
 CHINA_CDN_MAPPING = {
@@ -44,9 +49,172 @@ BACKUP_CDN_MAPPING = {
     'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css': 'https://cdn.bootcdn.net/ajax/libs/leaflet/1.9.3/leaflet.css',
 }
 
+# 全局资源已在应用级别加载，地图HTML中引用这些库的标签可以移除
+DUPLICATE_RESOURCE_KEYWORDS = ('leaflet', 'jquery', 'bootstrap', 'awesome-markers')
+
+# CDN加载失败处理脚本（插入到</body>前）
+CDN_FALLBACK_SCRIPT = """
+    <script>
+    // CDN加载失败处理
+    function handleCDNError() {
+        console.warn('CDN资源加载失败，尝试使用备用资源');
+        // 这里可以添加备用资源加载逻辑
+    }
+    
+    // 监听资源加载错误
+    document.addEventListener('error', function(e) {
+        if (e.target.tagName === 'SCRIPT' || e.target.tagName === 'LINK') {
+            console.warn('资源加载失败:', e.target.src || e.target.href);
+            handleCDNError();
+        }
+    }, true);
+    </script>
+    """
+
+
+class RewriteResult(NamedTuple):
+    """一次改写的结果和统计"""
+    html: str
+    bytes_before: int
+    bytes_after: int
+    urls_replaced: int
+    resources_removed: int
+    trust_removed: int
+
+
+class HtmlRewriter:
+    """
+    编译好的单遍HTML改写器
+
+    Args:
+        mapping: 原URL -> 新URL，匹配 src="..." / href="..."，以及 srcdoc 中的 src=&quot;...&quot;
+        remove_resources: 移除顶层（未转义）引用 DUPLICATE_RESOURCE_KEYWORDS 的 script/link 标签
+        remove_trust: 移除 data-notebook-trusted 属性
+        before_body: 插入到 </body> 前的内容
+    """
+
+    def __init__(self, mapping: Dict[str, str], remove_resources: bool = False, remove_trust: bool = False,
+                 before_body: Optional[str] = None):
+        self.before_body = before_body
+        # 原URL及其HTML转义形式都映射到对应形式的新URL
+        self._replacements: Dict[str, str] = {}
+        for original_url, new_url in mapping.items():
+            self._replacements[original_url] = new_url
+            self._replacements[html.escape(original_url)] = html.escape(new_url)
+
+        # 每个分支以字面字符开头，re 可以先按首字符跳过不可能匹配的位置；
+        # 分支末尾的空命名组标记匹配到的类型（match.lastgroup）
+        alternatives = []
+        if remove_resources:
+            keywords = '|'.join(re.escape(keyword) for keyword in DUPLICATE_RESOURCE_KEYWORDS)
+            alternatives.append(
+                rf'<(?i:script[^>]*src=["\'][^"\']*(?:{keywords})[^"\']*["\'][^>]*></script>'
+                rf'|link[^>]*href=["\'][^"\']*(?:{keywords})[^"\']*["\'][^>]*>)(?P<resource>)'
+            )
+        if remove_trust:
+            alternatives.append(r'data-notebook-trusted(?:="[^"]*")?(?P<trust>)')
+        if before_body is not None:
+            alternatives.append(r'</body>(?P<body>)')
+        if self._replacements:
+            # 长的URL优先，避免前缀相同的URL提前匹配
+            urls = '|'.join(re.escape(url) for url in sorted(self._replacements, key=len, reverse=True))
+            for attr in ('src', 'href'):
+                alternatives.append(rf'{attr}=(?P<{attr}_quote>"|&quot;)(?P<{attr}_url>{urls})(?P={attr}_quote)(?P<{attr}>)')
+        self._pattern = re.compile('|'.join(alternatives)) if alternatives else None
+
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'bytes_before': 0, 'bytes_after': 0,
+                       'urls_replaced': 0, 'resources_removed': 0, 'trust_removed': 0}
+
+    def rewrite(self, html_content: str) -> RewriteResult:
+        """改写HTML并返回字节数变化和各类改写次数"""
+        bytes_before = len(html_content.encode('utf-8'))
+        counts = {'urls_replaced': 0, 'resources_removed': 0, 'trust_removed': 0}
+        delta = 0
+
+        def replace(match):
+            nonlocal delta
+            text = match.group(0)
+            kind = match.lastgroup
+            if kind == 'src' or kind == 'href':
+                counts['urls_replaced'] += 1
+                quote = match.group(kind + '_quote')
+                result = f'{kind}={quote}{self._replacements[match.group(kind + "_url")]}{quote}'
+            elif kind == 'resource':
+                counts['resources_removed'] += 1
+                result = ''
+            elif kind == 'trust':
+                counts['trust_removed'] += 1
+                result = ''
+            else:
+                result = self.before_body + text
+            delta += len(result.encode('utf-8')) - len(text.encode('utf-8'))
+            return result
+
+        if self._pattern is not None:
+            html_content = self._pattern.sub(replace, html_content)
+        result = RewriteResult(html_content, bytes_before, bytes_before + delta, **counts)
+
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['bytes_before'] += result.bytes_before
+            self._stats['bytes_after'] += result.bytes_after
+            for key, value in counts.items():
+                self._stats[key] += value
+        return result
+
+    def __call__(self, html_content: str) -> str:
+        return self.rewrite(html_content).html
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+def _resolve_mapping(mapping: Dict[str, str], local_mapping: Dict[str, str]) -> Dict[str, str]:
+    """CDN映射叠加本地资源：原地址或替换后的国内CDN地址有本地文件时改为本地地址"""
+    resolved = dict(local_mapping)
+    for original_url, new_url in mapping.items():
+        resolved[original_url] = local_mapping.get(original_url) or local_mapping.get(new_url, new_url)
+    return resolved
+
+def _build_rewriters(local_mapping: Dict[str, str]):
+    global _cdn_rewriter, _backup_cdn_rewriter, _china_rewriter, _map_html_rewriter
+    mapping = _resolve_mapping(CHINA_CDN_MAPPING, local_mapping)
+    _cdn_rewriter = HtmlRewriter(mapping)
+    _backup_cdn_rewriter = HtmlRewriter(_resolve_mapping({**CHINA_CDN_MAPPING, **BACKUP_CDN_MAPPING}, local_mapping))
+    _china_rewriter = HtmlRewriter(mapping, before_body=CDN_FALLBACK_SCRIPT)
+    _map_html_rewriter = HtmlRewriter(mapping, remove_resources=True, remove_trust=True,
+                                      before_body=CDN_FALLBACK_SCRIPT)
+
+# 全局改写器实例（映射表在模块加载时编译一次，启用本地资源时重新编译）
+_build_rewriters({})
+
+def use_local_assets(local_mapping: Dict[str, str]):
+    """
+    使用本地静态资源（由 static_assets.enable_static_assets 调用）
+
+    Args:
+        local_mapping: CDN地址（原地址和国内CDN地址）-> 本地地址
+    """
+    _build_rewriters(local_mapping)
+
+def get_map_html_rewriter() -> HtmlRewriter:
+    """获取地图HTML改写器（CDN替换、移除重复资源和信任属性、插入CDN加载失败处理）"""
+    return _map_html_rewriter
+
+def get_cdn_rewrite_stats() -> Dict[str, Dict[str, int]]:
+    """获取各改写器的累计统计（调用次数、改写前后字节数、各类改写次数）"""
+    return {
+        'cdn': _cdn_rewriter.get_stats(),
+        'backup': _backup_cdn_rewriter.get_stats(),
+        'china': _china_rewriter.get_stats(),
+        'map_html': _map_html_rewriter.get_stats()
+    }
+
 def replace_cdn_urls(html_content: str, use_backup: bool = False) -> str:
     """
-    替换HTML内容中的CDN URL
+    替换HTML内容中的CDN URL（包括iframe srcdoc中转义的URL）
     
     Args:
         html_content: 原始HTML内容
@@ -55,26 +223,7 @@ def replace_cdn_urls(html_content: str, use_backup: bool = False) -> str:
     Returns:
         替换后的HTML内容
     """
-    mapping = CHINA_CDN_MAPPING.copy()
-    if use_backup:
-        mapping.update(BACKUP_CDN_MAPPING)
-    
-    # 替换CDN URL
-    for original_url, new_url in mapping.items():
-        # 替换script标签中的URL
-        html_content = re.sub(
-            rf'src="{re.escape(original_url)}"',
-            f'src="{new_url}"',
-            html_content
-        )
-        # 替换link标签中的URL
-        html_content = re.sub(
-            rf'href="{re.escape(original_url)}"',
-            f'href="{new_url}"',
-            html_content
-        )
-    
-    return html_content
+    return (_backup_cdn_rewriter if use_backup else _cdn_rewriter)(html_content)
 
 def get_cdn_replacements(html_content: str) -> List[Tuple[str, str]]:
     """
@@ -104,29 +253,9 @@ def create_local_assets_html(html_content: str) -> str:
     Returns:
         使用本地资源的HTML内容
     """
-    # 这里可以添加本地资源路径
-    # 目前先使用备用CDN
+    # 启用本地静态资源后已下载的库改为本地地址，其余使用备用CDN
     return replace_cdn_urls(html_content, use_backup=True)
 
-def validate_cdn_accessibility(html_content: str) -> Dict[str, bool]:
-    """
-    验证CDN的可访问性（模拟检查）
-    
-    Args:
-        html_content: HTML内容
-    
-    Returns:
-        CDN可访问性状态字典
-    """
-    # 这里可以添加实际的网络检查
-    # 目前返回模拟结果
-    return {
-        'cdn.jsdelivr.net': False,
-        'unpkg.com': True,
-        'cdn.bootcdn.net': True,
-        'cdnjs.cloudflare.com': False
-    }
-
 def optimize_html_for_china(html_content: str) -> str:
     """
     为中国网络环境优化HTML内容
@@ -137,65 +266,8 @@ def optimize_html_for_china(html_content: str) -> str:
     Returns:
         优化后的HTML内容
     """
-    # 1. 替换CDN URL
-    html_content = replace_cdn_urls(html_content)
-    
-    # 2. 处理iframe中的srcdoc属性
-    html_content = _optimize_iframe_srcdoc(html_content)
-    
-    # 3. 添加CDN加载失败处理
-    cdn_fallback_script = """
-    <script>
-    // CDN加载失败处理
-    function handleCDNError() {
-        console.warn('CDN资源加载失败，尝试使用备用资源');
-        // 这里可以添加备用资源加载逻辑
-    }
-    
-    // 监听资源加载错误
-    document.addEventListener('error', function(e) {
-        if (e.target.tagName === 'SCRIPT' || e.target.tagName === 'LINK') {
-            console.warn('资源加载失败:', e.target.src || e.target.href);
-            handleCDNError();
-        }
-    }, true);
-    </script>
-    """
-    
-    # 在</body>标签前插入错误处理脚本
-    html_content = html_content.replace('</body>', cdn_fallback_script + '</body>')
-    
-    return html_content
-
-def _optimize_iframe_srcdoc(html_content: str) -> str:
-    """
-    优化iframe中的srcdoc属性内容
-    
-    Args:
-        html_content: HTML内容
-    
-    Returns:
-        优化后的HTML内容
-    """
-    import html
-    
-    # 查找iframe的srcdoc属性
-    srcdoc_pattern = r'srcdoc="([^"]*)"'
-    
-    def replace_srcdoc(match):
-        srcdoc_content = match.group(1)
-        # 解码HTML实体
-        decoded_content = html.unescape(srcdoc_content)
-        # 应用CDN替换
-        optimized_content = replace_cdn_urls(decoded_content)
-        # 重新编码HTML实体
-        encoded_content = html.escape(optimized_content, quote=True)
-        return f'srcdoc="{encoded_content}"'
-    
-    # 替换iframe中的srcdoc内容
-    optimized_html = re.sub(srcdoc_pattern, replace_srcdoc, html_content)
-    
-    return optimized_html
+    # 替换CDN URL（包括iframe srcdoc中的），并在</body>前插入CDN加载失败处理脚本
+    return _china_rewriter(html_content)
 
 def get_cdn_statistics(html_content: str) -> Dict[str, int]:
     """
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+航班聚合统计
+每个数据版本计算一次机场起飞/降落/总航班数、航线航班数和按产品代码的分项统计，
+地图和图表统一从这里读取；查询结果等临时子集用NumPy向量化计算
+"""
+
+import threading
+import time
+import weakref
+from collections import Counter
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+from flight_table import FlightTable, FlightRows, parse_product_codes
+
+
+class FlightAggregates:
+    """航班聚合统计结果"""
+
+    def __init__(self, dep_counts: Dict[str, int], arr_counts: Dict[str, int],
+                 route_counts: Dict[Tuple[str, str], int],
+                 dep_product_counts: Dict[str, Dict[str, int]], arr_product_counts: Dict[str, Dict[str, int]],
+                 flight_count: int, build_seconds: float = 0.0):
+        self.dep_counts = dep_counts
+        self.arr_counts = arr_counts
+        self.route_counts = route_counts
+        self.dep_product_counts = dep_product_counts
+        self.arr_product_counts = arr_product_counts
+        self.flight_count = flight_count
+        self.build_seconds = build_seconds
+
+    @classmethod
+    def from_table(cls, table: FlightTable, row_ids: Optional[Iterable[int]] = None) -> 'FlightAggregates':
+        """
+        向量化统计数据表（或其中部分行）
+
+        Args:
+            table: 列式航班数据表
+            row_ids: 参与统计的行号，None表示全部行
+        """
+        import numpy as np
+
+        start = time.perf_counter()
+        departure = table.numpy_column('departure')
+        arrival = table.numpy_column('arrival')
+        product_mask = table.numpy_column('product_mask')
+        if row_ids is not None:
+            rows = np.fromiter(row_ids, dtype=np.int64)
+            departure, arrival, product_mask = departure[rows], arrival[rows], product_mask[rows]
+
+        airport_count = len(table.airports)
+        dep_bins = np.bincount(departure, minlength=airport_count)
+        arr_bins = np.bincount(arrival, minlength=airport_count)
+
+        # 起降机场ID组合为一个整数后一次性计数
+        route_ids, route_bins = np.unique(departure.astype(np.int64) * airport_count + arrival, return_counts=True)
+        route_counts = {
+            (table.airports[int(route_id) // airport_count], table.airports[int(route_id) % airport_count]): int(count)
+            for route_id, count in zip(route_ids, route_bins)
+        }
+
+        dep_product_counts: Dict[str, Dict[str, int]] = {}
+        arr_product_counts: Dict[str, Dict[str, int]] = {}
+        for code_id, code in enumerate(table.product_codes):
+            has_code = ((product_mask >> code_id) & 1).astype(bool)
+            for counts, column in ((dep_product_counts, departure), (arr_product_counts, arrival)):
+                code_bins = np.bincount(column[has_code], minlength=airport_count)
+                for airport_id in np.flatnonzero(code_bins):
+                    counts.setdefault(table.airports[int(airport_id)], {})[code] = int(code_bins[airport_id])
+
+        return cls(
+            dep_counts={table.airports[int(i)]: int(dep_bins[i]) for i in np.flatnonzero(dep_bins)},
+            arr_counts={table.airports[int(i)]: int(arr_bins[i]) for i in np.flatnonzero(arr_bins)},
+            route_counts=route_counts,
+            dep_product_counts=dep_product_counts,
+            arr_product_counts=arr_product_counts,
+            flight_count=len(departure),
+            build_seconds=time.perf_counter() - start
+        )
+
+    @classmethod
+    def from_records(cls, flights: Iterable[Any]) -> 'FlightAggregates':
+        """统计字典（或 [航班号, 起飞机场, 降落机场, ...] 列表）形式的航班记录"""
+        start = time.perf_counter()
+        dep_counts, arr_counts, route_counts = Counter(), Counter(), Counter()
+        dep_product_counts: Dict[str, Counter] = {}
+        arr_product_counts: Dict[str, Counter] = {}
+        flight_count = 0
+        for flight in flights:
+            if isinstance(flight, Mapping):
+                dep, arr, product = flight['起飞机场'], flight['降落机场'], flight.get('适用产品', '')
+            else:
+                dep, arr = flight[1], flight[2]
+                product = flight[5] if len(flight) > 5 else ''
+            flight_count += 1
+            dep_counts[dep] += 1
+            arr_counts[arr] += 1
+            route_counts[(dep, arr)] += 1
+            for code in parse_product_codes(product):
+                dep_product_counts.setdefault(dep, Counter())[code] += 1
+                arr_product_counts.setdefault(arr, Counter())[code] += 1
+        return cls(dict(dep_counts), dict(arr_counts), dict(route_counts),
+                   {airport: dict(counts) for airport, counts in dep_product_counts.items()},
+                   {airport: dict(counts) for airport, counts in arr_product_counts.items()},
+                   flight_count, time.perf_counter() - start)
+
+    def derive(self, old_table: FlightTable, table: FlightTable, changed_rows: Iterable[int]) -> 'FlightAggregates':
+        """
+        基于当前统计为修改后的数据表生成新统计，只调整变化行
+
+        Args:
+            old_table: 当前统计对应的数据表
+            table: 修改后的数据表
+            changed_rows: 内容发生变化的行号（包括新增、删除和被移动的行）
+        """
+        start = time.perf_counter()
+        aggregates = FlightAggregates(
+            dict(self.dep_counts), dict(self.arr_counts), dict(self.route_counts),
+            {airport: dict(counts) for airport, counts in self.dep_product_counts.items()},
+            {airport: dict(counts) for airport, counts in self.arr_product_counts.items()},
+            len(table)
+        )
+        for row_id in set(changed_rows):
+            if row_id < len(old_table):
+                aggregates._add_row(old_table, row_id, -1)
+            if row_id < len(table):
+                aggregates._add_row(table, row_id, 1)
+        aggregates.build_seconds = time.perf_counter() - start
+        return aggregates
+
+    def _add_row(self, table: FlightTable, row_id: int, delta: int):
+        dep = table.airports[table.departure[row_id]]
+        arr = table.airports[table.arrival[row_id]]
+        _add_count(self.dep_counts, dep, delta)
+        _add_count(self.arr_counts, arr, delta)
+        _add_count(self.route_counts, (dep, arr), delta)
+        mask = table.product_mask[row_id]
+        for code_id, code in enumerate(table.product_codes):
+            if mask & (1 << code_id):
+                _add_count(self.dep_product_counts.setdefault(dep, {}), code, delta)
+                _add_count(self.arr_product_counts.setdefault(arr, {}), code, delta)
+        for counts in (self.dep_product_counts, self.arr_product_counts):
+            for airport in (dep, arr):
+                if airport in counts and not counts[airport]:
+                    del counts[airport]
+
+    def dep_count(self, airport: str) -> int:
+        return self.dep_counts.get(airport, 0)
+
+    def arr_count(self, airport: str) -> int:
+        return self.arr_counts.get(airport, 0)
+
+    def total_count(self, airport: str) -> int:
+        """机场起降航班总数"""
+        return self.dep_counts.get(airport, 0) + self.arr_counts.get(airport, 0)
+
+    def airport_stats(self, airport: str) -> Dict[str, int]:
+        dep_count, arr_count = self.dep_count(airport), self.arr_count(airport)
+        return {'dep': dep_count, 'arr': arr_count, 'total': dep_count + arr_count}
+
+    @property
+    def airports(self) -> List[str]:
+        """有航班的机场（按名称排序）"""
+        return sorted(set(self.dep_counts) | set(self.arr_counts))
+
+    def product_counts(self, airport: str, role: str = 'departure') -> Dict[str, int]:
+        """机场各产品代码的航班数（role 为 departure 或 arrival）"""
+        counts = self.dep_product_counts if role == 'departure' else self.arr_product_counts
+        return dict(counts.get(airport, {}))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'flight_count': self.flight_count,
+            'airport_count': len(self.airports),
+            'route_count': len(self.route_counts),
+            'build_seconds': round(self.build_seconds, 4)
+        }
+
+
+def _add_count(counts: Dict, key, delta: int):
+    value = counts.get(key, 0) + delta
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+# 每个数据表（即每个数据版本）对应一份聚合统计，数据表释放时随之释放
+_aggregates_cache: 'weakref.WeakKeyDictionary[FlightTable, FlightAggregates]' = weakref.WeakKeyDictionary()
+_aggregates_lock = threading.Lock()
+
+def register_flight_aggregates(table: FlightTable, aggregates: FlightAggregates):
+    """登记预先计算的聚合统计（如增量更新生成的统计）"""
+    with _aggregates_lock:
+        _aggregates_cache[table] = aggregates
+
+def peek_flight_aggregates(table: FlightTable) -> Optional[FlightAggregates]:
+    """获取已计算的聚合统计，尚未计算时返回None"""
+    return _aggregates_cache.get(table)
+
+def get_table_aggregates(table: FlightTable) -> FlightAggregates:
+    """获取数据表的聚合统计（首次访问时计算）"""
+    aggregates = _aggregates_cache.get(table)
+    if aggregates is None:
+        with _aggregates_lock:
+            aggregates = _aggregates_cache.get(table)
+            if aggregates is None:
+                aggregates = FlightAggregates.from_table(table)
+                _aggregates_cache[table] = aggregates
+    return aggregates
+
+def get_flight_aggregates(flights) -> FlightAggregates:
+    """
+    获取航班集合的聚合统计
+
+    完整数据集读取按版本缓存的统计，查询结果等数据表子集向量化计算，
+    其他形式的航班列表逐条统计
+    """
+    if isinstance(flights, FlightRows):
+        if flights.indices is None:
+            return get_table_aggregates(flights.table)
+        return FlightAggregates.from_table(flights.table, flights.indices)
+    return FlightAggregates.from_records(flights)
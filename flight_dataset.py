@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+航班数据集注册表
+统一加载航班数据为列式数据表，并向查询、地图、统计和AI规划模块提供共享的只读快照，
+数据表、机场坐标和索引从内存映射的二进制快照恢复（见 flight_snapshot.py），
+数据文件变化时在后台重新加载并原子替换快照，增量文件（见 flight_delta.py）在当前快照上增量应用
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+from flight_table import FlightTable, FlightRows
+from flight_snapshot import load_or_build_snapshot, AIRPORT_COORDS_FILE
+from flight_index import get_flight_index
+from flight_delta import DeltaResult, load_delta_file, apply_delta, list_delta_files, delta_version
+
+# 默认航班数据文件
+DEFAULT_FLIGHT_FILE = Path(__file__).parent / 'data' / 'hainan_plus_flights.jsonl'
+
+# 数据文件变化检测间隔（秒），设为0关闭热加载
+DEFAULT_WATCH_INTERVAL = float(os.getenv('FLIGHT_DATA_WATCH_INTERVAL', '5'))
+
+# 增量文件目录名（位于航班数据文件所在目录下，可通过 FLIGHT_DELTA_DIR 指定）
+DELTA_DIR_NAME = 'deltas'
+
+
+class FlightDataset:
+    """航班数据只读快照"""
+
+    def __init__(self, source: str, table: FlightTable, version: str, load_seconds: float,
+                 airport_coords: Optional[Dict[str, List[float]]] = None, snapshot_path: Optional[str] = None,
+                 applied_deltas: Optional[List[Tuple[str, str]]] = None, delta: Optional[DeltaResult] = None):
+        self.source = source
+        self.table = table
+        self.version = version
+        self.load_seconds = load_seconds
+        self.airport_coords = airport_coords or {}
+        self.snapshot_path = snapshot_path
+        # 已应用的增量文件（文件名, 内容摘要），按应用顺序
+        self.applied_deltas = applied_deltas or []
+        # 由上一版本增量生成时为本次增量的结果，完整加载时为None
+        self.delta = delta
+        self.loaded_at = time.time()
+        self.memory_bytes = table.memory_bytes()
+
+    @property
+    def flights(self) -> FlightRows:
+        """字典行视图（兼容原有的航班字典列表用法）"""
+        return self.table.rows()
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取数据集统计信息"""
+        return {
+            'source': self.source,
+            'version': self.version,
+            'flight_count': len(self.table),
+            'airport_count': len(self.table.airports),
+            'load_seconds': round(self.load_seconds, 4),
+            'loaded_at': self.loaded_at,
+            'memory_bytes': self.memory_bytes,
+            'snapshot_path': self.snapshot_path,
+            'applied_deltas': [name for name, _ in self.applied_deltas]
+        }
+
+    def with_delta(self, delta_path) -> 'FlightDataset':
+        """应用增量文件，返回新的数据集快照（当前快照不变）"""
+        start = time.perf_counter()
+        operations, digest = load_delta_file(delta_path)
+        name = Path(delta_path).name
+        table, _, result = apply_delta(self.table, get_flight_index(self.table), operations,
+                                       name=name, digest=digest, base_version=self.version)
+        return FlightDataset(self.source, table, delta_version(self.version, digest),
+                             time.perf_counter() - start, airport_coords=self.airport_coords,
+                             snapshot_path=self.snapshot_path,
+                             applied_deltas=self.applied_deltas + [(name, digest)], delta=result)
+
+
+class FlightDatasetRegistry:
+    """
+    航班数据集注册表，每个数据文件只加载一次
+
+    重新加载时先在锁外构建新的数据表和索引，再一次性替换注册项；
+    已经取得旧快照的请求继续使用旧快照，保证单个请求内的数据一致
+    """
+
+    def __init__(self):
+        self._datasets: Dict[str, FlightDataset] = {}
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._listeners: List[Callable[[Optional[FlightDataset], FlightDataset], None]] = []
+
+    def get(self, file_path=None) -> FlightDataset:
+        """获取数据集快照，首次访问时加载"""
+        key = _normalize_path(file_path)
+        dataset = self._datasets.get(key)
+        if dataset is not None:
+            return dataset
+
+        with self._lock:
+            # 双重检查，避免并发请求重复加载
+            dataset = self._datasets.get(key)
+            if dataset is None:
+                dataset = self._load(key)
+                self._datasets[key] = dataset
+        return dataset
+
+    def reload(self, file_path=None) -> FlightDataset:
+        """
+        重新加载数据集并原子替换快照
+
+        内容版本变化时依次通知监听器（参数为旧快照和新快照），用于失效缓存和重建派生数据
+        """
+        key = _normalize_path(file_path)
+        # 串行化重新加载，构建过程不阻塞读取当前快照
+        with self._reload_lock:
+            dataset = self._load(key)
+            self._swap(key, dataset)
+        return dataset
+
+    def sync_deltas(self, file_path=None) -> FlightDataset:
+        """
+        应用增量目录中新出现的增量文件
+
+        已应用的增量文件被修改或删除时无法增量回退，改为完整重新加载
+        """
+        key = _normalize_path(file_path)
+        with self._reload_lock:
+            dataset = self.get(key)
+            delta_files = list_delta_files(get_delta_dir(key))
+            applied = dataset.applied_deltas
+            names = [path.name for path in delta_files[:len(applied)]]
+            if names != [name for name, _ in applied] or any(
+                    load_delta_file(path)[1] != digest for path, (_, digest) in zip(delta_files, applied)):
+                print("🔄 已应用的增量文件发生变化，完整重新加载数据集")
+                new_dataset = self._load(key)
+                self._swap(key, new_dataset)
+                return new_dataset
+
+            for path in delta_files[len(applied):]:
+                dataset = dataset.with_delta(path)
+                self._log_delta(dataset)
+                self._swap(key, dataset)
+        return dataset
+
+    def _swap(self, key: str, dataset: FlightDataset):
+        with self._lock:
+            old_dataset = self._datasets.get(key)
+            self._datasets[key] = dataset
+        if old_dataset is None or old_dataset.version != dataset.version:
+            if dataset.delta is None:
+                print(f"🔄 航班数据集已切换: {old_dataset.version if old_dataset else '-'} -> {dataset.version}")
+            self._notify(old_dataset, dataset)
+
+    @staticmethod
+    def _log_delta(dataset: FlightDataset):
+        delta = dataset.delta
+        print(f"🧩 应用增量 {delta.name}: 新增 {delta.added}，删除 {delta.removed}，修改 {delta.modified}，"
+              f"未匹配 {delta.missing}，涉及 {len(delta.touched_airports)} 个机场，"
+              f"耗时 {delta.apply_seconds * 1000:.1f}ms，版本 {delta.base_version} -> {dataset.version}")
+
+    def add_listener(self, listener: Callable[[Optional[FlightDataset], FlightDataset], None]):
+        """注册数据集切换监听器"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """移除数据集切换监听器"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, old_dataset: Optional[FlightDataset], dataset: FlightDataset):
+        for listener in list(self._listeners):
+            try:
+                listener(old_dataset, dataset)
+            except Exception as e:
+                print(f"⚠️ 数据集切换回调失败 {getattr(listener, '__qualname__', listener)}: {e}")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有已加载数据集的统计信息"""
+        return {key: dataset.get_stats() for key, dataset in self._datasets.items()}
+
+    def _load(self, key: str) -> FlightDataset:
+        start = time.perf_counter()
+        # 快照与源数据内容一致时直接内存映射，否则重新解析并编译快照
+        snapshot = load_or_build_snapshot(key)
+        table = snapshot.table
+
+        # 版本同时覆盖航班数据和机场坐标，只有坐标变化时也会通知监听器更新派生数据
+        version = snapshot.version
+        dataset = FlightDataset(key, table, version, time.perf_counter() - start,
+                                airport_coords=snapshot.airport_coords, snapshot_path=snapshot.path)
+        print(f"📦 加载航班数据集: {len(table)} 条记录，版本 {version}，"
+              f"耗时 {dataset.load_seconds * 1000:.1f}ms，内存约 {dataset.memory_bytes / 1024:.0f}KB")
+
+        # 依次应用增量文件
+        for path in list_delta_files(get_delta_dir(key)):
+            dataset = dataset.with_delta(path)
+            self._log_delta(dataset)
+        if dataset.delta is not None:
+            # 启动时应用的增量不是相对已发布快照的变化，不作为局部更新通知
+            dataset.delta = None
+        return dataset
+
+
+class DatasetWatcher(threading.Thread):
+    """
+    数据文件监视线程
+
+    定期检查航班数据文件、机场坐标文件和增量目录的大小与修改时间，
+    变化且保持稳定（文件写入完成）后在后台重新加载数据集；只有增量目录变化时增量应用新的增量文件
+    """
+
+    def __init__(self, registry: FlightDatasetRegistry, file_path=None, interval: float = DEFAULT_WATCH_INTERVAL):
+        super().__init__(name='flight-dataset-watcher', daemon=True)
+        self.registry = registry
+        self.file_path = _normalize_path(file_path)
+        self.paths = [self.file_path, str(AIRPORT_COORDS_FILE)]
+        self.delta_dir = get_delta_dir(self.file_path)
+        self.interval = interval
+        self.reload_count = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        last_signature = self._signature()
+        pending_signature = None
+        while not self._stop_event.wait(self.interval):
+            signature = self._signature()
+            if signature == last_signature:
+                pending_signature = None
+                continue
+            # 等到两次检查结果一致再加载，避免读到写了一半的文件
+            if signature != pending_signature:
+                pending_signature = signature
+                continue
+            try:
+                if signature[0] != last_signature[0]:
+                    self.registry.reload(self.file_path)
+                else:
+                    self.registry.sync_deltas(self.file_path)
+                self.reload_count += 1
+                last_signature = signature
+            except Exception as e:
+                # 加载失败时保留当前快照，等待下一次文件变化
+                print(f"❌ 航班数据热加载失败，继续使用当前数据: {e}")
+                last_signature = signature
+            pending_signature = None
+
+    def stop(self):
+        """停止监视"""
+        self._stop_event.set()
+
+    def _signature(self):
+        return (tuple(self._stat(path) for path in self.paths),
+                tuple((path.name, self._stat(path)) for path in list_delta_files(self.delta_dir)))
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+
+def get_delta_dir(file_path=None) -> Path:
+    """获取航班数据文件对应的增量目录"""
+    delta_dir = os.getenv('FLIGHT_DELTA_DIR')
+    return Path(delta_dir) if delta_dir else Path(_normalize_path(file_path)).parent / DELTA_DIR_NAME
+
+def _normalize_path(file_path) -> str:
+    """统一数据文件路径，保证相对路径和绝对路径指向同一个注册项"""
+    if file_path is None:
+        file_path = DEFAULT_FLIGHT_FILE
+    path = Path(file_path)
+    if not path.is_absolute():
+        path = Path(__file__).parent / path
+    return str(path.resolve())
+
+
+# 全局数据集注册表实例
+_dataset_registry = FlightDatasetRegistry()
+
+def get_dataset_registry() -> FlightDatasetRegistry:
+    """获取数据集注册表实例"""
+    return _dataset_registry
+
+def get_flight_dataset(file_path=None) -> FlightDataset:
+    """获取航班数据集快照"""
+    return _dataset_registry.get(file_path)
+
+def get_flights(file_path=None) -> FlightRows:
+    """获取航班字典行视图"""
+    return _dataset_registry.get(file_path).flights
+
+def get_dataset_stats() -> Dict[str, Dict[str, Any]]:
+    """获取数据集加载时间和内存占用统计"""
+    return _dataset_registry.get_stats()
+
+def on_dataset_swap(listener: Callable[[Optional[FlightDataset], FlightDataset], None]):
+    """注册数据集切换监听器（可作为装饰器使用）"""
+    _dataset_registry.add_listener(listener)
+    return listener
+
+# 全局数据文件监视线程
+_dataset_watchers: Dict[str, DatasetWatcher] = {}
+
+def start_dataset_watcher(file_path=None, interval: Optional[float] = None) -> Optional[DatasetWatcher]:
+    """
+    启动数据文件热加载（同一数据文件只启动一个监视线程）
+
+    Args:
+        file_path: 航班数据文件路径，默认为内置数据文件
+        interval: 检查间隔（秒），默认读取 FLIGHT_DATA_WATCH_INTERVAL，小于等于0时不启动
+    """
+    interval = DEFAULT_WATCH_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+
+    key = _normalize_path(file_path)
+    watcher = _dataset_watchers.get(key)
+    if watcher is None or not watcher.is_alive():
+        watcher = DatasetWatcher(_dataset_registry, key, interval)
+        _dataset_watchers[key] = watcher
+        watcher.start()
+        print(f"👀 已启动航班数据热加载，检查间隔 {interval:g} 秒")
+    return watcher
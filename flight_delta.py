@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+航班数据增量更新
+增量文件为JSONL格式，每行一条变更，按 航班号+起飞机场+降落机场+起飞时间 定位航班：
+
+    {"op": "add", "航班号": "HU7001", "起飞机场": "海口美兰", "降落机场": "北京首都", "起飞时间": "8:00", "班期": "1357", "适用产品": "666/2666"}
+    {"op": "modify", "航班号": "HU7001", "起飞机场": "海口美兰", "降落机场": "北京首都", "起飞时间": "8:00", "班期": "12345"}
+    {"op": "remove", "航班号": "HU7001", "起飞机场": "海口美兰", "降落机场": "北京首都", "起飞时间": "8:00"}
+
+应用增量时复制数据列并只更新变化行涉及的倒排表和聚合统计，旧的数据表和索引保持不变
+"""
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Set, Tuple, Any
+
+from flight_table import (FlightTable, FIELD_FLIGHT_NO, FIELD_DEPARTURE, FIELD_ARRIVAL, FIELD_TIME,
+                          FIELD_SCHEDULE, FIELD_PRODUCT, parse_time_minutes)
+from flight_index import FlightIndex, register_flight_index
+from flight_aggregates import peek_flight_aggregates, register_flight_aggregates
+
+# 增量操作类型
+DELTA_ADD = 'add'
+DELTA_REMOVE = 'remove'
+DELTA_MODIFY = 'modify'
+
+# 定位航班的字段
+KEY_FIELDS = (FIELD_FLIGHT_NO, FIELD_DEPARTURE, FIELD_ARRIVAL, FIELD_TIME)
+# 新增航班必须提供的字段
+RECORD_FIELDS = KEY_FIELDS + (FIELD_SCHEDULE, FIELD_PRODUCT)
+
+
+class DeltaResult:
+    """一次增量更新的结果"""
+
+    def __init__(self, name: str, digest: str, base_version: str):
+        self.name = name
+        self.digest = digest
+        self.base_version = base_version
+        self.added = 0
+        self.removed = 0
+        self.modified = 0
+        self.missing = 0
+        # 变化航班（及删除时行号被移动的航班）涉及的机场（用于局部失效缓存和局部重建航班网络图）
+        self.touched_airports: Set[str] = set()
+        self.apply_seconds = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'base_version': self.base_version,
+            'added': self.added,
+            'removed': self.removed,
+            'modified': self.modified,
+            'missing': self.missing,
+            'touched_airports': sorted(self.touched_airports),
+            'apply_seconds': round(self.apply_seconds, 4)
+        }
+
+
+def load_delta_file(delta_path) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    读取增量文件
+
+    Returns:
+        (变更列表, 文件内容摘要)
+    """
+    digest = hashlib.sha1()
+    operations = []
+    with open(delta_path, 'rb') as f:
+        for line_no, raw_line in enumerate(f, 1):
+            digest.update(raw_line)
+            line = raw_line.strip()
+            if not line:
+                continue
+            operation = json.loads(line)
+            op = operation.get('op')
+            if op not in (DELTA_ADD, DELTA_REMOVE, DELTA_MODIFY):
+                raise ValueError(f"{Path(delta_path).name} 第{line_no}行: 未知的增量操作 {op!r}")
+            required = RECORD_FIELDS if op == DELTA_ADD else KEY_FIELDS
+            missing = [field for field in required if field not in operation]
+            if missing:
+                raise ValueError(f"{Path(delta_path).name} 第{line_no}行: 缺少字段 {', '.join(missing)}")
+            operations.append(operation)
+    return operations, digest.hexdigest()
+
+def apply_delta(table: FlightTable, index: FlightIndex, operations: List[Dict[str, Any]],
+                name: str = '', digest: str = '', base_version: str = '') -> Tuple[FlightTable, FlightIndex, DeltaResult]:
+    """
+    把一组变更应用到数据表，生成新的数据表和索引
+
+    变更先按同一文件中待新增的航班、再按原数据表定位，然后依次执行修改、删除（用末行填补空位）和新增，
+    最后只对内容变化的行号更新倒排表
+
+    Returns:
+        (新数据表, 新索引, 增量结果)
+    """
+    start = time.perf_counter()
+    result = DeltaResult(name, digest, base_version)
+    new_table = table.copy()
+
+    updates: Dict[int, Dict[str, Any]] = {}
+    removals: Set[int] = set()
+    additions: Dict[Tuple[str, str, str, int], Dict[str, Any]] = {}
+    for operation in operations:
+        record = {field: operation[field] for field in RECORD_FIELDS if field in operation}
+        key = _flight_key(record)
+        op = operation['op']
+        pending = additions.get(key)
+        if pending is not None:
+            # 同一文件中前面新增的航班：新增、修改合并到待新增记录（后出现的字段覆盖先出现的），删除则取消新增
+            if op == DELTA_REMOVE:
+                del additions[key]
+            else:
+                pending.update(record)
+        else:
+            # 同一文件中已删除的行不再参与匹配
+            row_ids = [row_id for row_id in _find_rows(table, index, record) if row_id not in removals]
+            if op == DELTA_REMOVE:
+                if not row_ids:
+                    result.missing += 1
+                removals.update(row_ids)
+                for row_id in row_ids:
+                    updates.pop(row_id, None)
+            elif op == DELTA_MODIFY or row_ids:
+                # 新增已存在的航班按修改处理
+                if not row_ids:
+                    result.missing += 1
+                for row_id in row_ids:
+                    updates.setdefault(row_id, {}).update(record)
+            else:
+                additions[key] = dict(record)
+        result.touched_airports.update((record[FIELD_DEPARTURE], record[FIELD_ARRIVAL]))
+
+    changed_rows = set()
+    for row_id, record in updates.items():
+        new_table.update(row_id, record)
+        changed_rows.add(row_id)
+    result.modified = len(updates)
+
+    # 从大到小删除，保证用来填补空位的末行不是待删除的行
+    for row_id in sorted(removals, reverse=True):
+        moved_from = new_table.swap_remove(row_id)
+        changed_rows.update((row_id, moved_from))
+        if moved_from != row_id:
+            # 被移动的航班行号改变，按行号索引的航线片段需要随其起降机场失效
+            result.touched_airports.update((new_table.airports[new_table.departure[row_id]],
+                                            new_table.airports[new_table.arrival[row_id]]))
+    result.removed = len(removals)
+
+    for record in additions.values():
+        changed_rows.add(new_table.append(record))
+    result.added = len(additions)
+
+    new_index = index.derive(new_table, changed_rows)
+    register_flight_index(new_table, new_index)
+    # 聚合统计已计算过时同样只调整变化行
+    aggregates = peek_flight_aggregates(table)
+    if aggregates is not None:
+        register_flight_aggregates(new_table, aggregates.derive(table, new_table, changed_rows))
+    result.apply_seconds = time.perf_counter() - start
+    return new_table, new_index, result
+
+def _flight_key(record: Dict[str, Any]) -> Tuple[str, str, str, int]:
+    """航班标识：航班号+起降机场+起飞时间（分钟数，"8:00" 与 "08:00" 相同）"""
+    return (record[FIELD_FLIGHT_NO], record[FIELD_DEPARTURE], record[FIELD_ARRIVAL],
+            parse_time_minutes(record[FIELD_TIME]))
+
+def _find_rows(table: FlightTable, index: FlightIndex, record: Dict[str, Any]) -> List[int]:
+    """按 航班号+起降机场+起飞时间 查找行号"""
+    departure_id = table.airports.lookup(record[FIELD_DEPARTURE])
+    arrival_id = table.airports.lookup(record[FIELD_ARRIVAL])
+    flight_no = table.flight_numbers.lookup(record[FIELD_FLIGHT_NO])
+    if departure_id is None or arrival_id is None or flight_no is None:
+        return []
+    minutes = parse_time_minutes(record[FIELD_TIME])
+    return [row_id for row_id in index.by_flight_no.get(flight_no, ())
+            if table.departure[row_id] == departure_id and table.arrival[row_id] == arrival_id
+            and table.dep_minutes[row_id] == minutes]
+
+def list_delta_files(delta_dir) -> List[Path]:
+    """按文件名顺序列出增量文件"""
+    delta_dir = Path(delta_dir)
+    if not delta_dir.is_dir():
+        return []
+    return sorted(delta_dir.glob('*.jsonl'))
+
+def delta_version(base_version: str, digest: str) -> str:
+    """由基础版本和增量摘要计算新的数据版本"""
+    return hashlib.sha1(f"{base_version}:{digest}".encode('ascii')).hexdigest()[:12]
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+航班倒排索引
+为起飞机场、降落机场、航班号、适用产品和班期建立位图倒排表，起飞时间建立有序索引，
+多条件查询通过位图求交和二分查找完成，无需逐条扫描航班
+"""
+
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Any
+
+from flight_table import FlightTable
+
+# 每个字节值对应的置位位置，用于快速解码位图
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value & (1 << bit)) for value in range(256))
+
+
+def bitmap_from_ids(row_ids, size: int) -> int:
+    """把行号序列编码为位图"""
+    buffer = bytearray((size + 7) // 8)
+    for row_id in row_ids:
+        buffer[row_id >> 3] |= 1 << (row_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+def bitmap_to_ids(bitmap: int) -> List[int]:
+    """把位图解码为升序行号列表"""
+    row_ids = []
+    if bitmap <= 0:
+        return row_ids
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for byte_index, value in enumerate(data):
+        if value:
+            base = byte_index << 3
+            row_ids.extend(base + bit for bit in _BYTE_BITS[value])
+    return row_ids
+
+def bitmap_count(bitmap: int) -> int:
+    """统计位图中的行数"""
+    return bin(bitmap).count('1')
+
+def _time_bounds(time_from: Optional[int], time_to: Optional[int]):
+    """补全起飞时间区间的缺省端点"""
+    return (0 if time_from is None else time_from,
+            24 * 60 - 1 if time_to is None else time_to)
+
+
+class IndexQueryResult:
+    """索引查询结果"""
+
+    def __init__(self, bitmap: int, explain: Dict[str, Any]):
+        self.bitmap = bitmap
+        self.explain = explain
+
+    @property
+    def row_ids(self) -> List[int]:
+        return bitmap_to_ids(self.bitmap)
+
+    def __len__(self) -> int:
+        return self.explain['result_count']
+
+
+class FlightIndex:
+    """航班位图倒排索引"""
+
+    def __init__(self, table: FlightTable):
+        start = time.perf_counter()
+        self.table = table
+        self.size = len(table)
+        self.all_rows = (1 << self.size) - 1
+
+        # 低基数字段直接保存位图
+        self.by_departure = self._build_bitmaps(table.departure)
+        self.by_arrival = self._build_bitmaps(table.arrival)
+
+        # 适用产品按产品代码建立位图（一个航班可出现在多个产品代码下）
+        self.by_product_code: Dict[int, int] = {}
+        for code_id in range(len(table.product_codes)):
+            bit = 1 << code_id
+            row_ids = [row_id for row_id, mask in enumerate(table.product_mask) if mask & bit]
+            self.by_product_code[code_id] = bitmap_from_ids(row_ids, self.size)
+
+        # 班期按星期建立位图（第day个位图为该星期执飞的航班）
+        self.by_weekday = [
+            bitmap_from_ids([row_id for row_id, mask in enumerate(table.weekdays) if mask & (1 << day)], self.size)
+            for day in range(7)
+        ]
+
+        # 起飞时间有序索引：按分钟数排序的行号及对应分钟数
+        self.time_order = array('I', sorted(range(self.size), key=table.dep_minutes.__getitem__))
+        self.time_sorted = array('H', (table.dep_minutes[row_id] for row_id in self.time_order))
+
+        # 航班号基数高、每个倒排表很短，保存行号列表，查询时再编码为位图
+        self.by_flight_no: Dict[int, array] = {}
+        for row_id, flight_no in enumerate(table.flight_no):
+            postings = self.by_flight_no.get(flight_no)
+            if postings is None:
+                postings = self.by_flight_no[flight_no] = array('I')
+            postings.append(row_id)
+
+        self.build_seconds = time.perf_counter() - start
+
+    @classmethod
+    def restore(cls, table: FlightTable, by_departure: Dict[int, int], by_arrival: Dict[int, int],
+                by_product_code: Dict[int, int], by_weekday: List[int], time_order, time_sorted,
+                by_flight_no: Dict[int, Any]) -> 'FlightIndex':
+        """从快照中预构建的倒排表恢复索引，不重新扫描数据表"""
+        index = cls.__new__(cls)
+        index.table = table
+        index.size = len(table)
+        index.all_rows = (1 << index.size) - 1
+        index.by_departure = by_departure
+        index.by_arrival = by_arrival
+        index.by_product_code = by_product_code
+        index.by_weekday = by_weekday
+        index.time_order = time_order
+        index.time_sorted = time_sorted
+        index.by_flight_no = by_flight_no
+        index.build_seconds = 0.0
+        return index
+
+    def derive(self, table: FlightTable, changed_rows: Iterable[int]) -> 'FlightIndex':
+        """
+        基于当前索引为修改后的数据表生成新索引，只更新变化行涉及的倒排表
+
+        Args:
+            table: 修改后的数据表（当前索引对应的数据表保持不变）
+            changed_rows: 内容发生变化的行号（包括新增、删除和被移动的行）
+
+        Returns:
+            新索引，当前索引不受影响，仍可供使用旧快照的请求继续查询
+        """
+        start = time.perf_counter()
+        old_table = self.table
+        old_size = self.size
+        changed_rows = sorted(set(changed_rows))
+        changed_set = set(changed_rows)
+
+        index = FlightIndex.restore(
+            table,
+            by_departure=dict(self.by_departure),
+            by_arrival=dict(self.by_arrival),
+            by_product_code=dict(self.by_product_code),
+            by_weekday=list(self.by_weekday),
+            time_order=None,
+            time_sorted=None,
+            by_flight_no=dict(self.by_flight_no)
+        )
+        for code_id in range(len(table.product_codes)):
+            index.by_product_code.setdefault(code_id, 0)
+
+        for row_id in changed_rows:
+            bit = 1 << row_id
+            # 先从旧值的倒排表中移除该行，再加入新值的倒排表
+            if row_id < old_size:
+                self._move_bit(index.by_departure, old_table.departure[row_id], bit, False)
+                self._move_bit(index.by_arrival, old_table.arrival[row_id], bit, False)
+                for code_id in index.by_product_code:
+                    if old_table.product_mask[row_id] & (1 << code_id):
+                        index.by_product_code[code_id] &= ~bit
+                for day in range(7):
+                    if old_table.weekdays[row_id] & (1 << day):
+                        index.by_weekday[day] &= ~bit
+                self._move_posting(index.by_flight_no, old_table.flight_no[row_id], row_id, False)
+            if row_id < index.size:
+                self._move_bit(index.by_departure, table.departure[row_id], bit, True)
+                self._move_bit(index.by_arrival, table.arrival[row_id], bit, True)
+                for code_id in index.by_product_code:
+                    if table.product_mask[row_id] & (1 << code_id):
+                        index.by_product_code[code_id] |= bit
+                for day in range(7):
+                    if table.weekdays[row_id] & (1 << day):
+                        index.by_weekday[day] |= bit
+                self._move_posting(index.by_flight_no, table.flight_no[row_id], row_id, True)
+
+        # 起飞时间有序索引：去掉变化行后按新分钟数插回
+        time_order = [row_id for row_id in self.time_order if row_id not in changed_set]
+        time_sorted = [table.dep_minutes[row_id] for row_id in time_order]
+        for row_id in changed_rows:
+            if row_id < index.size:
+                minutes = table.dep_minutes[row_id]
+                position = bisect_right(time_sorted, minutes)
+                time_sorted.insert(position, minutes)
+                time_order.insert(position, row_id)
+        index.time_order = array('I', time_order)
+        index.time_sorted = array('H', time_sorted)
+
+        index.build_seconds = time.perf_counter() - start
+        return index
+
+    @staticmethod
+    def _move_bit(postings: Dict[int, int], key: int, bit: int, add: bool):
+        if add:
+            postings[key] = postings.get(key, 0) | bit
+        else:
+            bitmap = postings.get(key, 0) & ~bit
+            if bitmap:
+                postings[key] = bitmap
+            else:
+                postings.pop(key, None)
+
+    @staticmethod
+    def _move_posting(postings: Dict[int, Any], key: int, row_id: int, add: bool):
+        # 倒排表可能引用内存映射区域或旧索引，修改前先复制
+        rows = list(postings.get(key, ()))
+        if add:
+            insort(rows, row_id)
+        elif row_id in rows:
+            rows.remove(row_id)
+        if rows:
+            postings[key] = array('I', rows)
+        else:
+            postings.pop(key, None)
+
+    def _build_bitmaps(self, column) -> Dict[int, int]:
+        postings: Dict[int, List[int]] = {}
+        for row_id, value in enumerate(column):
+            postings.setdefault(value, []).append(row_id)
+        return {value: bitmap_from_ids(row_ids, self.size) for value, row_ids in postings.items()}
+
+    def departure_bitmap(self, airport: str) -> int:
+        airport_id = self.table.airports.lookup(airport)
+        return self.by_departure.get(airport_id, 0) if airport_id is not None else 0
+
+    def arrival_bitmap(self, airport: str) -> int:
+        airport_id = self.table.airports.lookup(airport)
+        return self.by_arrival.get(airport_id, 0) if airport_id is not None else 0
+
+    def flight_no_bitmap(self, flight_id: str) -> int:
+        flight_no = self.table.flight_numbers.lookup(flight_id)
+        if flight_no is None or flight_no not in self.by_flight_no:
+            return 0
+        return bitmap_from_ids(self.by_flight_no[flight_no], self.size)
+
+    def product_bitmap(self, category: str) -> int:
+        """适用产品包含该会员类型全部产品代码的航班位图"""
+        mask = self.table.product_mask_of(category)
+        if mask is None:
+            return 0
+        bitmap = self.all_rows
+        for code_id, code_bitmap in self.by_product_code.items():
+            if mask & (1 << code_id):
+                bitmap &= code_bitmap
+        return bitmap
+
+    def weekday_bitmap(self, weekday_mask: int) -> int:
+        """在星期位掩码中任意一天执飞的航班位图"""
+        bitmap = 0
+        for day in range(7):
+            if weekday_mask & (1 << day):
+                bitmap |= self.by_weekday[day]
+        return bitmap
+
+    def time_range_rows(self, time_from: Optional[int], time_to: Optional[int]) -> List[range]:
+        """
+        二分查找起飞时间落在区间内的有序索引位置
+
+        Returns:
+            time_order 中的位置区间列表，time_from 晚于 time_to 时视为跨越零点，返回两段
+        """
+        low, high = _time_bounds(time_from, time_to)
+        if low <= high:
+            return [range(bisect_left(self.time_sorted, low), bisect_right(self.time_sorted, high))]
+        return [range(bisect_left(self.time_sorted, low), self.size),
+                range(0, bisect_right(self.time_sorted, high))]
+
+    def product_facets(self, categories, departure: Optional[str] = None,
+                       arrival: Optional[str] = None) -> Dict[str, int]:
+        """统计在起降机场条件下每个会员类型可用的航班数"""
+        base = self.all_rows
+        if departure:
+            base &= self.departure_bitmap(departure)
+        if arrival:
+            base &= self.arrival_bitmap(arrival)
+        return {category: bitmap_count(base & self.product_bitmap(category)) for category in categories}
+
+    def product_counts_by_airport(self, role: str = 'departure') -> Dict[str, Dict[str, int]]:
+        """统计每个机场各产品代码的航班数（role 为 departure 或 arrival）"""
+        postings = self.by_departure if role == 'departure' else self.by_arrival
+        return {
+            self.table.airports[airport_id]: {
+                self.table.product_codes[code_id]: bitmap_count(airport_bitmap & code_bitmap)
+                for code_id, code_bitmap in self.by_product_code.items()
+            }
+            for airport_id, airport_bitmap in postings.items()
+        }
+
+    def query(self, departure: Optional[str] = None, arrival: Optional[str] = None,
+              flight_id: Optional[str] = None, category: Optional[str] = None,
+              weekday_mask: Optional[int] = None, time_from: Optional[int] = None,
+              time_to: Optional[int] = None) -> IndexQueryResult:
+        """
+        多条件查询，各条件的位图求交
+
+        Args:
+            weekday_mask: 星期位掩码，航班在其中任意一天执飞即匹配
+            time_from: 最早起飞时间（零点起的分钟数）
+            time_to: 最晚起飞时间（零点起的分钟数）
+
+        Returns:
+            查询结果，explain 中记录每个条件的候选集大小
+        """
+        start = time.perf_counter()
+        predicates = []
+        if departure:
+            predicates.append(('departure', self.departure_bitmap(departure)))
+        if arrival:
+            predicates.append(('arrival', self.arrival_bitmap(arrival)))
+        if flight_id:
+            predicates.append(('flight_id', self.flight_no_bitmap(flight_id)))
+        if category:
+            predicates.append(('category', self.product_bitmap(category)))
+        if weekday_mask:
+            predicates.append(('weekday', self.weekday_bitmap(weekday_mask)))
+
+        candidates = {name: bitmap_count(predicate_bitmap) for name, predicate_bitmap in predicates}
+
+        bitmap = self.all_rows
+        # 从最小的候选集开始求交，结果为空时提前结束
+        for name, predicate_bitmap in sorted(predicates, key=lambda item: candidates[item[0]]):
+            bitmap &= predicate_bitmap
+            if not bitmap:
+                break
+
+        if (time_from is not None or time_to is not None) and bitmap:
+            positions = self.time_range_rows(time_from, time_to)
+            range_count = sum(len(span) for span in positions)
+            candidates['time'] = range_count
+            current_count = bitmap_count(bitmap)
+            if current_count < range_count:
+                # 其他条件已经足够收敛，直接按起飞时间列过滤候选行
+                in_range = self._time_filter(time_from, time_to)
+                bitmap = bitmap_from_ids(
+                    [row_id for row_id in bitmap_to_ids(bitmap) if in_range(self.table.dep_minutes[row_id])],
+                    self.size
+                )
+            else:
+                time_order = self.time_order
+                bitmap &= bitmap_from_ids((time_order[i] for span in positions for i in span), self.size)
+
+        explain = {
+            'total_rows': self.size,
+            'candidates': candidates,
+            'result_count': bitmap_count(bitmap),
+            'elapsed_us': round((time.perf_counter() - start) * 1e6, 1)
+        }
+        return IndexQueryResult(bitmap, explain)
+
+    @staticmethod
+    def _time_filter(time_from: Optional[int], time_to: Optional[int]):
+        low, high = _time_bounds(time_from, time_to)
+        if low <= high:
+            return lambda minutes: low <= minutes <= high
+        return lambda minutes: minutes >= low or minutes <= high
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        return {
+            'rows': self.size,
+            'departure_keys': len(self.by_departure),
+            'arrival_keys': len(self.by_arrival),
+            'flight_no_keys': len(self.by_flight_no),
+            'product_code_keys': len(self.by_product_code),
+            'build_seconds': round(self.build_seconds, 4)
+        }
+
+
+# 每个数据表对应一个索引，数据表释放时索引随之释放
+_index_cache: 'weakref.WeakKeyDictionary[FlightTable, FlightIndex]' = weakref.WeakKeyDictionary()
+_index_lock = threading.Lock()
+
+def register_flight_index(table: FlightTable, index: FlightIndex):
+    """登记预构建的索引（如从快照恢复的索引）"""
+    with _index_lock:
+        _index_cache[table] = index
+
+def get_flight_index(table: FlightTable) -> FlightIndex:
+    """获取数据表的倒排索引（首次访问时构建）"""
+    index = _index_cache.get(table)
+    if index is None:
+        with _index_lock:
+            index = _index_cache.get(table)
+            if index is None:
+                index = FlightIndex(table)
+                _index_cache[table] = index
+    return index
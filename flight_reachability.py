@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+机场可达性矩阵
+由直飞航线邻接矩阵做布尔矩阵乘法，得到机场两两之间最少需要的中转次数（0..MAX_STOPS），
+每个数据版本计算一次；路线规划前先查表，不可达时直接返回，不再启动搜索
+"""
+
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, List, Optional
+
+from flight_table import FlightTable, FlightRows
+from flight_timetable import MAX_STOPS
+
+# 最少中转次数矩阵中表示 MAX_STOPS 次中转内不可达
+UNREACHABLE = -1
+
+
+class FlightReachability:
+    """
+    机场可达性
+
+    Args:
+        airports: 机场列表（矩阵行列顺序）
+        adjacency: 直飞邻接矩阵，形状 (n, n) 的布尔数组
+        max_stops: 计算到的最大中转次数
+    """
+
+    def __init__(self, airports: List[str], adjacency, max_stops: int = MAX_STOPS):
+        import numpy as np
+
+        start = time.perf_counter()
+        self.airports = list(airports)
+        self.index = {airport: position for position, airport in enumerate(self.airports)}
+        self.max_stops = max_stops
+
+        adjacency = np.asarray(adjacency, dtype=bool).copy()
+        np.fill_diagonal(adjacency, False)
+        # reach 为 k 次中转（k+1 段航班）内可达，每多一次中转乘一次邻接矩阵
+        min_stops = np.full(adjacency.shape, UNREACHABLE, dtype=np.int8)
+        reach = adjacency
+        min_stops[reach] = 0
+        for stops in range(1, max_stops + 1):
+            reach = reach | (reach @ adjacency)
+            min_stops[reach & (min_stops == UNREACHABLE)] = stops
+        np.fill_diagonal(min_stops, UNREACHABLE)
+        min_stops.setflags(write=False)
+        self.min_stops_matrix = min_stops
+        # 逐个查询用的Python列表（比逐个索引NumPy数组快）
+        self._rows = min_stops.tolist()
+        self.build_seconds = time.perf_counter() - start
+
+    @classmethod
+    def from_table(cls, table: FlightTable, max_stops: int = MAX_STOPS) -> 'FlightReachability':
+        """由列式数据表的起降机场ID列构建"""
+        import numpy as np
+
+        airport_count = len(table.airports)
+        adjacency = np.zeros((airport_count, airport_count), dtype=bool)
+        adjacency[table.numpy_column('departure'), table.numpy_column('arrival')] = True
+        return cls(list(table.airports), adjacency, max_stops)
+
+    @classmethod
+    def from_records(cls, flights: Iterable[Any], max_stops: int = MAX_STOPS) -> 'FlightReachability':
+        """由字典（或 [航班号, 起飞机场, 降落机场, ...] 列表）形式的航班记录构建"""
+        import numpy as np
+
+        routes = set()
+        for flight in flights:
+            if isinstance(flight, Mapping):
+                routes.add((flight['起飞机场'], flight['降落机场']))
+            else:
+                routes.add((flight[1], flight[2]))
+        airports = sorted({airport for route in routes for airport in route})
+        index = {airport: position for position, airport in enumerate(airports)}
+        adjacency = np.zeros((len(airports), len(airports)), dtype=bool)
+        for departure, arrival in routes:
+            adjacency[index[departure], index[arrival]] = True
+        return cls(airports, adjacency, max_stops)
+
+    def min_stops(self, start_airport: str, end_airport: str) -> Optional[int]:
+        """最少中转次数（0为有直飞），max_stops 次中转内不可达时返回None"""
+        i, j = self.index.get(start_airport), self.index.get(end_airport)
+        if i is None or j is None:
+            return None
+        stops = self._rows[i][j]
+        return None if stops == UNREACHABLE else stops
+
+    def is_reachable(self, start_airport: str, end_airport: str, max_stops: Optional[int] = None) -> bool:
+        """max_stops 次中转内（默认 self.max_stops）能否到达"""
+        stops = self.min_stops(start_airport, end_airport)
+        return stops is not None and (max_stops is None or stops <= max_stops)
+
+    def reachable_from(self, start_airport: str, max_stops: Optional[int] = None) -> Dict[str, int]:
+        """从起点可到达的机场及最少中转次数"""
+        i = self.index.get(start_airport)
+        if i is None:
+            return {}
+        limit = self.max_stops if max_stops is None else max_stops
+        return {self.airports[j]: stops for j, stops in enumerate(self._rows[i])
+                if stops != UNREACHABLE and stops <= limit}
+
+    def reaching(self, end_airport: str, max_stops: Optional[int] = None) -> Dict[str, int]:
+        """可以到达终点的机场及最少中转次数"""
+        j = self.index.get(end_airport)
+        if j is None:
+            return {}
+        limit = self.max_stops if max_stops is None else max_stops
+        return {self.airports[i]: row[j] for i, row in enumerate(self._rows)
+                if row[j] != UNREACHABLE and row[j] <= limit}
+
+    def get_stats(self) -> Dict[str, Any]:
+        import numpy as np
+
+        counts = np.bincount(self.min_stops_matrix[self.min_stops_matrix >= 0].astype(np.int64),
+                             minlength=self.max_stops + 1)
+        return {
+            'airports': len(self.airports),
+            'pairs_by_stops': {stops: int(count) for stops, count in enumerate(counts)},
+            'build_ms': round(self.build_seconds * 1000, 2)
+        }
+
+
+# 每个数据表（即每个数据版本）对应一份可达性矩阵，数据表释放时随之释放
+_reachability_cache: 'weakref.WeakKeyDictionary[FlightTable, FlightReachability]' = weakref.WeakKeyDictionary()
+_reachability_lock = threading.Lock()
+
+def get_table_reachability(table: FlightTable) -> FlightReachability:
+    """获取数据表的可达性矩阵（首次访问时计算）"""
+    reachability = _reachability_cache.get(table)
+    if reachability is None:
+        with _reachability_lock:
+            reachability = _reachability_cache.get(table)
+            if reachability is None:
+                reachability = FlightReachability.from_table(table)
+                _reachability_cache[table] = reachability
+    return reachability
+
+def get_flight_reachability(flights=None) -> FlightReachability:
+    """
+    获取航班集合的可达性矩阵
+
+    默认使用当前航班数据集；完整数据表读取按版本缓存的矩阵，其他航班列表现场计算
+    """
+    if flights is None:
+        from flight_dataset import get_flight_dataset
+        flights = get_flight_dataset().flights
+    if isinstance(flights, FlightRows) and flights.indices is None:
+        return get_table_reachability(flights.table)
+    return FlightReachability.from_records(flights)
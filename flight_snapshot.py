@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+航班数据二进制快照
+把列式航班数据、字符串驻留表、机场坐标和预构建索引编译为一个二进制文件，
+启动时内存映射后直接使用，源JSONL内容变化时自动重新编译
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from flight_table import FlightTable, StringPool, COLUMNS
+from flight_index import FlightIndex, get_flight_index, register_flight_index
+
+# 快照文件格式
+SNAPSHOT_MAGIC = b'FFLSNAP1'
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_SUFFIX = '.snapshot'
+
+# 文件头：魔数、格式版本、段数量、源文件大小、源文件修改时间、源文件SHA256、机场坐标SHA256
+_HEADER = struct.Struct('<8sIIQd32s32s')
+# 段目录项：段名、偏移、长度
+_SECTION = struct.Struct('<24sQQ')
+# 段数据按8字节对齐，保证内存映射后的数组访问对齐
+_ALIGNMENT = 8
+
+# 机场坐标数据文件
+AIRPORT_COORDS_FILE = Path(__file__).parent / 'data' / 'airport_coords.json'
+
+
+class FlightSnapshot:
+    """从二进制快照恢复的航班数据"""
+
+    def __init__(self, path: str, table: FlightTable, index: FlightIndex,
+                 airport_coords: Dict[str, List[float]], source_sha256: str, coords_sha256: str,
+                 load_seconds: float):
+        self.path = path
+        self.table = table
+        self.index = index
+        self.airport_coords = airport_coords
+        self.source_sha256 = source_sha256
+        self.coords_sha256 = coords_sha256
+        self.load_seconds = load_seconds
+
+    @property
+    def version(self) -> str:
+        """内容版本：航班数据和机场坐标任一变化时都会改变"""
+        return hashlib.sha1((self.source_sha256 + self.coords_sha256).encode('ascii')).hexdigest()[:12]
+
+
+def get_snapshot_path(source_path) -> Path:
+    """获取源数据文件对应的快照路径（可通过 FLIGHT_SNAPSHOT_DIR 指定目录）"""
+    source_path = Path(source_path)
+    snapshot_dir = os.getenv('FLIGHT_SNAPSHOT_DIR')
+    directory = Path(snapshot_dir) if snapshot_dir else source_path.parent
+    return directory / (source_path.stem + SNAPSHOT_SUFFIX)
+
+def file_sha256(path) -> bytes:
+    """计算文件内容的SHA256摘要"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+def coords_sha256_of(coords_path) -> bytes:
+    """计算机场坐标文件的SHA256摘要，文件不存在时为全零"""
+    return file_sha256(coords_path) if Path(coords_path).exists() else bytes(32)
+
+def load_or_build_snapshot(source_path, coords_path=AIRPORT_COORDS_FILE) -> FlightSnapshot:
+    """
+    加载航班数据快照，快照不存在或源数据已变化时重新编译
+
+    Args:
+        source_path: 航班JSONL文件路径
+        coords_path: 机场坐标JSON文件路径
+
+    Returns:
+        内存映射的航班数据快照
+    """
+    snapshot_path = get_snapshot_path(source_path)
+    snapshot = _try_load(snapshot_path, source_path, coords_path)
+    if snapshot is not None:
+        return snapshot
+
+    start = time.perf_counter()
+    table, source_sha256 = _read_source(source_path)
+    airport_coords = _read_coords(coords_path)
+    coords_sha256 = coords_sha256_of(coords_path)
+    index = get_flight_index(table)
+    try:
+        write_snapshot(snapshot_path, table, index, airport_coords, source_path, source_sha256, coords_path)
+        print(f"💾 已编译航班数据快照: {snapshot_path}")
+    except OSError as e:
+        # 数据目录只读时仍可使用内存中的数据，只是下次启动需要重新解析
+        print(f"⚠️ 航班数据快照写入失败，本次使用内存数据: {e}")
+    return FlightSnapshot(str(snapshot_path), table, index, airport_coords,
+                          source_sha256.hex(), coords_sha256.hex(), time.perf_counter() - start)
+
+def write_snapshot(snapshot_path, table: FlightTable, index: FlightIndex,
+                   airport_coords: Dict[str, List[float]], source_path, source_sha256: bytes, coords_path):
+    """把数据表、索引和机场坐标写入快照文件（先写临时文件再原子替换）"""
+    source_stat = os.stat(source_path)
+    coords_sha256 = coords_sha256_of(coords_path)
+    nbytes = (len(table) + 7) // 8
+
+    departure_keys = sorted(index.by_departure)
+    arrival_keys = sorted(index.by_arrival)
+    product_code_keys = sorted(index.by_product_code)
+    flight_no_keys = sorted(index.by_flight_no)
+
+    flight_no_offsets = [0]
+    flight_no_rows = []
+    for key in flight_no_keys:
+        flight_no_rows.extend(index.by_flight_no[key])
+        flight_no_offsets.append(len(flight_no_rows))
+
+    meta = {
+        'rows': len(table),
+        'airports': list(table.airports),
+        'flight_numbers': list(table.flight_numbers),
+        'products': list(table.products),
+        'product_codes': list(table.product_codes),
+        'airport_coords': airport_coords,
+        'departure_keys': departure_keys,
+        'arrival_keys': arrival_keys,
+        'product_code_keys': product_code_keys,
+        'flight_no_keys': flight_no_keys
+    }
+
+    sections: List[Tuple[str, bytes]] = [('meta', json.dumps(meta, ensure_ascii=False).encode('utf-8'))]
+    for name, typecode in COLUMNS:
+        sections.append((f'col:{name}', _to_bytes(getattr(table, name), typecode)))
+    sections.append(('idx:departure', b''.join(_bitmap_bytes(index.by_departure[k], nbytes) for k in departure_keys)))
+    sections.append(('idx:arrival', b''.join(_bitmap_bytes(index.by_arrival[k], nbytes) for k in arrival_keys)))
+    sections.append(('idx:product_code',
+                     b''.join(_bitmap_bytes(index.by_product_code[k], nbytes) for k in product_code_keys)))
+    sections.append(('idx:weekday', b''.join(_bitmap_bytes(bitmap, nbytes) for bitmap in index.by_weekday)))
+    sections.append(('idx:time_order', _to_bytes(index.time_order, 'I')))
+    sections.append(('idx:time_sorted', _to_bytes(index.time_sorted, 'H')))
+    sections.append(('idx:flight_no_offsets', _to_bytes(flight_no_offsets, 'I')))
+    sections.append(('idx:flight_no_rows', _to_bytes(flight_no_rows, 'I')))
+
+    # 计算段偏移
+    offset = _align(_HEADER.size + _SECTION.size * len(sections))
+    directory = []
+    for name, data in sections:
+        directory.append((name, offset, len(data)))
+        offset = _align(offset + len(data))
+
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=snapshot_path.parent, prefix=snapshot_path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(sections),
+                                 source_stat.st_size, source_stat.st_mtime, source_sha256, coords_sha256))
+            for name, section_offset, length in directory:
+                f.write(_SECTION.pack(name.encode('ascii'), section_offset, length))
+            for (name, data), (_, section_offset, _) in zip(sections, directory):
+                f.write(b'\0' * (section_offset - f.tell()))
+                f.write(data)
+        os.replace(tmp_path, snapshot_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _try_load(snapshot_path: Path, source_path, coords_path) -> Optional[FlightSnapshot]:
+    """快照有效时内存映射加载，否则返回None"""
+    if not snapshot_path.exists():
+        return None
+
+    start = time.perf_counter()
+    # mmap 持有文件的独立句柄，打开的文件在映射后即可关闭
+    with open(snapshot_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+
+    snapshot = None
+    try:
+        snapshot = _load_mapped(mapped, snapshot_path, source_path, coords_path, start)
+    finally:
+        # 未加载成功时释放映射；加载成功时映射由数据表持有
+        if snapshot is None:
+            try:
+                mapped.close()
+            except BufferError:
+                # 仍有未释放的段视图时交给垃圾回收关闭
+                pass
+    return snapshot
+
+def _load_mapped(mapped: mmap.mmap, snapshot_path: Path, source_path, coords_path,
+                 start: float) -> Optional[FlightSnapshot]:
+    """校验快照文件头并解析，快照失效时返回None"""
+    if len(mapped) < _HEADER.size:
+        return None
+    (magic, format_version, section_count, source_size, source_mtime,
+     source_sha256, coords_sha256) = _HEADER.unpack_from(mapped, 0)
+    if magic != SNAPSHOT_MAGIC or format_version != SNAPSHOT_FORMAT_VERSION:
+        return None
+
+    # 源文件大小和修改时间未变时跳过内容哈希；变化时比较内容哈希决定是否重建
+    source_stat = os.stat(source_path)
+    stat_changed = source_stat.st_size != source_size or source_stat.st_mtime != source_mtime
+    if stat_changed and file_sha256(source_path) != source_sha256:
+        print("🔄 航班数据源已变化，重新编译快照")
+        return None
+    if coords_sha256_of(coords_path) != coords_sha256:
+        print("🔄 机场坐标已变化，重新编译快照")
+        return None
+
+    try:
+        snapshot = _parse_snapshot(mapped, section_count, snapshot_path, source_sha256, coords_sha256, start)
+    except (ValueError, IndexError, KeyError, TypeError, struct.error) as e:
+        # 文件截断或损坏时按缓存未命中处理，从源数据重新编译，避免启动时崩溃
+        print(f"⚠️ 航班数据快照损坏，重新编译: {e}")
+        return None
+
+    if stat_changed:
+        # 源文件只是被touch或原样覆盖，内容未变：更新文件头中的大小和修改时间，下次启动不再重新哈希
+        _update_source_stat(snapshot_path, source_stat, section_count, source_sha256, coords_sha256)
+    return snapshot
+
+def _update_source_stat(snapshot_path: Path, source_stat: os.stat_result, section_count: int,
+                        source_sha256: bytes, coords_sha256: bytes):
+    """原地改写快照文件头记录的源文件大小和修改时间"""
+    try:
+        with open(snapshot_path, 'r+b') as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, section_count,
+                                 source_stat.st_size, source_stat.st_mtime, source_sha256, coords_sha256))
+    except OSError as e:
+        print(f"⚠️ 航班数据快照文件头更新失败: {e}")
+
+def _parse_snapshot(mapped: mmap.mmap, section_count: int, snapshot_path: Path, source_sha256: bytes,
+                    coords_sha256: bytes, start: float) -> FlightSnapshot:
+    """解析快照各段，段范围或长度与文件头不一致时抛出 ValueError"""
+    file_size = len(mapped)
+    if _HEADER.size + section_count * _SECTION.size > file_size:
+        raise ValueError("段目录超出文件范围")
+    view = memoryview(mapped)
+    sections = {}
+    for i in range(section_count):
+        name, offset, length = _SECTION.unpack_from(mapped, _HEADER.size + i * _SECTION.size)
+        name = name.rstrip(b'\0').decode('ascii')
+        if offset + length > file_size:
+            raise ValueError(f"段 {name} 超出文件范围")
+        sections[name] = view[offset:offset + length]
+
+    meta = json.loads(bytes(sections['meta']).decode('utf-8'))
+    rows = meta['rows']
+    nbytes = (rows + 7) // 8
+
+    # 数据列直接引用内存映射区域，不复制；每列长度须与文件头的行数一致
+    table = FlightTable()
+    table.airports = StringPool(meta['airports'])
+    table.flight_numbers = StringPool(meta['flight_numbers'])
+    table.products = StringPool(meta['products'])
+    table.product_codes = StringPool(meta['product_codes'])
+    for name, typecode in COLUMNS:
+        column = sections[f'col:{name}'].cast(typecode)
+        if len(column) != rows:
+            raise ValueError(f"数据列 {name} 长度 {len(column)} 与行数 {rows} 不一致")
+        setattr(table, name, column)
+    # 字符串ID须在驻留表范围内
+    for name, pool in (('flight_no', table.flight_numbers), ('departure', table.airports),
+                       ('arrival', table.airports), ('product', table.products)):
+        if rows and max(getattr(table, name)) >= len(pool):
+            raise ValueError(f"数据列 {name} 引用了不存在的字符串")
+
+    bitmap_sections = (('idx:departure', len(meta['departure_keys'])), ('idx:arrival', len(meta['arrival_keys'])),
+                       ('idx:product_code', len(meta['product_code_keys'])), ('idx:weekday', 7))
+    for name, count in bitmap_sections:
+        if len(sections[name]) != count * nbytes:
+            raise ValueError(f"索引 {name} 长度不一致")
+    time_order = sections['idx:time_order'].cast('I')
+    time_sorted = sections['idx:time_sorted'].cast('H')
+    if len(time_order) != rows or len(time_sorted) != rows:
+        raise ValueError("时间索引长度与行数不一致")
+    offsets = sections['idx:flight_no_offsets'].cast('I')
+    flight_no_rows = sections['idx:flight_no_rows'].cast('I')
+    if len(offsets) != len(meta['flight_no_keys']) + 1 or (len(offsets) and offsets[-1] != len(flight_no_rows)):
+        raise ValueError("航班号索引长度不一致")
+
+    table.mapped_file = mapped
+    index = FlightIndex.restore(
+        table,
+        by_departure=_read_bitmaps(sections['idx:departure'], meta['departure_keys'], nbytes),
+        by_arrival=_read_bitmaps(sections['idx:arrival'], meta['arrival_keys'], nbytes),
+        by_product_code=_read_bitmaps(sections['idx:product_code'], meta['product_code_keys'], nbytes),
+        by_weekday=list(_read_bitmaps(sections['idx:weekday'], range(7), nbytes).values()),
+        time_order=time_order,
+        time_sorted=time_sorted,
+        by_flight_no={key: flight_no_rows[offsets[i]:offsets[i + 1]]
+                      for i, key in enumerate(meta['flight_no_keys'])}
+    )
+    register_flight_index(table, index)
+
+    return FlightSnapshot(str(snapshot_path), table, index, meta['airport_coords'],
+                          source_sha256.hex(), coords_sha256.hex(), time.perf_counter() - start)
+
+def _read_source(source_path) -> Tuple[FlightTable, bytes]:
+    """逐行解析源JSONL为数据表，同时计算内容哈希"""
+    digest = hashlib.sha256()
+    table = FlightTable()
+    with open(source_path, 'rb') as f:
+        for raw_line in f:
+            digest.update(raw_line)
+            line = raw_line.strip()
+            if line:
+                table.append(json.loads(line))
+    return table, digest.digest()
+
+def _read_coords(coords_path) -> Dict[str, List[float]]:
+    if not Path(coords_path).exists():
+        return {}
+    with open(coords_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _read_bitmaps(data: memoryview, keys, nbytes: int) -> Dict[int, int]:
+    return {key: int.from_bytes(data[i * nbytes:(i + 1) * nbytes], 'little') for i, key in enumerate(keys)}
+
+def _bitmap_bytes(bitmap: int, nbytes: int) -> bytes:
+    return bitmap.to_bytes(nbytes, 'little')
+
+def _to_bytes(values, typecode: str) -> bytes:
+    from array import array
+    if isinstance(values, array) and values.typecode == typecode:
+        return values.tobytes()
+    if isinstance(values, memoryview):
+        return values.tobytes()
+    return array(typecode, values).tobytes()
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
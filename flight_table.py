@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式航班数据表
+机场名、航班号和适用产品驻留为小整数，起飞时间存为分钟数，班期存为星期位掩码，
+适用产品在导入时解析为产品代码位掩码，所有字段以紧凑的 array 列存储（从二进制快照加载时为内存映射的 memoryview），
+同时提供字典行视图兼容原有的使用方式
+"""
+
+import re
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, List, Optional, Any
+
+# 字典行视图使用的字段名
+FIELD_FLIGHT_NO = '航班号'
+FIELD_DEPARTURE = '起飞机场'
+FIELD_ARRIVAL = '降落机场'
+FIELD_TIME = '起飞时间'
+FIELD_SCHEDULE = '班期'
+FIELD_PRODUCT = '适用产品'
+
+# 数据列名称及类型（第i个元素对应第i个航班）
+COLUMNS = (
+    ('flight_no', 'I'),       # 航班号ID
+    ('departure', 'H'),       # 起飞机场ID
+    ('arrival', 'H'),         # 降落机场ID
+    ('dep_minutes', 'H'),     # 起飞时间（零点起的分钟数）
+    ('weekdays', 'B'),        # 班期星期位掩码
+    ('product', 'H'),         # 适用产品原始字符串ID
+    ('product_mask', 'I'),    # 适用产品代码位掩码
+)
+
+# 产品代码位掩码最多容纳的产品种类
+MAX_PRODUCT_CODES = 32
+
+_PRODUCT_SEPARATORS = re.compile(r'[/,，、;；\s]+')
+
+
+class StringPool:
+    """字符串驻留池，把重复字符串映射为连续的小整数"""
+
+    def __init__(self, values: Optional[Iterable[str]] = None):
+        self._values: List[str] = []
+        self._ids: Dict[str, int] = {}
+        for value in values or ():
+            self.intern(value)
+
+    def intern(self, value: str) -> int:
+        """返回字符串对应的整数ID，不存在时分配新ID"""
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._values)
+            value = sys.intern(value)
+            self._values.append(value)
+            self._ids[value] = string_id
+        return string_id
+
+    def lookup(self, value: str) -> Optional[int]:
+        """查找字符串ID，不存在时返回None"""
+        return self._ids.get(value)
+
+    def __getitem__(self, string_id: int) -> str:
+        return self._values[string_id]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __contains__(self, value) -> bool:
+        return value in self._ids
+
+    def memory_bytes(self) -> int:
+        """估算驻留池占用的内存（字节）"""
+        return (sys.getsizeof(self._values) + sys.getsizeof(self._ids) +
+                sum(sys.getsizeof(value) for value in self._values))
+
+
+def parse_time_minutes(time_str: str) -> int:
+    """把 "7:10" 格式的起飞时间转换为零点起的分钟数"""
+    hours, _, minutes = str(time_str).strip().partition(':')
+    return int(hours) * 60 + int(minutes or 0)
+
+def format_time_minutes(minutes: int) -> str:
+    """把分钟数还原为 "7:10" 格式的起飞时间"""
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+def parse_weekday_mask(schedule_str: str) -> int:
+    """把 "1357" 格式的班期转换为星期位掩码（周一为第0位）"""
+    mask = 0
+    for char in str(schedule_str):
+        if '1' <= char <= '7':
+            mask |= 1 << (ord(char) - ord('1'))
+    return mask
+
+def format_weekday_mask(mask: int) -> str:
+    """把星期位掩码还原为 "1357" 格式的班期"""
+    return ''.join(str(day + 1) for day in range(7) if mask & (1 << day))
+
+def parse_product_codes(product_str: str) -> List[str]:
+    """把 "666/2666" 格式的适用产品拆分为产品代码列表"""
+    return [code for code in _PRODUCT_SEPARATORS.split(str(product_str).strip()) if code]
+
+
+class FlightTable:
+    """列式航班数据表"""
+
+    def __init__(self):
+        # 字符串驻留池
+        self.airports = StringPool()
+        self.flight_numbers = StringPool()
+        self.products = StringPool()
+        self.product_codes = StringPool()
+
+        # 数据列
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """追加一条航班记录，返回行号"""
+        self.flight_no.append(self.flight_numbers.intern(record[FIELD_FLIGHT_NO]))
+        self.departure.append(self.airports.intern(record[FIELD_DEPARTURE]))
+        self.arrival.append(self.airports.intern(record[FIELD_ARRIVAL]))
+        self.dep_minutes.append(parse_time_minutes(record[FIELD_TIME]))
+        self.weekdays.append(parse_weekday_mask(record[FIELD_SCHEDULE]))
+        self.product.append(self.products.intern(record[FIELD_PRODUCT]))
+        self.product_mask.append(self._intern_product_mask(record[FIELD_PRODUCT]))
+        return len(self.flight_no) - 1
+
+    def update(self, row_id: int, record: Dict[str, Any]):
+        """用记录中出现的字段覆盖指定行"""
+        if FIELD_FLIGHT_NO in record:
+            self.flight_no[row_id] = self.flight_numbers.intern(record[FIELD_FLIGHT_NO])
+        if FIELD_DEPARTURE in record:
+            self.departure[row_id] = self.airports.intern(record[FIELD_DEPARTURE])
+        if FIELD_ARRIVAL in record:
+            self.arrival[row_id] = self.airports.intern(record[FIELD_ARRIVAL])
+        if FIELD_TIME in record:
+            self.dep_minutes[row_id] = parse_time_minutes(record[FIELD_TIME])
+        if FIELD_SCHEDULE in record:
+            self.weekdays[row_id] = parse_weekday_mask(record[FIELD_SCHEDULE])
+        if FIELD_PRODUCT in record:
+            self.product[row_id] = self.products.intern(record[FIELD_PRODUCT])
+            self.product_mask[row_id] = self._intern_product_mask(record[FIELD_PRODUCT])
+
+    def swap_remove(self, row_id: int) -> int:
+        """
+        删除指定行，用最后一行填补空位（其余行号不变）
+
+        Returns:
+            被移动到 row_id 的原行号，删除的就是最后一行时返回 row_id
+        """
+        last = len(self) - 1
+        for name, _ in COLUMNS:
+            column = getattr(self, name)
+            column[row_id] = column[last]
+            column.pop()
+        return last
+
+    def copy(self) -> 'FlightTable':
+        """复制数据表（数据列复制为可修改的 array，内存映射的快照保持不变）"""
+        table = FlightTable()
+        table.airports = StringPool(self.airports)
+        table.flight_numbers = StringPool(self.flight_numbers)
+        table.products = StringPool(self.products)
+        table.product_codes = StringPool(self.product_codes)
+        for name, typecode in COLUMNS:
+            setattr(table, name, array(typecode, getattr(self, name)))
+        return table
+
+    def _intern_product_mask(self, product_str: str) -> int:
+        mask = 0
+        for code in parse_product_codes(product_str):
+            code_id = self.product_codes.intern(code)
+            if code_id >= MAX_PRODUCT_CODES:
+                raise ValueError(f"适用产品代码超过 {MAX_PRODUCT_CODES} 种: {code}")
+            mask |= 1 << code_id
+        return mask
+
+    def product_mask_of(self, category: str) -> Optional[int]:
+        """
+        把会员类型转换为产品代码位掩码
+
+        Returns:
+            位掩码，包含数据中不存在的产品代码时返回None
+        """
+        mask = 0
+        for code in parse_product_codes(category):
+            code_id = self.product_codes.lookup(code)
+            if code_id is None:
+                return None
+            mask |= 1 << code_id
+        return mask
+
+    def __len__(self) -> int:
+        return len(self.flight_no)
+
+    def row(self, index: int) -> Dict[str, str]:
+        """获取单行的字典视图"""
+        return {
+            FIELD_FLIGHT_NO: self.flight_numbers[self.flight_no[index]],
+            FIELD_DEPARTURE: self.airports[self.departure[index]],
+            FIELD_ARRIVAL: self.airports[self.arrival[index]],
+            FIELD_TIME: format_time_minutes(self.dep_minutes[index]),
+            FIELD_SCHEDULE: format_weekday_mask(self.weekdays[index]),
+            FIELD_PRODUCT: self.products[self.product[index]]
+        }
+
+    def rows(self, indices: Optional[Sequence] = None) -> 'FlightRows':
+        """获取字典行视图（按需生成字典，不复制数据列）"""
+        return FlightRows(self, indices)
+
+    def numpy_column(self, name: str):
+        """以NumPy数组形式零拷贝访问数据列"""
+        import numpy as np
+        return np.frombuffer(getattr(self, name), dtype=dict(COLUMNS)[name])
+
+    def memory_bytes(self) -> int:
+        """估算数据表占用的内存（字节）"""
+        columns = [getattr(self, name) for name, _ in COLUMNS]
+        return (sum(len(column) * column.itemsize for column in columns) +
+                self.airports.memory_bytes() + self.flight_numbers.memory_bytes() +
+                self.products.memory_bytes() + self.product_codes.memory_bytes())
+
+
+class FlightRows(Sequence):
+    """航班数据表的字典行视图，兼容原有的 list[dict] 用法"""
+
+    def __init__(self, table: FlightTable, indices: Optional[Sequence] = None):
+        self.table = table
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.table) if self.indices is None else len(self.indices)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            # 切片仍为行视图，便于统计和地图按列处理
+            if self.indices is None:
+                return FlightRows(self.table, range(len(self.table))[item])
+            return FlightRows(self.table, self.indices[item])
+        if self.indices is None:
+            if item < 0:
+                item += len(self.table)
+            if not 0 <= item < len(self.table):
+                raise IndexError('flight row index out of range')
+            return self.table.row(item)
+        return self.table.row(self.indices[item])
+
+    def __iter__(self):
+        row = self.table.row
+        indices = range(len(self.table)) if self.indices is None else self.indices
+        for i in indices:
+            yield row(i)
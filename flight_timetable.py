@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+航班时刻表与连接扫描
+按班期把每周航班展开为具体的起降时刻（两周，覆盖跨周的行程），按起飞时刻排序为连接数组。
+路线查询用带航段数限制的连接扫描（Connection Scan）：按起飞时刻从晚到早扫描一遍，
+为每个机场维护“出发时刻 -> 最早到达目的地时刻”的帕累托剖面，
+同时满足最短转机时间、最长等待时间和班期，不再枚举所有航班组合。
+推荐路线用最优优先搜索只取代价最低的前K条（代价综合总耗时、中转次数和转机等待）。
+两种搜索都先从起点、终点各做一半航段数的双向广度优先扩展，
+得到各机场离起点、终点的航段数下界，剪掉不可能在航段数限制内连通的航班
+"""
+
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from flight_table import (FIELD_ARRIVAL, FIELD_DEPARTURE, FIELD_FLIGHT_NO, FIELD_SCHEDULE, FIELD_TIME,
+                          format_time_minutes, format_weekday_mask, parse_time_minutes, parse_weekday_mask)
+
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+
+# 最短转机时间和最长等待时间（分钟）
+MIN_CONNECTION_MINUTES = 60
+MAX_CONNECTION_MINUTES = 24 * 60
+
+# 单航段飞行时间（分钟），没有飞行时间模型或缺少机场坐标时使用
+DEFAULT_BLOCK_MINUTES = 120
+
+# 最多中转次数（与界面滑块上限一致）
+MAX_STOPS = 3
+
+# 路线代价：总耗时（分钟）+ 每次中转折算的分钟数 + 转机等待的额外权重
+STOP_PENALTY_MINUTES = 120
+WAIT_WEIGHT = 0.5
+
+WEEKDAY_NAMES = ('周一', '周二', '周三', '周四', '周五', '周六', '周日')
+
+
+class Itinerary(NamedTuple):
+    """一条可行的行程（同一航班组合在不同星期出发时合并）"""
+    # 航班在时刻表航班列表中的序号
+    flight_ids: Tuple[int, ...]
+    # 首段可出发的星期位掩码（周一为第0位）
+    weekdays: int
+    # 首段起飞、末段到达的时刻（周一零点起的分钟数，取总耗时最短的一次）
+    departure: int
+    arrival: int
+    # 各次转机的等待时间（分钟）
+    waits: Tuple[int, ...]
+
+    @property
+    def stops(self) -> int:
+        return len(self.waits)
+
+    @property
+    def total_minutes(self) -> int:
+        return self.arrival - self.departure
+
+    @property
+    def wait_minutes(self) -> int:
+        return sum(self.waits)
+
+
+class SearchBounds(NamedTuple):
+    """双向扩展得到的航段数下界（见 meet_in_the_middle）"""
+    # 起点到各机场、各机场到终点的最少航段数（只含可能在航段数限制内连通起终点的机场）
+    forward: Dict[str, int]
+    backward: Dict[str, int]
+    max_legs: int
+
+    def legs_from_start(self, airport: str) -> int:
+        return self.forward.get(airport, self.max_legs + 1)
+
+    def legs_to_end(self, airport: str) -> int:
+        return self.backward.get(airport, self.max_legs + 1)
+
+
+def meet_in_the_middle(start_airport: str, end_airport: str, max_legs: int,
+                       successors: Callable[[str], Iterable[str]],
+                       predecessors: Callable[[str], Iterable[str]]) -> Optional[SearchBounds]:
+    """
+    从起点向前、从终点向后各扩展一半航段数，在中间机场会合
+
+    不超过 max_legs 段的路线上，前半段的机场离起点不超过一半航段数，后半段的机场离终点不超过另一半，
+    所以只需扩展约 2·b^(k/2) 个机场而不是 b^k；两侧扩展到的机场构成走廊，
+    再在走廊内各做一次广度优先得到准确的航段数，走廊外的机场不会出现在任何可行路线上。
+    没有会合机场时返回None
+
+    Args:
+        successors: successors(机场) -> 直飞可达的机场
+        predecessors: predecessors(机场) -> 可直飞到该机场的机场
+    """
+    forward_depth = (max_legs + 1) // 2
+    forward = _breadth_first(start_airport, forward_depth, successors)
+    backward = _breadth_first(end_airport, max_legs - forward_depth, predecessors)
+    smaller, larger = (forward, backward) if len(forward) <= len(backward) else (backward, forward)
+    if not any(airport in larger for airport in smaller):
+        return None
+    corridor = forward.keys() | backward.keys()
+    forward = _breadth_first(start_airport, max_legs, successors, corridor)
+    backward = _breadth_first(end_airport, max_legs, predecessors, corridor)
+    return SearchBounds(forward, backward, max_legs)
+
+
+class FlightTimetable:
+    """
+    航班时刻表
+
+    Args:
+        flights: 航班列表（字典或字典行视图）
+        block_minutes: block_minutes(起飞机场, 降落机场) -> 飞行时间（分钟）
+    """
+
+    def __init__(self, flights: Sequence, block_minutes: Optional[Callable[[str, str], int]] = None):
+        self.flights = flights
+        self.block_minutes = block_minutes or (lambda departure, arrival: DEFAULT_BLOCK_MINUTES)
+
+        # 每个航班的起降机场、起飞分钟数、班期和飞行时间
+        self._legs: List[Tuple[str, str, int, int, int]] = []
+        # 各机场出发的航班序号、直飞可达的机场、可直飞到该机场的机场
+        self._outgoing: Dict[str, List[int]] = defaultdict(list)
+        self._successors: Dict[str, set] = defaultdict(set)
+        self._predecessors: Dict[str, set] = defaultdict(set)
+        instances = []
+        for flight_id, flight in enumerate(flights):
+            departure, arrival = flight[FIELD_DEPARTURE], flight[FIELD_ARRIVAL]
+            dep_minutes = parse_time_minutes(flight[FIELD_TIME])
+            weekdays = parse_weekday_mask(flight[FIELD_SCHEDULE])
+            block = int(self.block_minutes(departure, arrival))
+            self._legs.append((departure, arrival, dep_minutes, weekdays, block))
+            if departure == arrival:
+                continue
+            self._outgoing[departure].append(flight_id)
+            self._successors[departure].add(arrival)
+            self._predecessors[arrival].add(departure)
+            # 展开两周，第一周出发的行程可以延续到第二周
+            for day in range(14):
+                if weekdays & (1 << (day % 7)):
+                    dep_time = day * DAY_MINUTES + dep_minutes
+                    instances.append((dep_time, dep_time + block, departure, arrival, flight_id))
+        instances.sort(key=lambda instance: instance[0])
+
+        self._min_block = min((leg[4] for leg in self._legs), default=0)
+
+        # 连接数组（按起飞时刻升序）
+        self.dep_times = [instance[0] for instance in instances]
+        self.arr_times = [instance[1] for instance in instances]
+        self.dep_airports = [instance[2] for instance in instances]
+        self.arr_airports = [instance[3] for instance in instances]
+        self.flight_ids = [instance[4] for instance in instances]
+
+    def __len__(self) -> int:
+        return len(self.dep_times)
+
+    def search_bounds(self, start_airport: str, end_airport: str, max_stops: int) -> Optional[SearchBounds]:
+        """按时刻表自身的航线计算双向扩展的航段数下界（max_stops 次中转内不可达时返回None）"""
+        empty = ()
+        return meet_in_the_middle(start_airport, end_airport, max_stops + 1,
+                                  lambda airport: self._successors.get(airport, empty),
+                                  lambda airport: self._predecessors.get(airport, empty))
+
+    def search(self, start_airport: str, end_airport: str, max_stops: int = 2,
+               min_connection: int = MIN_CONNECTION_MINUTES,
+               max_connection: int = MAX_CONNECTION_MINUTES,
+               bounds: Optional[SearchBounds] = None) -> List[Itinerary]:
+        """
+        查找可行行程（连接扫描，一遍完成）
+
+        对第一周内每个从起点出发的航班时刻，得到分别最多乘坐 1..max_stops+1 段航班时最早到达终点的行程；
+        同一航班组合在不同星期出发时合并，按中转次数、总耗时排序
+
+        Args:
+            max_stops: 最大中转次数（0为只查直飞）
+            min_connection: 最短转机时间（分钟）
+            max_connection: 最长等待时间（分钟）
+            bounds: 航段数下界（默认按时刻表的航线计算）
+        """
+        if start_airport == end_airport or max_stops < 0:
+            return []
+        max_legs = max_stops + 1
+        bounds = bounds or self.search_bounds(start_airport, end_airport, max_stops)
+        if bounds is None:
+            return []
+        # 走廊外的机场按 max_legs + 1 段处理（直接剪掉）
+        forward, backward, unreachable = bounds.forward, bounds.backward, max_legs + 1
+        dep_times, arr_times = self.dep_times, self.arr_times
+        dep_airports, arr_airports = self.dep_airports, self.arr_airports
+
+        # profiles[k][机场] = [负出发时刻列表（升序，便于二分）, 条目列表, 更优条目位置列表]
+        # 条目为 (出发时刻, 到达终点时刻, 连接序号, 下一段条目)，按出发时刻从晚到早追加；
+        # 有最长等待时间时出发更晚、到达更早的条目不一定能赶上，所以不剔除，
+        # 而是为每个条目记下出发更晚且到达不晚于它的最近条目，查询时沿这条链找等待上限内最早到达的一班
+        profiles: List[Dict[str, list]] = [{} for _ in range(max_legs + 1)]
+
+        for index in range(len(dep_times) - 1, -1, -1):
+            departure, arrival = dep_airports[index], arr_airports[index]
+            # 不再回到起点
+            if arrival == start_airport:
+                continue
+            # 这一段作为倒数第 legs 段时，前面至少还有 legs_from_start 段，后面至少还有 legs_to_end 段
+            highest = max_legs - forward.get(departure, unreachable)
+            if highest < 1:
+                continue
+            arr_time = arr_times[index]
+            if arrival == end_airport:
+                entry = (dep_times[index], arr_time, index, None)
+                for legs in range(1, highest + 1):
+                    _insert_profile(profiles[legs], departure, entry)
+                continue
+            lowest = backward.get(arrival, unreachable) + 1
+            if lowest > highest:
+                continue
+            # 转机：满足最短转机时间、等待不超过上限、后续不经过当前机场的最早到达
+            earliest, latest = arr_time + min_connection, arr_time + max_connection
+            for legs in range(max(lowest, 2), highest + 1):
+                profile = profiles[legs - 1].get(arrival)
+                if profile is None:
+                    continue
+                entries, better = profile[1], profile[2]
+                position = bisect_right(profile[0], -earliest) - 1
+                following = None
+                while position >= 0 and entries[position][0] <= latest:
+                    candidate = node = entries[position]
+                    while node is not None and arr_airports[node[2]] != departure:
+                        node = node[3]
+                    if node is None:
+                        following = candidate
+                    position = better[position]
+                if following is not None:
+                    _insert_profile(profiles[legs], departure, (dep_times[index], following[1], index, following))
+
+        itineraries: Dict[Tuple[int, ...], Itinerary] = {}
+        for legs in range(1, max_legs + 1):
+            profile = profiles[legs].get(start_airport)
+            if profile is None:
+                continue
+            # 起点没有等待上限，只保留出发更晚的班次无法更早到达的条目
+            best_arrival = None
+            for entry in profile[1]:
+                if best_arrival is not None and entry[1] >= best_arrival:
+                    continue
+                best_arrival = entry[1]
+                if entry[0] >= WEEK_MINUTES:
+                    continue
+                itinerary = self._itinerary(entry)
+                if itinerary is None:
+                    continue
+                previous = itineraries.get(itinerary.flight_ids)
+                if previous is None:
+                    itineraries[itinerary.flight_ids] = itinerary
+                else:
+                    best = itinerary if itinerary.total_minutes < previous.total_minutes else previous
+                    itineraries[itinerary.flight_ids] = best._replace(weekdays=previous.weekdays | itinerary.weekdays)
+        return sorted(itineraries.values(), key=lambda item: (item.stops, item.total_minutes, item.departure))
+
+    def best_itineraries(self, start_airport: str, end_airport: str, k: int = 10, max_stops: int = 2,
+                         min_connection: int = MIN_CONNECTION_MINUTES,
+                         max_connection: int = MAX_CONNECTION_MINUTES,
+                         bounds: Optional[SearchBounds] = None) -> List[Itinerary]:
+        """
+        代价最低的前K条行程（最优优先搜索，按 itinerary_cost 升序，航班组合各不相同）
+
+        搜索状态为（机场、到达时刻、已乘航段），优先级为已有代价加上剩余航段的下界；
+        完整行程按代价从低到高出队，凑够K条即停止，同一状态最多展开K次，
+        搜索量只与K有关，不随经过枢纽机场的路径组合数增长
+
+        Args:
+            k: 返回的行程数
+            max_stops: 最大中转次数（0为只查直飞）
+            bounds: 航段数下界（默认按时刻表的航线计算）
+        """
+        if k <= 0 or start_airport == end_airport or max_stops < 0:
+            return []
+        max_legs = max_stops + 1
+        bounds = bounds or self.search_bounds(start_airport, end_airport, max_stops)
+        if bounds is None:
+            return []
+        # 走廊外的机场按 max_legs + 1 段处理（直接剪掉）
+        backward, unreachable = bounds.backward, max_legs + 1
+        legs = self._legs
+        # 每多一段航班至少增加的代价：飞行时间、最短转机等待及其权重、一次中转
+        leg_bound = self._min_block + min_connection * (1 + WAIT_WEIGHT) + STOP_PENALTY_MINUTES
+
+        # 堆元素：(代价下界, 序号, 已有代价, 首段起飞时刻, 到达时刻, 航班序号, 经过的机场, 转机等待)
+        heap = []
+        counter = 0
+        for flight_id in self._outgoing.get(start_airport, ()):
+            _, arrival, dep_minutes, weekdays, block = legs[flight_id]
+            remaining = backward.get(arrival, unreachable)
+            if remaining >= max_legs:
+                continue
+            for day in range(7):
+                if weekdays & (1 << day):
+                    dep_time = day * DAY_MINUTES + dep_minutes
+                    counter += 1
+                    heap.append((block + remaining * leg_bound, counter, block, dep_time, dep_time + block,
+                                 (flight_id,), (start_airport, arrival), ()))
+        heapq.heapify(heap)
+
+        results: Dict[Tuple[int, ...], Itinerary] = {}
+        expanded: Dict[Tuple[str, int, int], int] = defaultdict(int)
+        while heap and len(results) < k:
+            _, _, cost, departure, arr_time, flight_ids, airports, waits = heapq.heappop(heap)
+            airport = airports[-1]
+            if airport == end_airport:
+                if flight_ids not in results:
+                    results[flight_ids] = Itinerary(flight_ids, 1 << (departure // DAY_MINUTES), departure,
+                                                    arr_time, waits)
+                continue
+            # 同一机场、同一时刻（按周）、同样航段数的状态后续完全相同，展开K次足够
+            key = (airport, arr_time % WEEK_MINUTES, len(flight_ids))
+            if expanded[key] >= k:
+                continue
+            expanded[key] += 1
+            legs_left = max_legs - len(flight_ids)
+            for flight_id in self._outgoing.get(airport, ()):
+                _, arrival, dep_minutes, weekdays, block = legs[flight_id]
+                remaining = backward.get(arrival, unreachable)
+                if remaining >= legs_left or arrival in airports:
+                    continue
+                # 同一航班更晚的班次只会更晚到达，只取最早可衔接的一班
+                next_dep = _next_departure(arr_time + min_connection, dep_minutes, weekdays)
+                if next_dep is None or next_dep - arr_time > max_connection:
+                    continue
+                wait = next_dep - arr_time
+                next_cost = cost + wait * (1 + WAIT_WEIGHT) + block + STOP_PENALTY_MINUTES
+                counter += 1
+                heapq.heappush(heap, (next_cost + remaining * leg_bound, counter, next_cost, departure,
+                                      next_dep + block, flight_ids + (flight_id,), airports + (arrival,),
+                                      waits + (wait,)))
+
+        # 合并同一航班组合可出发的星期
+        itineraries = []
+        for itinerary in results.values():
+            feasible = self.evaluate([self.flights[flight_id] for flight_id in itinerary.flight_ids],
+                                     min_connection, max_connection)
+            if feasible is not None:
+                itinerary = itinerary._replace(weekdays=itinerary.weekdays | feasible.weekdays)
+            itineraries.append(itinerary)
+        return itineraries
+
+    def _itinerary(self, entry) -> Optional[Itinerary]:
+        """由剖面条目还原行程，经过重复机场的行程丢弃"""
+        flight_ids, waits = [], []
+        airports = [self.dep_airports[entry[2]]]
+        departure = entry[0]
+        previous_arrival = None
+        while entry is not None:
+            index = entry[2]
+            if previous_arrival is not None:
+                waits.append(self.dep_times[index] - previous_arrival)
+            airport = self.arr_airports[index]
+            if airport in airports:
+                return None
+            airports.append(airport)
+            flight_ids.append(self.flight_ids[index])
+            previous_arrival = self.arr_times[index]
+            entry = entry[3]
+        return Itinerary(tuple(flight_ids), 1 << ((departure // DAY_MINUTES) % 7), departure,
+                         previous_arrival, tuple(waits))
+
+    def evaluate(self, route: Sequence, min_connection: int = MIN_CONNECTION_MINUTES,
+                 max_connection: int = MAX_CONNECTION_MINUTES) -> Optional[Itinerary]:
+        """
+        检查航班组合是否可以按顺序衔接（机场相接、班期和转机时间满足要求）
+
+        Returns:
+            可行时返回行程（flight_ids 为空，weekdays 为可出发的星期），不可行时返回None
+        """
+        if not route:
+            return None
+        legs = []
+        for flight in route:
+            departure, arrival = flight[FIELD_DEPARTURE], flight[FIELD_ARRIVAL]
+            legs.append((departure, arrival, parse_time_minutes(flight[FIELD_TIME]),
+                         parse_weekday_mask(flight[FIELD_SCHEDULE]), int(self.block_minutes(departure, arrival))))
+        for previous, leg in zip(legs, legs[1:]):
+            if previous[1] != leg[0]:
+                return None
+
+        weekdays, best = 0, None
+        for day in range(7):
+            if not legs[0][3] & (1 << day):
+                continue
+            dep_time = day * DAY_MINUTES + legs[0][2]
+            arr_time = dep_time + legs[0][4]
+            waits = []
+            for _, _, dep_minutes, leg_weekdays, block in legs[1:]:
+                # 满足最短转机时间的最早一班（更晚的班次只会更晚到达）
+                next_dep = _next_departure(arr_time + min_connection, dep_minutes, leg_weekdays)
+                if next_dep is None or next_dep - arr_time > max_connection:
+                    break
+                waits.append(next_dep - arr_time)
+                arr_time = next_dep + block
+            else:
+                weekdays |= 1 << day
+                if best is None or arr_time - dep_time < best.arrival - best.departure:
+                    best = Itinerary((), 0, dep_time, arr_time, tuple(waits))
+        if best is None:
+            return None
+        return best._replace(weekdays=weekdays)
+
+    def is_valid_connection(self, flight1, flight2, min_connection: int = MIN_CONNECTION_MINUTES,
+                            max_connection: int = MAX_CONNECTION_MINUTES) -> bool:
+        """两个航班能否衔接（第一班的降落机场是第二班的起飞机场，且某天的班次满足转机时间）"""
+        return self.evaluate([flight1, flight2], min_connection, max_connection) is not None
+
+    def describe(self, itinerary: Itinerary) -> Dict:
+        """行程的时刻信息（出发星期、起飞和到达时刻、总耗时、转机等待）"""
+        days = (itinerary.arrival // DAY_MINUTES) - (itinerary.departure // DAY_MINUTES)
+        return {
+            'weekdays': format_weekday_mask(itinerary.weekdays),
+            'weekday_names': [WEEKDAY_NAMES[day] for day in range(7) if itinerary.weekdays & (1 << day)],
+            'departure_time': format_time_minutes(itinerary.departure % DAY_MINUTES),
+            'arrival_time': format_time_minutes(itinerary.arrival % DAY_MINUTES),
+            'arrival_day_offset': days,
+            'total_minutes': itinerary.total_minutes,
+            'wait_minutes': list(itinerary.waits)
+        }
+
+
+def _breadth_first(airport: str, depth: int, neighbors: Callable[[str], Iterable[str]],
+                   within: Optional[set] = None) -> Dict[str, int]:
+    """从机场出发广度优先扩展 depth 层（within 不为None时只经过其中的机场），返回各机场的最少航段数"""
+    hops = {airport: 0}
+    frontier = [airport]
+    for level in range(1, depth + 1):
+        next_frontier = []
+        for current in frontier:
+            for neighbor in neighbors(current):
+                if neighbor not in hops and (within is None or neighbor in within):
+                    hops[neighbor] = level
+                    next_frontier.append(neighbor)
+        if not next_frontier:
+            break
+        frontier = next_frontier
+    return hops
+
+
+def itinerary_cost(itinerary: Itinerary) -> float:
+    """行程代价（分钟）：总耗时 + 每次中转 STOP_PENALTY_MINUTES + 转机等待 × WAIT_WEIGHT"""
+    return itinerary.total_minutes + itinerary.stops * STOP_PENALTY_MINUTES + itinerary.wait_minutes * WAIT_WEIGHT
+
+
+def _insert_profile(profiles: Dict[str, list], airport: str, entry):
+    """按出发时刻从晚到早加入剖面，并记录出发更晚、到达不晚于它的最近条目位置（没有时为-1）"""
+    profile = profiles.get(airport)
+    if profile is None:
+        profiles[airport] = [[-entry[0]], [entry], [-1]]
+        return
+    entries, better = profile[1], profile[2]
+    position = len(entries) - 1
+    while position >= 0 and entries[position][1] > entry[1]:
+        position = better[position]
+    profile[0].append(-entry[0])
+    entries.append(entry)
+    better.append(position)
+
+
+def _next_departure(earliest: int, dep_minutes: int, weekdays: int) -> Optional[int]:
+    """不早于 earliest 的最早一班起飞时刻（周一零点起的分钟数），无班期时返回None"""
+    day = (earliest - dep_minutes + DAY_MINUTES - 1) // DAY_MINUTES
+    for offset in range(8):
+        if weekdays & (1 << ((day + offset) % 7)):
+            return (day + offset) * DAY_MINUTES + dep_minutes
+    return None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML压缩
+地图HTML中folium模板的缩进、空行和注释占了不少体积：
+去掉行首缩进和空行（换行保留，不影响脚本的自动分号和行内元素之间的空白），
+移除HTML注释和样式表注释；pre/textarea 原样保留，含模板字符串或续行的脚本不处理
+"""
+
+import re
+
+# 需要单独处理的元素（内容不按普通文本压缩）
+_RAW_ELEMENT_PATTERN = re.compile(r'(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)', re.S | re.I)
+# 行尾空白、换行及下一行的缩进（连续空行一并去掉）
+_LINE_BREAK_PATTERN = re.compile(r'[ \t]*\n\s*')
+# HTML注释（保留IE条件注释）
+_HTML_COMMENT_PATTERN = re.compile(r'<!--(?!\[if).*?-->', re.S)
+_CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.S)
+
+
+def minify_js(script: str) -> str:
+    """去掉脚本的行首缩进和空行；含模板字符串（`）或反斜杠续行的脚本原样返回"""
+    if '`' in script or '\\\n' in script:
+        return script
+    return _LINE_BREAK_PATTERN.sub('\n', script)
+
+def minify_css(css: str) -> str:
+    """去掉样式表注释、行首缩进和空行"""
+    return _LINE_BREAK_PATTERN.sub('\n', _CSS_COMMENT_PATTERN.sub('', css))
+
+def _minify_text(text: str) -> str:
+    return _LINE_BREAK_PATTERN.sub('\n', _HTML_COMMENT_PATTERN.sub('', text))
+
+def minify_html(document: str) -> str:
+    """
+    压缩HTML文档或片段
+
+    渲染结果不变：文本中的空白只去掉换行后的缩进，script/style 分别按脚本和样式表处理
+    """
+    parts = []
+    position = 0
+    for match in _RAW_ELEMENT_PATTERN.finditer(document):
+        parts.append(_minify_text(document[position:match.start()]))
+        open_tag, tag, content, close_tag = match.groups()
+        tag = tag.lower()
+        if tag == 'script':
+            content = minify_js(content)
+        elif tag == 'style':
+            content = minify_css(content)
+        parts.append(open_tag + content + close_tag)
+        position = match.end()
+    parts.append(_minify_text(document[position:]))
+    return ''.join(parts)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地图数据接口
+地图外壳（底图HTML）和叠加层数据（航线、机场统计）通过独立的HTTP接口下发：
+外壳按内容哈希寻址，长期缓存；叠加层数据按 (命名空间, 数据版本, 查询条件) 寻址，
+返回带强ETag的JSON。gzip和brotli压缩内容与缓存条目一起保存，接口按 Accept-Encoding 直接返回压缩内容，
+重复查看和切换标签页时只需304或很小的响应
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from flight_dataset import get_flight_dataset
+from render_cache import RenderCache, get_render_cache
+
+# 接口路径
+MAP_DATA_PATH = '/map-data'
+MAP_SHELL_PATH = '/map-shell'
+
+# 压缩级别（外壳只压缩一次，brotli使用最高级别；叠加层数据随查询生成，使用较快的级别）
+GZIP_LEVEL = 6
+DATA_BROTLI_QUALITY = 5
+SHELL_BROTLI_QUALITY = 11
+
+# 叠加层数据：可以重新验证（304），外壳：内容哈希寻址，不会变化
+DATA_CACHE_CONTROL = 'no-cache'
+SHELL_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+MapDataBuilder = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+
+class MapDataPayload(NamedTuple):
+    """预先序列化和压缩的响应内容"""
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    # 未安装brotli时为None
+    br_body: Optional[bytes] = None
+
+
+def make_payload(body: bytes, brotli_quality: int = DATA_BROTLI_QUALITY) -> MapDataPayload:
+    """计算强ETag和gzip、brotli压缩内容"""
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    try:
+        import brotli
+        br_body = brotli.compress(body, quality=brotli_quality)
+    except ImportError:
+        br_body = None
+    return MapDataPayload(body, gzip.compress(body, GZIP_LEVEL, mtime=0), etag, br_body)
+
+
+class MapDataStore:
+    """地图外壳和叠加层数据的登记与缓存"""
+
+    def __init__(self, cache: RenderCache):
+        self.cache = cache
+        self.enabled = False
+        self._builders: Dict[str, Tuple[MapDataBuilder, int, Optional[Callable], Optional[Callable]]] = {}
+        self._shells: Dict[str, MapDataPayload] = {}
+        self._lock = threading.Lock()
+
+    def register_builder(self, namespace: str, builder: MapDataBuilder, renderer_version: int = 0,
+                         airports_of: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                         check_query: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        登记叠加层数据生成函数
+
+        Args:
+            namespace: 地图命名空间（与渲染缓存相同，如 flight_map）
+            builder: builder(规范化查询条件, 数据集) -> {'layers': [图层描述, ...]}，查询条件无效时抛出ValueError
+            renderer_version: 渲染器版本，参与缓存键
+            airports_of: 由查询条件得到限定的机场（增量更新时保留不受影响的缓存）
+            check_query: 读取缓存前检查地址中的查询条件，字段或取值无效时抛出ValueError
+        """
+        self._builders[namespace] = (builder, renderer_version, airports_of, check_query)
+
+    def shell_url(self, shell) -> str:
+        """登记地图外壳并返回其地址"""
+        token = shell.etag
+        if token not in self._shells:
+            with self._lock:
+                if token not in self._shells:
+                    self._shells[token] = make_payload(shell.remote_document.encode('utf-8'),
+                                                       brotli_quality=SHELL_BROTLI_QUALITY)
+        return f'{MAP_SHELL_PATH}/{token}.html'
+
+    def data_url(self, namespace: str, version: str, query: Any) -> str:
+        """叠加层数据地址，查询条件规范化后编码在地址中，缓存失效后可按地址重新生成"""
+        query_json = json.dumps(_query_to_json(query), ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        return f'{MAP_DATA_PATH}/{namespace}/{version}.json?q={quote(query_json, safe="")}'
+
+    def get_shell(self, token: str) -> Optional[MapDataPayload]:
+        return self._shells.get(token)
+
+    def get_data(self, namespace: str, version: str, query: Dict[str, Any]) -> Optional[MapDataPayload]:
+        """
+        获取叠加层数据，未缓存时用当前数据集生成
+
+        Returns:
+            响应内容；命名空间未登记或数据版本不是当前版本时返回None
+
+        Raises:
+            ValueError: 查询条件无效
+        """
+        if namespace not in self._builders:
+            return None
+        builder, renderer_version, airports_of, check_query = self._builders[namespace]
+        if check_query is not None:
+            check_query(query)
+        dataset = get_flight_dataset()
+        if version != dataset.version:
+            return None
+
+        def build():
+            data = builder(query, dataset)
+            return make_payload(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+        return self.cache.get_or_create(f'{namespace}_data', version, query, build,
+                                        renderer_version=renderer_version,
+                                        airports=airports_of(query) if airports_of else ())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'namespaces': sorted(self._builders),
+            'shells': len(self._shells)
+        }
+
+
+def _query_to_json(query: Any) -> Dict[str, Any]:
+    """去掉空条件，得到与渲染缓存键一致的查询条件"""
+    if query is None:
+        return {}
+    return {key: value for key, value in query.items() if value is not None and value != ''}
+
+
+# 全局地图数据实例（与渲染缓存共用字节预算）
+_map_data_store = MapDataStore(get_render_cache())
+
+def get_map_data_store() -> MapDataStore:
+    """获取地图数据实例"""
+    return _map_data_store
+
+def enable_map_data_endpoint():
+    """启用地图数据接口，之后渲染的地图从接口加载外壳和叠加层数据（需先挂载 create_map_data_router）"""
+    _map_data_store.enabled = True
+    print("🛰️ 地图数据接口已启用")
+
+def create_map_data_router(store: Optional[MapDataStore] = None):
+    """创建地图数据接口路由（FastAPI）"""
+    from fastapi import APIRouter, HTTPException, Request
+    from fastapi.responses import RedirectResponse, Response
+
+    store = store or _map_data_store
+    router = APIRouter()
+
+    @router.get(MAP_SHELL_PATH + '/{token}.html')
+    def map_shell(token: str, request: Request):
+        payload = store.get_shell(token)
+        if payload is None:
+            return Response(status_code=404)
+        return payload_response(request, payload, 'text/html; charset=utf-8', SHELL_CACHE_CONTROL)
+
+    @router.get(MAP_DATA_PATH + '/{namespace}/{version}.json')
+    def map_data(namespace: str, version: str, request: Request, q: str = '{}'):
+        try:
+            query = json.loads(q)
+        except ValueError:
+            raise HTTPException(status_code=400, detail='查询条件不是有效的JSON')
+        if not isinstance(query, dict):
+            raise HTTPException(status_code=400, detail='查询条件应为JSON对象')
+        try:
+            payload = store.get_data(namespace, version, query)
+        except (ValueError, TypeError, KeyError) as e:
+            # 查询条件的字段或取值无效（如班期不是位掩码、细节级别不是整数）
+            raise HTTPException(status_code=400, detail=f'查询条件无效: {e}')
+        if payload is None:
+            current_version = get_flight_dataset().version
+            if namespace in store.get_stats()['namespaces'] and version != current_version:
+                # 页面打开后数据已更新，转到当前版本的数据
+                return RedirectResponse(store.data_url(namespace, current_version, query), status_code=307)
+            return Response(status_code=404)
+        return payload_response(request, payload, 'application/json; charset=utf-8', DATA_CACHE_CONTROL)
+
+    return router
+
+def payload_response(request, payload, media_type: str, cache_control: str):
+    """
+    返回预先压缩的响应内容（优先brotli，其次gzip），支持 If-None-Match
+
+    Args:
+        payload: 带 body、gzip_body、br_body、etag 的响应内容（MapDataPayload、static_assets.StaticAsset）
+    """
+    from fastapi.responses import Response
+
+    accepted = {token.split(';')[0].strip() for token in request.headers.get('accept-encoding', '').lower().split(',')}
+    if payload.br_body is not None and 'br' in accepted:
+        encoding, body = 'br', payload.br_body
+    elif payload.gzip_body is not None and 'gzip' in accepted:
+        encoding, body = 'gzip', payload.gzip_body
+    else:
+        encoding, body = None, payload.body
+    # 不同编码使用不同的强ETag
+    etag = payload.etag[:-1] + f'-{encoding}"' if encoding else payload.etag
+    headers = {'ETag': etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, media_type=media_type, headers=headers)
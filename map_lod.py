@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地图细节级别（LOD）
+按缩放级别预先聚合航线和机场：机场按经纬度网格合并为聚类，
+聚类之间的往返航线合并为一条带航班数的边，名称标签只保留航班最多的前N个。
+全量数据的聚合结果按聚合统计对象（即数据版本）缓存，浏览器缩放时按级别请求对应数据
+"""
+
+import threading
+import weakref
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class LodLevel(NamedTuple):
+    """细节级别"""
+    min_zoom: int
+    max_zoom: int
+    # 机场聚类的网格大小（度），0表示不聚类
+    cell_degrees: float
+    # 名称标签数量上限，None表示全部显示
+    max_labels: Optional[int]
+
+    def contains(self, zoom: int) -> bool:
+        return self.min_zoom <= zoom <= self.max_zoom
+
+
+# 细节级别（按缩放级别从粗到细）
+LOD_LEVELS = (
+    LodLevel(0, 4, 2.0, 15),
+    LodLevel(5, 6, 0.75, 50),
+    LodLevel(7, 18, 0.0, None),
+)
+
+
+class AirportCluster(NamedTuple):
+    """机场聚类"""
+    name: str
+    # 按航班数加权的中心 [纬度, 经度]
+    center: Tuple[float, float]
+    # 成员机场（按航班数降序）
+    members: Tuple[str, ...]
+    count: int
+
+
+class MapLevelOfDetail(NamedTuple):
+    """一个细节级别的聚合结果"""
+    level: LodLevel
+    clusters: List[AirportCluster]
+    # 机场 -> 聚类序号
+    cluster_of: Dict[str, int]
+    # (聚类序号, 聚类序号, 往返航班数)，序号小的在前
+    edges: List[Tuple[int, int, int]]
+    # 显示名称标签的聚类序号（航班数降序）
+    labels: List[int]
+
+
+def build_level_of_detail(route_counts: Dict[Tuple[str, str], int], airport_coords: Dict[str, list],
+                          level: LodLevel) -> MapLevelOfDetail:
+    """
+    计算一个细节级别的机场聚类、合并航线和名称标签
+
+    Args:
+        route_counts: (起飞机场, 降落机场) -> 航班数
+        airport_coords: 机场坐标，没有坐标的机场不参与聚合
+        level: 细节级别
+    """
+    import numpy as np
+
+    routes = [(dep, arr, count) for (dep, arr), count in route_counts.items()
+              if dep in airport_coords and arr in airport_coords]
+    airports = sorted({dep for dep, _, _ in routes} | {arr for _, arr, _ in routes})
+    if not airports:
+        return MapLevelOfDetail(level, [], {}, [], [])
+    airport_ids = {airport: index for index, airport in enumerate(airports)}
+    coords = np.array([airport_coords[airport][:2] for airport in airports], dtype=np.float64)
+    dep_ids = np.array([airport_ids[dep] for dep, _, _ in routes], dtype=np.int64)
+    arr_ids = np.array([airport_ids[arr] for _, arr, _ in routes], dtype=np.int64)
+    counts = np.array([count for _, _, count in routes], dtype=np.int64)
+
+    # 机场航班数（起飞+降落）
+    weights = (np.bincount(dep_ids, counts, len(airports)) + np.bincount(arr_ids, counts, len(airports)))
+
+    # 网格聚类：同一网格内的机场合并
+    if level.cell_degrees > 0:
+        cells = np.floor(coords / level.cell_degrees).astype(np.int64)
+        cell_keys = (cells[:, 0] + 1024) * 4096 + (cells[:, 1] + 2048)
+        _, inverse = np.unique(cell_keys, return_inverse=True)
+    else:
+        inverse = np.arange(len(airports))
+    cluster_count = int(inverse.max()) + 1
+    cluster_weights = np.bincount(inverse, weights, cluster_count)
+    centers = np.stack([np.bincount(inverse, weights * coords[:, axis], cluster_count) for axis in (0, 1)], axis=1)
+    centers /= np.maximum(cluster_weights, 1e-9)[:, None]
+
+    clusters = []
+    for cluster_id in range(cluster_count):
+        member_ids = np.flatnonzero(inverse == cluster_id)
+        member_ids = member_ids[np.argsort(-weights[member_ids], kind='stable')]
+        members = tuple(airports[int(i)] for i in member_ids)
+        name = members[0] if len(members) == 1 else f'{members[0]} 等{len(members)}个机场'
+        clusters.append(AirportCluster(name, (round(float(centers[cluster_id, 0]), 4),
+                                              round(float(centers[cluster_id, 1]), 4)),
+                                       members, int(cluster_weights[cluster_id])))
+
+    # 聚类之间的往返航线合并为一条边，聚类内部的航线不再绘制
+    a = np.minimum(inverse[dep_ids], inverse[arr_ids])
+    b = np.maximum(inverse[dep_ids], inverse[arr_ids])
+    between = a != b
+    edge_keys, edge_inverse = np.unique(a[between] * cluster_count + b[between], return_inverse=True)
+    edge_counts = np.bincount(edge_inverse, counts[between], len(edge_keys))
+    edges = [(int(key) // cluster_count, int(key) % cluster_count, int(count))
+             for key, count in zip(edge_keys, edge_counts)]
+
+    order = np.argsort(-cluster_weights, kind='stable')
+    labels = [int(i) for i in order[:level.max_labels]]
+    cluster_of = {airport: int(inverse[index]) for index, airport in enumerate(airports)}
+    return MapLevelOfDetail(level, clusters, cluster_of, edges, labels)
+
+
+class LevelOfDetailCache:
+    """按聚合统计对象缓存的细节级别，全量数据每个数据版本只聚合一次"""
+
+    def __init__(self):
+        self._coords = None
+        self._levels: 'weakref.WeakKeyDictionary[object, Dict[LodLevel, MapLevelOfDetail]]' = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get_level(self, aggregates, airport_coords: Dict[str, list], level: LodLevel) -> MapLevelOfDetail:
+        """
+        获取细节级别
+
+        Args:
+            aggregates: 航班聚合统计（FlightAggregates），查询结果等临时子集用完即释放
+            airport_coords: 机场坐标（数据集更新后为新对象，缓存随之重建）
+        """
+        with self._lock:
+            if airport_coords is not self._coords:
+                self._coords = airport_coords
+                self._levels = weakref.WeakKeyDictionary()
+            levels = self._levels.setdefault(aggregates, {})
+        result = levels.get(level)
+        if result is None:
+            result = build_level_of_detail(aggregates.route_counts, airport_coords, level)
+            levels[level] = result
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._coords = None
+            self._levels = weakref.WeakKeyDictionary()
+
+    def get_stats(self):
+        with self._lock:
+            levels = list(self._levels.values())
+        return {'aggregates': len(levels), 'levels': sum(len(level) for level in levels)}
+
+
+# 全局细节级别缓存实例
+_lod_cache = LevelOfDetailCache()
+
+def get_lod_cache() -> LevelOfDetailCache:
+    """获取细节级别缓存实例"""
+    return _lod_cache
+
+def get_level_of_detail(aggregates, airport_coords, level: LodLevel) -> MapLevelOfDetail:
+    """获取细节级别（见 LevelOfDetailCache.get_level）"""
+    return _lod_cache.get_level(aggregates, airport_coords, level)
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地图叠加层
+航线、机场标记和名称标签统一编码为一个紧凑的GeoJSON FeatureCollection，
+样式按要素类型（kind）共享、个别属性按要素覆盖，浏览器端一次遍历生成全部图层，
+渲染耗时和HTML体积只随数据量增长，不再随folium对象数量增长。
+图层可序列化为描述（to_spec），既可内联到地图HTML，也可由地图数据接口单独下发。
+弹窗和提示按要素类型共用模板（样式为共享CSS类），要素只携带紧凑的数据字段，
+打开弹窗时才在浏览器端生成HTML
+"""
+
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+from folium.map import Layer
+from folium.template import Template
+
+# 坐标保留的小数位数（约10米精度）
+COORD_PRECISION = 4
+
+
+def line_feature(locations: Sequence[Sequence[float]], kind: str, style: Optional[Dict[str, Any]] = None,
+                 tooltip: Optional[str] = None, popup: Optional[str] = None,
+                 data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    创建线要素
+
+    Args:
+        locations: [[纬度, 经度], ...] 坐标序列（与folium一致），也可以是形状 (n, 2) 的NumPy数组
+        kind: 要素类型，对应图层的共享样式和弹窗/提示模板
+        style: 覆盖共享样式的属性（如 color、weight）
+        tooltip, popup: 直接指定的提示和弹窗HTML（优先于模板）
+        data: 填入弹窗/提示模板的数据字段
+    """
+    if hasattr(locations, 'ndim'):
+        # NumPy数组整体交换坐标顺序并取整
+        import numpy as np
+        coordinates = np.round(locations[:, ::-1], COORD_PRECISION).tolist()
+    else:
+        coordinates = [_lng_lat(location) for location in locations]
+    return _feature('LineString', coordinates, kind, style, tooltip, popup, data)
+
+def point_feature(location: Sequence[float], kind: str, style: Optional[Dict[str, Any]] = None,
+                  tooltip: Optional[str] = None, popup: Optional[str] = None,
+                  label: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    创建点要素，默认绘制为圆形标记；提供 label 时绘制为文字标签
+
+    Args:
+        location: [纬度, 经度]（模板中可用 {lat}、{lng} 引用）
+        label: 标签文字（纯文本，浏览器端转义后显示）
+    """
+    feature = _feature('Point', _lng_lat(location), kind, style, tooltip, popup, data)
+    if label is not None:
+        feature['properties']['label'] = label
+    return feature
+
+def _feature(geometry_type: str, coordinates, kind: str, style, tooltip, popup, data) -> Dict[str, Any]:
+    properties: Dict[str, Any] = {'kind': kind}
+    if data:
+        properties['data'] = data
+    if style:
+        properties['style'] = style
+    if tooltip is not None:
+        properties['tooltip'] = tooltip
+    if popup is not None:
+        properties['popup'] = popup
+    return {'type': 'Feature', 'geometry': {'type': geometry_type, 'coordinates': coordinates},
+            'properties': properties}
+
+def _lng_lat(location: Sequence[float]) -> List[float]:
+    # GeoJSON坐标顺序为 [经度, 纬度]
+    return [round(float(location[1]), COORD_PRECISION), round(float(location[0]), COORD_PRECISION)]
+
+def to_script_json(value: Any) -> str:
+    """序列化为可直接嵌入 <script> 的紧凑JSON"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+
+
+# 弹窗共享样式：模板只引用CSS类，不再为每个弹窗内联样式
+POPUP_CSS = u"""
+.fm-popup { font-family: Arial, sans-serif; font-size: 12px; }
+.fm-card { font-family: "Segoe UI", Arial, sans-serif; font-size: 14px; line-height: 1.4; min-width: 200px; padding: 10px; }
+.fm-card-title { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 8px 12px;
+    margin: -10px -10px 10px -10px; border-radius: 5px 5px 0 0; font-weight: bold; font-size: 16px; text-align: center; }
+.fm-card-body { padding: 5px 0; }
+.fm-card-row { display: flex; justify-content: space-between; margin: 5px 0; font-weight: bold; }
+.fm-card-dep { color: #e74c3c; }
+.fm-card-arr { color: #27ae60; }
+.fm-card hr { margin: 10px 0; border: none; border-top: 2px solid #ecf0f1; }
+.fm-card-total { font-size: 15px; }
+.fm-card-total > span:first-child { color: #2c3e50; }
+.fm-card-total > span:last-child { color: #e74c3c; }
+.fm-card-footer { background: #f8f9fa; padding: 8px; margin: 10px -10px -10px -10px; border-radius: 0 0 5px 5px;
+    font-size: 12px; color: #6c757d; text-align: center; }
+"""
+
+# 浏览器端叠加层运行时：由图层描述（to_spec）生成Leaflet图层，内联渲染和远程加载共用
+OVERLAY_RUNTIME_JS = u"""
+var FLIGHT_MAP_POPUP_CSS = %s;
+function flightMapInjectCss(id, text) {
+    if (!document.getElementById(id)) {
+        var css = document.createElement('style');
+        css.id = id;
+        css.textContent = text;
+        document.head.appendChild(css);
+    }
+}
+function flightMapEscape(value) {
+    return String(value).replace(/[&<>"']/g, function(c) {
+        return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+    });
+}
+function flightMapFormat(template, feature) {
+    var data = feature.properties.data || {};
+    var coordinates = feature.geometry.coordinates;
+    return template.replace(/\{(\w+)\}/g, function(match, key) {
+        if (key in data) {
+            return flightMapEscape(data[key]);
+        }
+        if (feature.geometry.type === 'Point' && (key === 'lat' || key === 'lng')) {
+            return coordinates[key === 'lat' ? 1 : 0].toFixed(4);
+        }
+        return match;
+    });
+}
+function flightMapFeatureLayer(spec) {
+    var styles = spec.styles || {};
+    var popups = spec.popups || {};
+    var tooltips = spec.tooltips || {};
+    if (spec.labelCss) {
+        flightMapInjectCss('flight-map-label-css', '.flight-map-label > div { ' + spec.labelCss + ' }');
+    }
+    if (Object.keys(popups).length) {
+        flightMapInjectCss('flight-map-popup-css', FLIGHT_MAP_POPUP_CSS);
+    }
+    function styleOf(feature) {
+        return Object.assign({}, styles[feature.properties.kind], feature.properties.style);
+    }
+    return L.geoJson({type: 'FeatureCollection', features: spec.features}, {
+        style: styleOf,
+        pointToLayer: function(feature, latlng) {
+            var style = styleOf(feature);
+            if (feature.properties.label === undefined) {
+                return L.circleMarker(latlng, style);
+            }
+            return L.marker(latlng, {icon: L.divIcon({
+                className: 'flight-map-label',
+                html: '<div>' + flightMapEscape(feature.properties.label) + '</div>',
+                iconSize: style.iconSize,
+                iconAnchor: style.iconAnchor
+            })});
+        },
+        onEachFeature: function(feature, layer) {
+            // 模板内容在首次显示时才生成
+            var properties = feature.properties;
+            var tooltip = properties.tooltip || tooltips[properties.kind];
+            var popup = properties.popup || popups[properties.kind];
+            if (tooltip) {
+                layer.bindTooltip(properties.tooltip || function() {
+                    return flightMapFormat(tooltip, feature);
+                }, {sticky: true});
+            }
+            if (popup) {
+                var maxWidth = (styles[properties.kind] || {}).popupMaxWidth || 300;
+                layer.bindPopup(properties.popup || function() {
+                    return flightMapFormat(popup, feature);
+                }, {maxWidth: maxWidth});
+            }
+        }
+    });
+}
+function flightMapLodLayer(spec) {
+    // 按当前缩放级别显示对应细节级别，未内联的级别从数据接口加载一次
+    var group = L.layerGroup();
+    var built = {};
+    var loading = {};
+    var current = -1;
+    function levelOf(zoom) {
+        for (var i = 0; i < spec.levels.length; i++) {
+            if (zoom >= spec.levels[i].minZoom && zoom <= spec.levels[i].maxZoom) {
+                return i;
+            }
+        }
+        return spec.levels.length - 1;
+    }
+    function show(index) {
+        if (index === current && built[index]) {
+            group.clearLayers();
+            group.addLayer(built[index]);
+        }
+    }
+    function update() {
+        var index = levelOf(group._map.getZoom());
+        if (index === current) {
+            return;
+        }
+        current = index;
+        if (built[index] || loading[index]) {
+            show(index);
+            return;
+        }
+        var level = spec.levels[index];
+        var ready = function(specs) {
+            built[index] = L.layerGroup(specs.map(flightMapBuildLayer));
+            show(index);
+        };
+        if (level.layers) {
+            ready(level.layers);
+        } else {
+            loading[index] = true;
+            fetch(level.url, {credentials: 'same-origin'})
+                .then(function(response) { return response.json(); })
+                .then(function(payload) { ready(payload.layers); })
+                .catch(function(error) { console.warn('地图数据加载失败:', level.url, error); })
+                .then(function() { loading[index] = false; });
+        }
+    }
+    group.on('add', function() {
+        group._map.on('zoomend', update);
+        update();
+    });
+    group.on('remove', function() {
+        group._map.off('zoomend', update);
+        current = -1;
+    });
+    return group;
+}
+function flightMapBuildLayer(spec) {
+    if (spec.type === 'heat') {
+        return L.heatLayer(spec.points, spec.options);
+    }
+    if (spec.type === 'lod') {
+        return flightMapLodLayer(spec);
+    }
+    return flightMapFeatureLayer(spec);
+}
+function flightMapAddLayers(map, control, specs) {
+    specs.forEach(function(spec) {
+        var layer = flightMapBuildLayer(spec);
+        if (spec.show !== false) {
+            layer.addTo(map);
+        }
+        if (control && spec.overlay !== false && spec.control !== false) {
+            control.addOverlay(layer, spec.name);
+        }
+    });
+}
+function flightMapLoadOverlay(map, control, url) {
+    if (!url) {
+        return;
+    }
+    fetch(url, {credentials: 'same-origin'})
+        .then(function(response) {
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.json();
+        })
+        .then(function(payload) { flightMapAddLayers(map, control, payload.layers); })
+        .catch(function(error) { console.warn('地图数据加载失败:', url, error); });
+}
+""" % json.dumps(POPUP_CSS.strip())
+
+# 叠加层插件脚本（图层类型 -> [(名称, 地址)]）
+HEAT_LAYER_JS = [('leaflet-heat.js',
+                  'https://cdn.jsdelivr.net/gh/python-visualization/folium@main/folium/templates/leaflet_heat.min.js')]
+
+
+class OverlayLayer(Layer, ABC):
+    """由图层描述生成的叠加层，子类实现 to_spec"""
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = flightMapBuildLayer({{ this.spec_json }});
+        {% endmacro %}
+        """)
+
+    default_js: List = []
+
+    def render(self, **kwargs):
+        from branca.element import Element, JavascriptLink
+
+        figure = self.get_root()
+        # 运行时脚本按固定名称登记，多个叠加层只输出一次
+        figure.header.add_child(Element(f'<script>{OVERLAY_RUNTIME_JS}</script>'), name='flight_map_overlay_runtime')
+        for name, url in self.default_js:
+            figure.header.add_child(JavascriptLink(url), name=name)
+        super().render(**kwargs)
+
+    @property
+    def spec_json(self) -> str:
+        return to_script_json(self.to_spec())
+
+    @abstractmethod
+    def to_spec(self) -> Dict[str, Any]:
+        """图层描述（可JSON序列化，由浏览器端 flightMapBuildLayer 生成图层）"""
+
+    def _base_spec(self, layer_type: str) -> Dict[str, Any]:
+        return {'type': layer_type, 'name': self.layer_name, 'overlay': self.overlay,
+                'control': self.control, 'show': self.show}
+
+
+class FeatureCollectionLayer(OverlayLayer):
+    """
+    由GeoJSON FeatureCollection生成的叠加层
+
+    Args:
+        features: line_feature / point_feature 创建的要素列表
+        styles: 要素类型 -> Leaflet样式参数（popupMaxWidth 为弹窗最大宽度）
+        name: 图层名称（显示在图层控制器中）
+        label_css: 文字标签的CSS，所有标签共用 .flight-map-label > div 样式
+        popups: 要素类型 -> 弹窗HTML模板，{字段} 取自要素的 data（自动转义），可使用 POPUP_CSS 中的类
+        tooltips: 要素类型 -> 提示模板
+    """
+
+    def __init__(self, features: List[Dict[str, Any]], styles: Dict[str, Dict[str, Any]],
+                 name: Optional[str] = None, overlay: bool = True, control: bool = True, show: bool = True,
+                 label_css: Optional[str] = None, popups: Optional[Dict[str, str]] = None,
+                 tooltips: Optional[Dict[str, str]] = None):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'FeatureCollectionLayer'
+        self.features = features
+        self.styles = styles
+        self.label_css = label_css
+        self.popups = popups or {}
+        self.tooltips = tooltips or {}
+
+    def to_spec(self) -> Dict[str, Any]:
+        spec = self._base_spec('features')
+        spec.update(features=self.features, styles=self.styles)
+        if self.popups:
+            spec['popups'] = self.popups
+        if self.tooltips:
+            spec['tooltips'] = self.tooltips
+        if self.label_css:
+            spec['labelCss'] = self.label_css
+        return spec
+
+
+class HeatLayer(OverlayLayer):
+    """
+    热力图叠加层（Leaflet.heat）
+
+    Args:
+        points: [[纬度, 经度, 权重], ...]
+        options: Leaflet.heat 参数（minOpacity、radius、blur、gradient 等）
+    """
+
+    default_js = HEAT_LAYER_JS
+
+    def __init__(self, points: List[List[float]], options: Dict[str, Any], name: Optional[str] = None,
+                 overlay: bool = True, control: bool = True, show: bool = True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'HeatLayer'
+        self.points = points
+        self.options = options
+
+    def to_spec(self) -> Dict[str, Any]:
+        spec = self._base_spec('heat')
+        spec.update(points=self.points, options=self.options)
+        return spec
+
+
+class LevelOfDetailLayer(OverlayLayer):
+    """
+    按缩放级别切换内容的叠加层
+
+    Args:
+        levels: [{'minZoom': 最小缩放, 'maxZoom': 最大缩放, 'layers': [OverlayLayer, ...]}, ...]，
+            远程加载的级别用 'url' 代替 'layers'，地址返回 {'layers': [图层描述, ...]}
+    """
+
+    def __init__(self, levels: List[Dict[str, Any]], name: Optional[str] = None,
+                 overlay: bool = True, control: bool = True, show: bool = True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'LevelOfDetailLayer'
+        self.levels = levels
+
+    def render(self, **kwargs):
+        from branca.element import JavascriptLink
+
+        # 各级别图层不单独渲染，只需要它们的插件脚本
+        figure = self.get_root()
+        for level in self.levels:
+            for layer in level.get('layers', ()):
+                for name, url in layer.default_js:
+                    figure.header.add_child(JavascriptLink(url), name=name)
+        super().render(**kwargs)
+
+    def to_spec(self) -> Dict[str, Any]:
+        spec = self._base_spec('lod')
+        spec['levels'] = [
+            {key: [layer.to_spec() for layer in value] if key == 'layers' else value for key, value in level.items()}
+            for level in self.levels
+        ]
+        return spec
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地图外壳模板
+底图（瓦片图层、全屏控件、图层控制器）按地图类型只渲染一次为HTML/JS外壳，
+每次请求只渲染航线、标记、热力图等叠加层，再把叠加层脚本注入外壳，
+不再深拷贝和整体重新序列化folium地图。
+外壳和叠加层都去掉模板缩进，srcdoc 使用单引号，叠加层数据中大量的双引号不再转义为 &quot;
+"""
+
+import html
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from branca.element import MacroElement
+from folium.template import Template
+
+from map_config import add_all_map_layers
+from cdn_replacer import replace_cdn_urls
+from html_minifier import minify_html, minify_js
+
+# 默认地图中心和缩放级别
+DEFAULT_LOCATION = (35.8617, 104.1954)
+DEFAULT_ZOOM = 4
+
+# 各地图类型的图层控制器参数，None表示不添加图层控制器
+MAP_SHELL_LAYER_CONTROLS: Dict[str, Optional[Dict[str, Any]]] = {
+    'flight': {'position': 'topright', 'collapsed': False},
+    'distribution': {'position': 'topright', 'collapsed': False, 'autoZIndex': True},
+    'network': None,
+}
+
+# 外壳保留的folium默认资源（均已本地化）；Bootstrap脚本、Glyphicons、awesome-markers及其旋转样式
+# 只有folium的图标标记用到，地图上的标记由叠加层运行时绘制，不再加载
+MAP_SHELL_DEFAULT_JS = ('leaflet', 'jquery')
+MAP_SHELL_DEFAULT_CSS = ('leaflet_css', 'bootstrap_css', 'awesome_markers_font_css')
+
+# 全屏控件脚本
+FULLSCREEN_CONTROL_JS = """
+(function(map, title, titleCancel) {
+    var control = L.control({position: %(position)s});
+    control.onAdd = function() {
+        var container = L.DomUtil.create('div', 'leaflet-bar leaflet-control');
+        var button = L.DomUtil.create('a', 'leaflet-control-fullscreen-button', container);
+        button.href = '#';
+        button.setAttribute('role', 'button');
+        button.title = title;
+        button.innerHTML = '&#x26F6;';
+        button.style.fontSize = '18px';
+        L.DomEvent.disableClickPropagation(container);
+        L.DomEvent.on(button, 'click', function(e) {
+            L.DomEvent.preventDefault(e);
+            var element = map.getContainer();
+            if (document.fullscreenElement || document.webkitFullscreenElement) {
+                (document.exitFullscreen || document.webkitExitFullscreen).call(document);
+            } else if (element.requestFullscreen || element.webkitRequestFullscreen) {
+                (element.requestFullscreen || element.webkitRequestFullscreen).call(element);
+            }
+        });
+        function onChange() {
+            var active = !!(document.fullscreenElement || document.webkitFullscreenElement);
+            button.title = active ? titleCancel : title;
+            map.invalidateSize();
+        }
+        document.addEventListener('fullscreenchange', onChange);
+        document.addEventListener('webkitfullscreenchange', onChange);
+        return container;
+    };
+    control.addTo(map);
+})(%(map)s, %(title)s, %(title_cancel)s);
+"""
+
+# 各地图类型远程加载叠加层时需要的插件脚本
+MAP_SHELL_PLUGINS: Dict[str, List[str]] = {
+    'distribution': ['heat'],
+}
+
+# 外壳中叠加层内容的插入位置
+_HEADER_SLOT = '</head>'
+_BODY_SLOT = '</body>'
+_SCRIPT_SLOT = '</script>'
+
+# 与 branca Figure._repr_html_ 相同的iframe包装（srcdoc 改用单引号）
+_IFRAME_OPEN = (
+    '<div style="width:100%;">'
+    '<div style="position:relative;width:100%;height:0;padding-bottom:60%;">'
+    '<span style="color:#565656">Make this Notebook Trusted to load map: File -> Trust Notebook</span>'
+    '<iframe '
+)
+_IFRAME_CLOSE = (
+    ' style="position:absolute;width:100%;height:100%;left:0;top:0;'
+    'border:none !important;" allowfullscreen webkitallowfullscreen mozallowfullscreen>'
+    '</iframe></div></div>'
+)
+
+
+class FullscreenControl(MacroElement):
+    """全屏控件（用浏览器的 Fullscreen API，不再加载 leaflet.fullscreen 插件）"""
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}{{ this.render_script() }}{% endmacro %}
+    """)
+
+    def __init__(self, position: str = 'topleft', title: str = '全屏显示', title_cancel: str = '退出全屏'):
+        super().__init__()
+        self._name = 'FullscreenControl'
+        self.position = position
+        self.title = title
+        self.title_cancel = title_cancel
+
+    def render_script(self) -> str:
+        return FULLSCREEN_CONTROL_JS % {
+            'map': self._parent.get_name(),
+            'position': _js_string(self.position),
+            'title': _js_string(self.title),
+            'title_cancel': _js_string(self.title_cancel)
+        }
+
+
+class MapShell:
+    """预渲染的底图外壳"""
+
+    def __init__(self, map_type: str, location=DEFAULT_LOCATION, zoom_start: int = DEFAULT_ZOOM):
+        import folium
+
+        self.map_type = map_type
+        base_map = folium.Map(
+            location=list(location),
+            zoom_start=zoom_start,
+            tiles=None,  # 不添加默认瓦片，让add_all_map_layers处理
+            prefer_canvas=True,
+            control_scale=True
+        )
+        base_map.default_js = [(name, url) for name, url in base_map.default_js if name in MAP_SHELL_DEFAULT_JS]
+        base_map.default_css = [(name, url) for name, url in base_map.default_css if name in MAP_SHELL_DEFAULT_CSS]
+        add_all_map_layers(base_map)
+        FullscreenControl(position='topleft').add_to(base_map)
+
+        self.layer_control_name = None
+        layer_control_options = MAP_SHELL_LAYER_CONTROLS.get(map_type, MAP_SHELL_LAYER_CONTROLS['flight'])
+        if layer_control_options is not None:
+            layer_control = folium.LayerControl(**layer_control_options).add_to(base_map)
+            self.layer_control_name = layer_control.get_name()
+
+        self.map_id = base_map._id
+        self.map_name = base_map.get_name()
+
+        # 外壳只做一次CDN替换、压缩和HTML转义，按插入位置切成四段
+        document = minify_html(replace_cdn_urls(base_map.get_root().render()))
+        head, rest = _split_once(document, _HEADER_SLOT)
+        body, rest = _split_once(rest, _BODY_SLOT)
+        script, tail = _split_last(rest, _SCRIPT_SLOT)
+        parts = (head, _HEADER_SLOT + body, _BODY_SLOT + script, _SCRIPT_SLOT + tail)
+        self._parts = tuple(_escape_srcdoc(part) for part in parts)
+        self.size = sum(len(part) for part in self._parts)
+
+        # 远程加载版本：带叠加层运行时，页面地址的 data 参数指定叠加层数据地址
+        self.remote_document = self._build_remote_document(parts)
+        self.etag = hashlib.sha1(self.remote_document.encode('utf-8')).hexdigest()[:20]
+
+    def _build_remote_document(self, parts) -> str:
+        from branca.element import JavascriptLink
+        from map_overlays import OVERLAY_RUNTIME_JS, HEAT_LAYER_JS
+
+        plugin_js = {'heat': HEAT_LAYER_JS}
+        header = [f'<script>{OVERLAY_RUNTIME_JS}</script>']
+        for plugin in MAP_SHELL_PLUGINS.get(self.map_type, []):
+            header.extend(JavascriptLink(url).render() for _, url in plugin_js[plugin])
+        loader = (
+            f"\nflightMapLoadOverlay({self.map_name}, {self.layer_control_name or 'null'}, "
+            f"new URLSearchParams(window.location.search).get('data'));\n"
+        )
+        head, head_to_body, body_to_script, tail = parts
+        return ''.join((head, replace_cdn_urls(''.join(header)), head_to_body, body_to_script, loader, tail))
+
+    def remote_html(self, shell_url: str, data_url: str) -> str:
+        """返回从 shell_url 加载外壳、再从 data_url 获取叠加层数据的iframe HTML"""
+        from urllib.parse import quote
+        src = f'{shell_url}?data={quote(data_url, safe="/")}'
+        return f'{_IFRAME_OPEN}src="{html.escape(src)}"{_IFRAME_CLOSE}'
+
+    def new_overlay(self):
+        """创建绑定到外壳的叠加层地图，叠加元素添加到它上面"""
+        return _create_overlay_map(self)
+
+    def render(self, overlay) -> str:
+        """只渲染叠加层并注入外壳，返回与 folium 地图 _repr_html_ 相同结构的iframe HTML"""
+        figure = overlay.get_root()
+        header_names = set(figure.header._children)
+        html_names = set(figure.html._children)
+        script_names = set(figure.script._children)
+
+        control_lines = []
+        for element in overlay._children.values():
+            element.render()
+            if self.layer_control_name and getattr(element, 'overlay', False) and getattr(element, 'control', False):
+                control_lines.append(
+                    f'{self.layer_control_name}.addOverlay({element.get_name()}, {_js_string(element.layer_name)});'
+                )
+
+        header = ''.join(child.render() for name, child in figure.header._children.items()
+                         if name not in header_names)
+        body = ''.join(child.render() for name, child in figure.html._children.items()
+                       if name not in html_names)
+        script = ''.join(child.render() for name, child in figure.script._children.items()
+                         if name not in script_names)
+        if control_lines:
+            script += '\n' + '\n'.join(control_lines) + '\n'
+
+        head, head_to_body, body_to_script, tail = self._parts
+        return ''.join((
+            _IFRAME_OPEN, "srcdoc='",
+            head, _escape_srcdoc(minify_html(replace_cdn_urls(header))) if header else '',
+            head_to_body, _escape_srcdoc(minify_html(body)),
+            body_to_script, _escape_srcdoc(minify_js(script)),
+            tail,
+            "'", _IFRAME_CLOSE
+        ))
+
+
+def _create_overlay_map(shell: MapShell):
+    """
+    创建叠加层地图
+
+    叠加层地图不含瓦片和控件，名称与外壳中的地图变量相同，
+    叠加元素渲染出的 addTo(map_xxx) 脚本直接作用于外壳地图
+    """
+    import folium
+
+    overlay = folium.Map(location=None, tiles=None)
+    overlay._id = shell.map_id
+    overlay.map_shell = shell
+    return overlay
+
+
+def _split_once(document: str, marker: str):
+    index = document.index(marker)
+    return document[:index], document[index + len(marker):]
+
+def _split_last(document: str, marker: str):
+    index = document.rindex(marker)
+    return document[:index], document[index + len(marker):]
+
+def _escape_srcdoc(text: str) -> str:
+    """转义单引号 srcdoc 属性的内容（双引号不需要转义）"""
+    return text.replace('&', '&amp;').replace("'", '&#x27;').replace('<', '&lt;').replace('>', '&gt;')
+
+def _js_string(value: str) -> str:
+    return json.dumps(value)
+
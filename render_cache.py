@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染结果缓存
+地图HTML、图表等渲染结果统一按 (命名空间, 数据版本, 规范化查询条件, 渲染器版本) 缓存，
+总大小超过预算时按最近最少使用淘汰，并按命名空间统计命中、未命中和淘汰次数
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# 缓存总大小预算（MB），可通过环境变量 RENDER_CACHE_MAX_MB 调整
+DEFAULT_MAX_BYTES = int(float(os.getenv('RENDER_CACHE_MAX_MB', '128')) * 1024 * 1024)
+
+CacheKey = Tuple[str, Optional[str], Any, int]
+
+
+class CacheEntry:
+    """缓存项"""
+
+    __slots__ = ('value', 'size', 'airports')
+
+    def __init__(self, value: Any, size: int, airports: frozenset):
+        self.value = value
+        self.size = size
+        # 查询限定的机场，为空表示与全部航班有关
+        self.airports = airports
+
+
+def normalize_query(query: Any) -> Any:
+    """把查询条件规范化为可哈希的值（去掉空条件、字典按键排序、字符串去除首尾空白）"""
+    if query is None:
+        return ()
+    if isinstance(query, Mapping):
+        return tuple(sorted((str(key), normalize_query(value)) for key, value in query.items()
+                            if value is not None and value != ''))
+    if isinstance(query, (list, tuple, set, frozenset)):
+        values = [normalize_query(value) for value in query]
+        return tuple(sorted(values, key=repr) if isinstance(query, (set, frozenset)) else values)
+    if isinstance(query, str):
+        return query.strip()
+    return query
+
+def estimate_size(value: Any) -> int:
+    """估算缓存值占用的字节数"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    to_json = getattr(value, 'to_json', None)
+    if callable(to_json):
+        # Plotly 图表按序列化后的大小估算
+        try:
+            return len(to_json())
+        except Exception:
+            pass
+    return sys.getsizeof(value)
+
+
+class RenderCache:
+    """线程安全的LRU渲染缓存"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: 'OrderedDict[CacheKey, CacheEntry]' = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(namespace: str, version: Optional[str], query: Any = None, renderer_version: int = 0) -> CacheKey:
+        """生成缓存键，version 为 None 表示与数据版本无关"""
+        return (namespace, version, normalize_query(query), renderer_version)
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        """读取缓存，命中时移到最近使用位置"""
+        with self._lock:
+            entry = self._entries.get(key)
+            stats = self._namespace_stats(key[0])
+            if entry is None:
+                stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            stats['hits'] += 1
+            return entry.value
+
+    def put(self, key: CacheKey, value: Any, airports: Iterable[str] = ()) -> Any:
+        """写入缓存，超出预算时淘汰最久未使用的缓存项"""
+        entry = CacheEntry(value, estimate_size(value), frozenset(airport for airport in airports if airport))
+        with self._lock:
+            self._remove(key)
+            if entry.size > self.max_bytes:
+                # 单项超过总预算时不缓存
+                self._namespace_stats(key[0])['evictions'] += 1
+                return value
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            stats = self._namespace_stats(key[0])
+            stats['entries'] += 1
+            stats['bytes'] += entry.size
+            while self.total_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._namespace_stats(oldest_key[0])['evictions'] += 1
+        return value
+
+    def get_or_create(self, namespace: str, version: Optional[str], query: Any, factory: Callable[[], Any],
+                      renderer_version: int = 0, airports: Iterable[str] = ()) -> Any:
+        """
+        读取缓存，未命中时调用 factory 渲染并写入
+
+        渲染在锁外进行，并发请求同一未缓存内容时可能重复渲染，结果相同
+        """
+        key = self.make_key(namespace, version, query, renderer_version)
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, factory(), airports)
+        return value
+
+    def invalidate(self, namespace: Optional[str] = None, keep_version: Optional[str] = None) -> int:
+        """
+        删除缓存项
+
+        Args:
+            namespace: 只删除该命名空间，None表示全部
+            keep_version: 保留该数据版本及与数据版本无关的缓存项
+
+        Returns:
+            删除的缓存项数量
+        """
+        with self._lock:
+            keys = [key for key in self._entries
+                    if (namespace is None or key[0] == namespace)
+                    and (keep_version is None or key[1] not in (None, keep_version))]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def carry_forward(self, old_version: str, new_version: str, touched_airports: Iterable[str]) -> int:
+        """
+        增量更新后保留不受影响的缓存项
+
+        查询限定的机场都没有航班变化时，渲染结果与旧版本相同，改用新版本的键；
+        旧版本的其余缓存项（包括未限定机场的全量渲染）删除
+
+        Returns:
+            保留的缓存项数量
+        """
+        touched_airports = set(touched_airports)
+        kept = 0
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == old_version]:
+                entry = self._entries[key]
+                self._remove(key)
+                if entry.airports and entry.airports.isdisjoint(touched_airports):
+                    new_key = (key[0], new_version, key[2], key[3])
+                    self._entries[new_key] = entry
+                    self.total_bytes += entry.size
+                    stats = self._namespace_stats(key[0])
+                    stats['entries'] += 1
+                    stats['bytes'] += entry.size
+                    kept += 1
+        return kept
+
+    def keys(self, namespace: Optional[str] = None):
+        with self._lock:
+            return [key for key in self._entries if namespace is None or key[0] == namespace]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'namespaces': {namespace: dict(stats) for namespace, stats in self._stats.items()}
+            }
+
+    def _remove(self, key: CacheKey):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+            stats = self._namespace_stats(key[0])
+            stats['entries'] -= 1
+            stats['bytes'] -= entry.size
+
+    def _namespace_stats(self, namespace: str) -> Dict[str, int]:
+        stats = self._stats.get(namespace)
+        if stats is None:
+            stats = self._stats[namespace] = {'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0, 'bytes': 0}
+        return stats
+
+
+# 全局渲染缓存实例
+_render_cache = RenderCache()
+
+def get_render_cache() -> RenderCache:
+    """获取渲染缓存实例"""
+    return _render_cache
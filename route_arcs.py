@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+航线弧线几何
+用NumPy批量计算机场间的大圆航线，同一航线的多个航班沿航线法向展开成扇形，
+结果按 (起飞机场, 降落机场, 并行航班数) 缓存，机场坐标更新后自动重算
+"""
+
+import os
+import threading
+from typing import Dict, Iterable, Tuple
+
+# 每条弧线的采样点数，可通过环境变量 ROUTE_ARC_POINTS 调整
+DEFAULT_ARC_POINTS = max(2, int(os.getenv('ROUTE_ARC_POINTS', '16')))
+
+# 弧线中点向航线法向偏移的角度（相对航线角距离的比例）
+# 偏移方向随飞行方向变化，往返航线分别位于两侧
+DEFAULT_BEND = 0.1
+# 同航线相邻航班之间的额外偏移比例
+FAN_OUT_SPREAD = 0.06
+
+RouteKey = Tuple[str, str, int]
+
+
+def great_circle_arcs(starts, ends, n_points: int = DEFAULT_ARC_POINTS, offsets=None):
+    """
+    批量计算大圆弧线
+
+    Args:
+        starts: 起点坐标数组，形状 (m, 2)，每行 [纬度, 经度]
+        ends: 终点坐标数组，形状 (m, 2)
+        n_points: 每条弧线的采样点数（含起终点）
+        offsets: 每条弧线中点沿法向的偏移比例，形状 (m,)，None表示沿大圆
+
+    Returns:
+        形状 (m, n_points, 2) 的 [纬度, 经度] 数组
+    """
+    import numpy as np
+
+    p0 = _unit_vectors(np.asarray(starts, dtype=np.float64))
+    p1 = _unit_vectors(np.asarray(ends, dtype=np.float64))
+    t = np.linspace(0.0, 1.0, n_points)
+
+    # 球面线性插值；起终点重合时 sin(ω)=0，退化为线性插值
+    omega = np.arccos(np.clip(np.einsum('ij,ij->i', p0, p1), -1.0, 1.0))[:, None]
+    sin_omega = np.sin(omega)
+    degenerate = sin_omega < 1e-12
+    safe_sin = np.where(degenerate, 1.0, sin_omega)
+    w0 = np.where(degenerate, 1.0 - t, np.sin((1.0 - t) * omega) / safe_sin)
+    w1 = np.where(degenerate, t, np.sin(t * omega) / safe_sin)
+    points = w0[:, :, None] * p0[:, None, :] + w1[:, :, None] * p1[:, None, :]
+
+    if offsets is not None:
+        # 沿大圆所在平面的法向偏移，偏移量在中点最大、两端为零
+        normal = np.cross(p0, p1)
+        norm = np.linalg.norm(normal, axis=1, keepdims=True)
+        normal = np.divide(normal, norm, out=np.zeros_like(normal), where=norm > 1e-12)
+        bend = np.asarray(offsets, dtype=np.float64)[:, None] * omega * np.sin(np.pi * t)
+        points = points + bend[:, :, None] * normal[:, None, :]
+
+    points /= np.linalg.norm(points, axis=2, keepdims=True)
+    lat = np.degrees(np.arcsin(np.clip(points[:, :, 2], -1.0, 1.0)))
+    lon = np.degrees(np.arctan2(points[:, :, 1], points[:, :, 0]))
+    return np.stack((lat, lon), axis=2)
+
+def fan_out_offsets(n_parallel: int, bend: float = DEFAULT_BEND, spread: float = FAN_OUT_SPREAD):
+    """同一航线 n_parallel 个航班的法向偏移比例，以 bend 为中心对称展开"""
+    import numpy as np
+    return bend + (np.arange(n_parallel) - (n_parallel - 1) / 2) * spread
+
+def _unit_vectors(coords):
+    import numpy as np
+    lat = np.radians(coords[:, 0])
+    lon = np.radians(coords[:, 1])
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=1)
+
+
+class RouteArcCache:
+    """按机场坐标缓存的航线弧线"""
+
+    def __init__(self):
+        self._coords = None
+        self._arcs: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def get_arcs(self, airport_coords: Dict[str, list], routes: Iterable[RouteKey],
+                 n_points: int = DEFAULT_ARC_POINTS, bend: float = DEFAULT_BEND) -> Dict[RouteKey, object]:
+        """
+        获取航线弧线，未缓存的航线一次性批量计算
+
+        Args:
+            airport_coords: 机场坐标（数据集更新后为新对象，缓存随之重建）
+            routes: (起飞机场, 降落机场, 并行航班数) 列表，机场须有坐标
+            n_points: 每条弧线的采样点数
+            bend: 弧线中心偏移比例，0表示沿大圆
+
+        Returns:
+            (起飞机场, 降落机场, 并行航班数) -> 形状 (并行航班数, n_points, 2) 的 [纬度, 经度] 数组
+        """
+        import numpy as np
+
+        routes = list(dict.fromkeys(routes))
+        with self._lock:
+            if airport_coords is not self._coords:
+                self._coords = airport_coords
+                self._arcs = {}
+            arcs = self._arcs
+
+        result = {}
+        missing = []
+        for route in routes:
+            arc = arcs.get((route, n_points, bend))
+            if arc is None:
+                missing.append(route)
+            else:
+                result[route] = arc
+
+        if missing:
+            # 每个航班一行，所有缺失航线合并为一次向量化计算
+            counts = [n_parallel for _, _, n_parallel in missing]
+            starts = np.repeat([airport_coords[dep] for dep, _, _ in missing], counts, axis=0)
+            ends = np.repeat([airport_coords[arr] for _, arr, _ in missing], counts, axis=0)
+            offsets = np.concatenate([fan_out_offsets(n_parallel, bend) for n_parallel in counts])
+            computed = great_circle_arcs(starts, ends, n_points, offsets)
+            computed.setflags(write=False)
+            position = 0
+            for route, n_parallel in zip(missing, counts):
+                arc = computed[position:position + n_parallel]
+                position += n_parallel
+                arcs[(route, n_points, bend)] = arc
+                result[route] = arc
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._coords = None
+            self._arcs = {}
+
+    def get_stats(self):
+        return {'routes': len(self._arcs)}
+
+
+# 全局航线弧线缓存实例
+_route_arc_cache = RouteArcCache()
+
+def get_route_arc_cache() -> RouteArcCache:
+    """获取航线弧线缓存实例"""
+    return _route_arc_cache
+
+def get_route_arcs(airport_coords, routes: Iterable[RouteKey], n_points: int = DEFAULT_ARC_POINTS,
+                   bend: float = DEFAULT_BEND) -> Dict[RouteKey, object]:
+    """获取航线弧线（见 RouteArcCache.get_arcs）"""
+    return _route_arc_cache.get_arcs(airport_coords, routes, n_points, bend)
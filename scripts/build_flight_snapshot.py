@@ -0,0 +1,25 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flight_dataset import DEFAULT_FLIGHT_FILE
+from flight_snapshot import load_or_build_snapshot, get_snapshot_path
+
+# 预编译航班数据快照（部署前运行，避免首次启动时解析JSONL）
+def main():
+    source = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FLIGHT_FILE
+
+    start = time.perf_counter()
+    snapshot = load_or_build_snapshot(source)
+    elapsed = time.perf_counter() - start
+
+    snapshot_path = get_snapshot_path(source)
+    size = snapshot_path.stat().st_size if snapshot_path.exists() else 0
+    print(f"快照文件: {snapshot_path}")
+    print(f"航班数: {len(snapshot.table)}，机场坐标: {len(snapshot.airport_coords)} 个")
+    print(f"文件大小: {size / 1024:.1f}KB，耗时 {elapsed * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import re
+import sys
+import time
+import urllib.request
+from pathlib import Path, PurePosixPath
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from static_assets import VENDOR_DIR, VENDOR_PACKAGES, get_static_asset_store, write_precompressed
+
+# 样式表中的相对引用（字体、图片）
+CSS_URL_PATTERN = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+def download(url: str) -> bytes:
+    request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+def css_references(relative: str, content: bytes):
+    """样式表 url() 引用的包内文件（忽略 data: 和绝对地址）"""
+    base = PurePosixPath(relative).parent
+    for reference in CSS_URL_PATTERN.findall(content.decode('utf-8', errors='ignore')):
+        reference = reference.split('?')[0].split('#')[0].strip()
+        if not reference or reference.startswith(('data:', 'http:', 'https:', '//', '/')):
+            continue
+        parts = []
+        for part in (base / reference).parts:
+            if part == '..':
+                if parts:
+                    parts.pop()
+            elif part != '.':
+                parts.append(part)
+        yield '/'.join(parts)
+
+# 下载前端库到 static/vendor 并生成预压缩文件（在可以访问CDN的环境运行，下载结果提交到仓库）
+def main():
+    parser = argparse.ArgumentParser(description='下载本地静态资源')
+    parser.add_argument('--force', action='store_true', help='重新下载已存在的文件')
+    parser.add_argument('--check', action='store_true', help='只列出未下载的文件')
+    args = parser.parse_args()
+
+    if args.check:
+        missing = get_static_asset_store().missing_files()
+        for path in missing:
+            print(f"❌ {path}")
+        print(f"未下载: {len(missing)} 个文件")
+        sys.exit(1 if missing else 0)
+
+    start = time.perf_counter()
+    downloaded = failed = 0
+    for package in VENDOR_PACKAGES:
+        package_dir = VENDOR_DIR / package.key
+        queue = list(package.files)
+        seen = set()
+        while queue:
+            relative = queue.pop(0)
+            if relative in seen:
+                continue
+            seen.add(relative)
+            target = package_dir / relative
+            if target.is_file() and not args.force:
+                content = target.read_bytes()
+            else:
+                try:
+                    content = download(package.source + relative)
+                except Exception as e:
+                    print(f"❌ {package.key}/{relative}: {e}")
+                    failed += 1
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(content)
+                downloaded += 1
+                print(f"✅ {package.key}/{relative} ({len(content) / 1024:.1f}KB)")
+            if relative.endswith('.css'):
+                queue.extend(css_references(relative, content))
+            # 生成 .gz/.br 预压缩文件（启动时直接读取）
+            write_precompressed(target)
+
+    elapsed = time.perf_counter() - start
+    stats = get_static_asset_store().get_stats()
+    print(f"下载 {downloaded} 个文件，失败 {failed} 个，耗时 {elapsed:.1f}s")
+    print(f"本地资源: {stats['files']} 个文件，{stats['bytes'] / 1024:.1f}KB"
+          f"（gzip {stats['gzip_bytes'] / 1024:.1f}KB，brotli {stats['br_bytes'] / 1024:.1f}KB）")
+    for bundle in stats['bundles']:
+        print(f"  {bundle}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
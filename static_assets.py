@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地静态资源
+地图和页面用到的前端库（Leaflet、jQuery、Bootstrap样式、FontAwesome及Leaflet.heat）放在 static/vendor 下，
+由应用自己的接口下发：地址中带包内容哈希，响应长期缓存（immutable），
+gzip/brotli 压缩版本由下载脚本预先生成（.gz/.br），首屏不再依赖第三方CDN，离线环境也能正常显示地图
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# 本地资源目录和接口路径
+VENDOR_DIR = Path(__file__).resolve().parent / 'static' / 'vendor'
+STATIC_ASSETS_PATH = '/static/vendor'
+
+# 地址带内容哈希，内容不会变化
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 预压缩文件使用最高压缩级别；缺少预压缩文件时启动时压缩，使用较快的级别
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+RUNTIME_GZIP_LEVEL = 6
+RUNTIME_BROTLI_QUALITY = 5
+
+# 预压缩文件的后缀
+PRECOMPRESSED_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+# 需要预压缩的文件类型（woff2、png 本身已压缩）
+COMPRESSIBLE_SUFFIXES = ('.js', '.css', '.svg', '.ttf', '.eot', '.json')
+
+# 地址中内容哈希的长度
+HASH_LENGTH = 10
+
+# 部分系统的 mimetypes 缺少字体类型
+mimetypes.add_type('font/woff2', '.woff2')
+mimetypes.add_type('font/woff', '.woff')
+mimetypes.add_type('font/ttf', '.ttf')
+
+
+class VendorPackage(NamedTuple):
+    """本地化的前端库"""
+    name: str
+    version: str
+    # 下载地址前缀（scripts/vendor_static_assets.py 使用）
+    source: str
+    # 需要下载的文件（相对包目录），样式表 url() 引用的字体、图片由下载脚本一并下载
+    files: Tuple[str, ...]
+    # 第三方CDN地址 -> 包内文件
+    urls: Dict[str, str]
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}-{self.version}'
+
+
+VENDOR_PACKAGES = (
+    VendorPackage('leaflet', '1.9.3', 'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/',
+                  ('leaflet.js', 'leaflet.css', 'images/layers.png', 'images/layers-2x.png',
+                   'images/marker-icon.png', 'images/marker-icon-2x.png', 'images/marker-shadow.png'), {
+        'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js': 'leaflet.js',
+        'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css': 'leaflet.css',
+        'https://unpkg.com/leaflet@1.9.3/dist/leaflet.js': 'leaflet.js',
+        'https://unpkg.com/leaflet@1.9.3/dist/leaflet.css': 'leaflet.css',
+        'https://cdn.bootcdn.net/ajax/libs/leaflet/1.9.3/leaflet.js': 'leaflet.js',
+        'https://cdn.bootcdn.net/ajax/libs/leaflet/1.9.3/leaflet.css': 'leaflet.css',
+    }),
+    VendorPackage('jquery', '3.7.1', 'https://cdn.jsdelivr.net/npm/jquery@3.7.1/dist/', ('jquery.min.js',), {
+        'https://code.jquery.com/jquery-3.7.1.min.js': 'jquery.min.js',
+        'https://cdn.bootcdn.net/ajax/libs/jquery/3.7.1/jquery.min.js': 'jquery.min.js',
+    }),
+    VendorPackage('bootstrap', '5.2.2', 'https://cdn.jsdelivr.net/npm/bootstrap@5.2.2/dist/',
+                  ('css/bootstrap.min.css',), {
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.2.2/dist/css/bootstrap.min.css': 'css/bootstrap.min.css',
+        'https://cdn.bootcdn.net/ajax/libs/twitter-bootstrap/5.2.2/css/bootstrap.min.css': 'css/bootstrap.min.css',
+    }),
+    VendorPackage('fontawesome-free', '6.2.0', 'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.2.0/',
+                  ('css/all.min.css',), {
+        'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.2.0/css/all.min.css': 'css/all.min.css',
+        'https://cdn.bootcdn.net/ajax/libs/font-awesome/6.2.0/css/all.min.css': 'css/all.min.css',
+    }),
+    # folium 随包发布的 Leaflet.heat（含权重修复补丁）
+    VendorPackage('leaflet.heat', 'folium', 'https://cdn.jsdelivr.net/gh/python-visualization/folium@main/folium/templates/',
+                  ('leaflet_heat.min.js',), {
+        'https://cdn.jsdelivr.net/gh/python-visualization/folium@main/folium/templates/leaflet_heat.min.js':
+            'leaflet_heat.min.js',
+    }),
+)
+
+
+class StaticAsset(NamedTuple):
+    """一个本地资源文件（压缩内容在加载时生成）"""
+    body: bytes
+    gzip_body: Optional[bytes]
+    br_body: Optional[bytes]
+    etag: str
+    media_type: str
+
+
+def _compress(body: bytes, encoding: str, runtime: bool) -> Optional[bytes]:
+    """gzip或brotli压缩（未安装brotli时返回None）"""
+    if encoding == 'gzip':
+        return gzip.compress(body, RUNTIME_GZIP_LEVEL if runtime else GZIP_LEVEL, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(body, quality=RUNTIME_BROTLI_QUALITY if runtime else BROTLI_QUALITY)
+
+def _decompress(data: bytes, encoding: str) -> Optional[bytes]:
+    try:
+        if encoding == 'gzip':
+            return gzip.decompress(data)
+        import brotli
+        return brotli.decompress(data)
+    except Exception:
+        return None
+
+def _load_compressed(path: Path, body: bytes, encoding: str) -> Optional[bytes]:
+    """读取预压缩文件（解压后与原文件一致才使用），没有时在启动时压缩"""
+    compressed_path = path.with_name(path.name + PRECOMPRESSED_SUFFIXES[encoding])
+    compressed = None
+    if compressed_path.is_file():
+        compressed = compressed_path.read_bytes()
+        if _decompress(compressed, encoding) != body:
+            compressed = None
+    if compressed is None:
+        compressed = _compress(body, encoding, runtime=True)
+    # 压缩后没有变小的不使用
+    if compressed is not None and len(compressed) >= len(body):
+        return None
+    return compressed
+
+def write_precompressed(path: Path) -> Dict[str, int]:
+    """为文本类文件生成 .gz/.br 预压缩文件（最高压缩级别），返回各编码的字节数"""
+    if path.suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+        return {}
+    body = path.read_bytes()
+    sizes = {}
+    for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+        compressed = _compress(body, encoding, runtime=False)
+        if compressed is not None:
+            path.with_name(path.name + suffix).write_bytes(compressed)
+            sizes[encoding] = len(compressed)
+    return sizes
+
+def make_asset(path: Path) -> StaticAsset:
+    """读取文件，计算强ETag，文本类文件带gzip和brotli压缩内容（未安装brotli时只有gzip）"""
+    body = path.read_bytes()
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    media_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+    if media_type.startswith('text/') or media_type == 'application/javascript':
+        media_type += '; charset=utf-8'
+
+    gzip_body = br_body = None
+    if path.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+        gzip_body = _load_compressed(path, body, 'gzip')
+        br_body = _load_compressed(path, body, 'br')
+    return StaticAsset(body, gzip_body, br_body, etag, media_type)
+
+
+class StaticAssetStore:
+    """本地资源的加载、内容哈希寻址和CDN地址映射"""
+
+    def __init__(self, root: Path = VENDOR_DIR, packages: Tuple[VendorPackage, ...] = VENDOR_PACKAGES):
+        self.root = root
+        self.packages = {package.key: package for package in packages}
+        self.enabled = False
+        # 包 -> 带内容哈希的目录名（如 leaflet-1.9.3-0123456789）
+        self._bundles: Dict[str, str] = {}
+        self._assets: Dict[str, Dict[str, StaticAsset]] = {}
+        self._url_mapping: Dict[str, str] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """读取 static/vendor 下的文件并计算各包的内容哈希（只加载一次）"""
+        with self._lock:
+            if self._loaded:
+                return
+            for key, package in self.packages.items():
+                package_dir = self.root / key
+                if not package_dir.is_dir():
+                    continue
+                files = sorted(path for path in package_dir.rglob('*')
+                               if path.is_file() and not path.name.startswith('.')
+                               and path.suffix not in PRECOMPRESSED_SUFFIXES.values())
+                if not files:
+                    continue
+
+                # 包内所有文件共用一个哈希，样式表中的相对地址（字体、图片）不需要改写
+                digest = hashlib.sha256()
+                assets = {}
+                for path in files:
+                    relative = path.relative_to(package_dir).as_posix()
+                    asset = make_asset(path)
+                    digest.update(relative.encode('utf-8') + b'\0' + asset.etag.encode('ascii'))
+                    assets[relative] = asset
+                bundle = f'{key}-{digest.hexdigest()[:HASH_LENGTH]}'
+                self._bundles[key] = bundle
+                self._assets[key] = assets
+
+                for url, relative in package.urls.items():
+                    if relative in assets:
+                        self._url_mapping[url] = f'{STATIC_ASSETS_PATH}/{bundle}/{relative}'
+            self._loaded = True
+
+    def url_mapping(self) -> Dict[str, str]:
+        """第三方CDN地址 -> 本地地址（只包含已下载到本地的文件）"""
+        self.load()
+        return dict(self._url_mapping)
+
+    def local_url(self, url: str) -> str:
+        """CDN地址对应的本地地址，未启用或文件不在本地时返回原地址"""
+        if not self.enabled:
+            return url
+        return self._url_mapping.get(url, url)
+
+    def get_asset(self, bundle: str, path: str) -> Tuple[Optional[str], Optional[StaticAsset]]:
+        """
+        按地址获取资源
+
+        Returns:
+            (当前目录名, 资源)；目录名中的哈希不是当前内容时资源为None，可转到当前目录名；
+            包不存在时两者都为None
+        """
+        self.load()
+        key, _, _ = bundle.rpartition('-')
+        current = self._bundles.get(key)
+        if current is None:
+            return None, None
+        if current != bundle:
+            return current, None
+        return current, self._assets[key].get(path)
+
+    def missing_files(self) -> List[str]:
+        """清单中尚未下载到本地的文件（包/文件）"""
+        return [f'{key}/{relative}' for key, package in self.packages.items()
+                for relative in package.files if not (self.root / key / relative).is_file()]
+
+    def get_stats(self) -> Dict[str, object]:
+        self.load()
+        assets = [asset for package_assets in self._assets.values() for asset in package_assets.values()]
+        return {
+            'enabled': self.enabled,
+            'bundles': sorted(self._bundles.values()),
+            'files': len(assets),
+            'bytes': sum(len(asset.body) for asset in assets),
+            'gzip_bytes': sum(len(asset.gzip_body or asset.body) for asset in assets),
+            'br_bytes': sum(len(asset.br_body or asset.gzip_body or asset.body) for asset in assets),
+            'mapped_urls': len(self._url_mapping),
+            'missing': self.missing_files()
+        }
+
+
+# 全局本地资源实例
+_static_asset_store = StaticAssetStore()
+
+def get_static_asset_store() -> StaticAssetStore:
+    """获取本地资源实例"""
+    return _static_asset_store
+
+def enable_static_assets():
+    """启用本地静态资源，之后渲染的页面和地图引用本地地址（需先挂载 create_static_assets_router）"""
+    from cdn_replacer import use_local_assets
+
+    _static_asset_store.load()
+    _static_asset_store.enabled = True
+    mapping = _static_asset_store.url_mapping()
+    use_local_assets(mapping)
+
+    stats = _static_asset_store.get_stats()
+    print(f"📦 本地静态资源已启用: {stats['files']} 个文件，{len(mapping)} 个CDN地址改为本地")
+    if stats['missing']:
+        print(f"⚠️ 以下资源未下载，仍使用CDN（运行 scripts/vendor_static_assets.py 下载）: {', '.join(stats['missing'])}")
+
+def get_local_asset_url(url: str) -> str:
+    """CDN地址对应的本地地址（见 StaticAssetStore.local_url）"""
+    return _static_asset_store.local_url(url)
+
+def create_static_assets_router(store: Optional[StaticAssetStore] = None):
+    """创建本地静态资源路由（FastAPI）"""
+    from fastapi import APIRouter, Request
+    from fastapi.responses import RedirectResponse, Response
+    from map_data import payload_response
+
+    store = store or _static_asset_store
+    router = APIRouter()
+
+    @router.get(STATIC_ASSETS_PATH + '/{bundle}/{path:path}')
+    def static_asset(bundle: str, path: str, request: Request):
+        current, asset = store.get_asset(bundle, path)
+        if asset is None:
+            if current is not None and current != bundle:
+                # 资源已更新，转到当前内容的地址（转向本身不缓存）
+                return RedirectResponse(f'{STATIC_ASSETS_PATH}/{current}/{path}', status_code=307,
+                                        headers={'Cache-Control': 'no-cache'})
+            return Response(status_code=404)
+        return payload_response(request, asset, asset.media_type, ASSET_CACHE_CONTROL)
+
+    return router
@@ -0,0 +1,27 @@
+import math
+
+import pytest
+
+from airport_distances import AirportDistances, EARTH_RADIUS_KM
+from flight_timetable import DEFAULT_BLOCK_MINUTES
+
+COORDS = {"海口": [19.93, 110.46], "北京首都": [40.08, 116.58], "乌鲁木齐": [43.91, 87.47], "无坐标": None}
+
+
+def _haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, a + b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def test_distances_match_scalar_haversine():
+    distances = AirportDistances(COORDS)
+    for departure in ("海口", "北京首都", "乌鲁木齐"):
+        for arrival in ("海口", "北京首都", "乌鲁木齐"):
+            expected = _haversine(COORDS[departure], COORDS[arrival])
+            assert distances.distance(departure, arrival) == pytest.approx(expected, abs=0.5)
+    # 海口-北京约2300公里，估算飞行时间按5分钟取整
+    block = distances.block_minutes("海口", "北京首都")
+    assert 180 <= block <= 210 and block % 5 == 0
+    assert distances.distance("海口", "无坐标") is None
+    assert distances.block_minutes("海口", "无坐标") == DEFAULT_BLOCK_MINUTES
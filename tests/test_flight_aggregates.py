@@ -0,0 +1,31 @@
+from flight_aggregates import FlightAggregates
+from flight_dataset import get_flight_dataset
+
+FIELDS = ('dep_counts', 'arr_counts', 'route_counts', 'dep_product_counts', 'arr_product_counts', 'flight_count')
+
+
+def _counts(aggregates):
+    return {field: getattr(aggregates, field) for field in FIELDS}
+
+
+def test_derive_matches_full_recount():
+    table = get_flight_dataset().table
+    aggregates = FlightAggregates.from_table(table)
+
+    new_table = table.copy()
+    changed_rows = set()
+    # 修改起降机场和适用产品
+    new_table.update(0, {'起飞机场': '三亚', '适用产品': '2666'})
+    changed_rows.add(0)
+    # 删除两行（末行填补空位）
+    for row_id in (len(new_table) - 3, 5):
+        changed_rows.update((row_id, new_table.swap_remove(row_id)))
+    # 新增一条新航线
+    changed_rows.add(new_table.append({"航班号": "HU9999", "起飞机场": "海口", "降落机场": "新机场",
+                                       "起飞时间": "9:05", "班期": "12", "适用产品": "666/2666"}))
+
+    derived = aggregates.derive(table, new_table, changed_rows)
+    assert _counts(derived) == _counts(FlightAggregates.from_table(new_table))
+    assert _counts(derived) == _counts(FlightAggregates.from_records(new_table.rows()))
+    # 原统计不受影响
+    assert _counts(aggregates) == _counts(FlightAggregates.from_table(table))
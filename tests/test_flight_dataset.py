@@ -0,0 +1,48 @@
+import functools
+import json
+
+import flight_dataset
+import utils
+from flight_dataset import FlightDatasetRegistry
+from flight_snapshot import load_or_build_snapshot
+
+FLIGHTS = [
+    {"航班号": "HU7001", "起飞机场": "海口", "降落机场": "北京首都", "起飞时间": "8:00", "班期": "1357", "适用产品": "666"},
+    {"航班号": "HU7002", "起飞机场": "北京首都", "降落机场": "海口", "起飞时间": "13:30", "班期": "246", "适用产品": "666"},
+]
+
+
+def _write_coords(path, coords):
+    path.write_text(json.dumps(coords, ensure_ascii=False), encoding='utf-8')
+
+
+def test_coords_change_notifies_listeners(tmp_path, monkeypatch):
+    source = tmp_path / 'flights.jsonl'
+    source.write_text(''.join(json.dumps(flight, ensure_ascii=False) + '\n' for flight in FLIGHTS), encoding='utf-8')
+    coords = tmp_path / 'coords.json'
+    _write_coords(coords, {"海口": [20.0, 110.3], "北京首都": [40.1, 116.6]})
+    monkeypatch.setattr(flight_dataset, 'load_or_build_snapshot',
+                        functools.partial(load_or_build_snapshot, coords_path=coords))
+
+    registry = FlightDatasetRegistry()
+    old_dataset = registry.get(source)
+    # utils 的监听器只处理默认数据集，这里把测试注册表的数据集当作默认数据集
+    monkeypatch.setattr(utils, 'get_flight_dataset', lambda: registry.get(source))
+    monkeypatch.setattr(utils, 'airport_coords', utils.airport_coords)
+    swaps = []
+    registry.add_listener(lambda old, new: swaps.append((old, new)))
+    registry.add_listener(utils._on_dataset_swapped)
+
+    # 只改机场坐标，航班数据不变
+    new_coords = {"海口": [20.0, 110.3], "北京首都": [39.9, 116.4]}
+    _write_coords(coords, new_coords)
+    dataset = registry.reload(source)
+
+    assert dataset.version != old_dataset.version
+    assert swaps == [(old_dataset, dataset)]
+    assert dataset.airport_coords == new_coords
+    assert utils.airport_coords == new_coords
+
+    # 内容不变时重新加载不通知
+    registry.reload(source)
+    assert len(swaps) == 1
@@ -0,0 +1,69 @@
+from flight_delta import DELTA_ADD, DELTA_MODIFY, DELTA_REMOVE, apply_delta
+from flight_index import get_flight_index
+from flight_table import FlightTable
+
+FLIGHTS = [
+    {"航班号": "HU7001", "起飞机场": "海口", "降落机场": "北京首都", "起飞时间": "8:00", "班期": "1357", "适用产品": "666"},
+    {"航班号": "HU7002", "起飞机场": "北京首都", "降落机场": "海口", "起飞时间": "13:30", "班期": "246", "适用产品": "666"},
+]
+
+
+def _table():
+    table = FlightTable()
+    for flight in FLIGHTS:
+        table.append(flight)
+    return table
+
+
+def test_duplicate_add_in_one_file_adds_one_row():
+    table = _table()
+    new_flight = {"航班号": "HU7003", "起飞机场": "海口", "降落机场": "西安", "起飞时间": "9:05",
+                  "班期": "12", "适用产品": "666"}
+    operations = [
+        dict(new_flight, op=DELTA_ADD),
+        dict(new_flight, op=DELTA_ADD, 起飞时间="09:05", 班期="67"),
+    ]
+    new_table, new_index, result = apply_delta(table, get_flight_index(table), operations)
+
+    assert result.added == 1
+    assert len(new_table) == len(FLIGHTS) + 1
+    # 后出现的字段覆盖先出现的
+    assert new_table.row(len(new_table) - 1)["班期"] == "67"
+    assert len(new_index.query(departure="海口", arrival="西安").row_ids) == 1
+
+NEW_FLIGHT = {"航班号": "HU7003", "起飞机场": "海口", "降落机场": "西安", "起飞时间": "9:05",
+              "班期": "12", "适用产品": "666"}
+
+
+def test_modify_after_add_in_one_file():
+    table = _table()
+    operations = [dict(NEW_FLIGHT, op=DELTA_ADD), dict(NEW_FLIGHT, op=DELTA_MODIFY, 班期="67")]
+    new_table, new_index, result = apply_delta(table, get_flight_index(table), operations)
+
+    assert (result.added, result.modified, result.missing) == (1, 0, 0)
+    row_ids = new_index.query(departure="海口", arrival="西安").row_ids
+    assert [new_table.row(row_id)["班期"] for row_id in row_ids] == ["67"]
+
+
+def test_remove_after_add_in_one_file():
+    table = _table()
+    operations = [dict(NEW_FLIGHT, op=DELTA_ADD), dict(NEW_FLIGHT, op=DELTA_REMOVE)]
+    new_table, new_index, result = apply_delta(table, get_flight_index(table), operations)
+
+    assert (result.added, result.removed, result.missing) == (0, 0, 0)
+    assert len(new_table) == len(FLIGHTS)
+    assert not new_index.query(departure="海口", arrival="西安").row_ids
+
+
+def test_modify_after_remove_and_add_in_one_file():
+    table = _table()
+    operations = [
+        dict(FLIGHTS[0], op=DELTA_REMOVE),
+        dict(FLIGHTS[0], op=DELTA_ADD, 班期="2"),
+        dict(FLIGHTS[0], op=DELTA_MODIFY, 班期="24"),
+    ]
+    new_table, new_index, result = apply_delta(table, get_flight_index(table), operations)
+
+    assert (result.added, result.removed, result.modified, result.missing) == (1, 1, 0, 0)
+    row_ids = new_index.query(departure="海口", arrival="北京首都").row_ids
+    assert [new_table.row(row_id)["班期"] for row_id in row_ids] == ["24"]
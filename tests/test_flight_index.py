@@ -0,0 +1,72 @@
+import pytest
+
+from flight_dataset import get_flight_dataset
+from flight_index import FlightIndex
+from flight_table import parse_product_codes, parse_time_minutes, parse_weekday_mask
+
+
+@pytest.fixture(scope='module')
+def table():
+    return get_flight_dataset().table
+
+
+@pytest.fixture(scope='module')
+def index(table):
+    # 直接构建索引，不使用快照恢复的索引
+    return FlightIndex(table)
+
+
+def _scan(table, predicate):
+    return [row_id for row_id in range(len(table)) if predicate(table.row(row_id))]
+
+
+@pytest.mark.parametrize('departure,arrival,flight_id', [
+    ('海口', None, None),
+    (None, '北京首都', None),
+    ('海口', '北京首都', None),
+    (None, None, 'HU7001'),
+    ('不存在', None, None),
+])
+def test_query_matches_linear_scan(table, index, departure, arrival, flight_id):
+    expected = _scan(table, lambda flight: (departure is None or flight['起飞机场'] == departure)
+                     and (arrival is None or flight['降落机场'] == arrival)
+                     and (flight_id is None or flight['航班号'] == flight_id))
+    result = index.query(departure=departure, arrival=arrival, flight_id=flight_id)
+    assert result.row_ids == expected
+    assert len(result) == len(expected)
+
+
+
+@pytest.mark.parametrize('category', ['666', '2666', '666/2666', '2666/666', '999', '666/999'])
+def test_product_requires_all_codes(table, index, category):
+    codes = set(parse_product_codes(category))
+    expected = _scan(table, lambda flight: codes <= set(parse_product_codes(flight['适用产品'])))
+    assert index.query(category=category).row_ids == expected
+    assert index.query(departure='海口', category=category).row_ids == [
+        row_id for row_id in expected if table.row(row_id)['起飞机场'] == '海口']
+
+
+@pytest.mark.parametrize('weekday_mask,time_from,time_to', [
+    (None, 6 * 60, 12 * 60),
+    (None, 22 * 60, 2 * 60),     # 跨越零点
+    (None, 8 * 60, 8 * 60),
+    (None, None, 7 * 60),
+    (None, 20 * 60, None),
+    (0b0000001, None, None),     # 周一
+    (0b1000001, 23 * 60, 6 * 60),
+])
+def test_weekday_and_time_range_match_linear_scan(table, index, weekday_mask, time_from, time_to):
+    low = 0 if time_from is None else time_from
+    high = 24 * 60 - 1 if time_to is None else time_to
+
+    def matches(flight):
+        minutes = parse_time_minutes(flight['起飞时间'])
+        in_range = low <= minutes <= high if low <= high else (minutes >= low or minutes <= high)
+        return in_range and (weekday_mask is None or bool(parse_weekday_mask(flight['班期']) & weekday_mask))
+
+    expected = _scan(table, matches)
+    assert index.query(weekday_mask=weekday_mask, time_from=time_from, time_to=time_to).row_ids == expected
+    # 其他条件收敛后改为逐行过滤起飞时间，结果应一致
+    assert index.query(departure='海口', weekday_mask=weekday_mask, time_from=time_from,
+                       time_to=time_to).row_ids == [
+        row_id for row_id in expected if table.row(row_id)['起飞机场'] == '海口']
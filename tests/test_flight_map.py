@@ -0,0 +1,31 @@
+import pytest
+
+from flight_dataset import get_flight_dataset
+from flight_delta import DELTA_REMOVE, apply_delta
+from flight_index import get_flight_index
+from flight_table import FlightRows
+from utils import build_flight_layers, query_flights_with_explain
+
+
+def _specs(layers):
+    return [layer.to_spec() for layer in layers]
+
+
+@pytest.mark.parametrize('conditions', [
+    {'arrival': '海口', 'weekday': '2'},
+    {'departure': '西安', 'time_from': '12:00'},
+    {'departure': '深圳', 'arrival': '杭州', 'weekday': '135'},
+])
+def test_composed_lines_match_direct_build(conditions):
+    rows, _ = query_flights_with_explain(get_flight_dataset().flights, **conditions)
+    assert isinstance(rows, FlightRows) and 0 < len(rows)
+    # 行视图由机场片段拼接，字典列表逐航班生成
+    assert _specs(build_flight_layers(rows)) == _specs(build_flight_layers(list(rows)))
+
+
+def test_removal_touches_airports_of_moved_row():
+    # 删除时末行移到空位，按行号索引的航线片段需要随其起降机场失效
+    table = get_flight_dataset().table
+    first, last = table.row(0), table.row(len(table) - 1)
+    _, _, result = apply_delta(table, get_flight_index(table), [dict(first, op=DELTA_REMOVE)])
+    assert {first['起飞机场'], first['降落机场'], last['起飞机场'], last['降落机场']} <= result.touched_airports
@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from flight_dataset import get_flight_dataset
+from flight_reachability import FlightReachability
+
+AIRPORTS = ['海口', '三亚', '北京首都', '上海虹桥', '西安', '昆明', '成都天府', '乌鲁木齐']
+
+
+def _min_stops(routes, start, end):
+    """广度优先求最少中转次数，不可达时返回None"""
+    frontier, seen = {start}, {start}
+    for stops in range(len(AIRPORTS)):
+        frontier = {arrival for departure, arrival in routes if departure in frontier} - seen
+        if end in frontier:
+            return stops
+        seen |= frontier
+    return None
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_min_stops_match_breadth_first(seed):
+    rng = random.Random(seed)
+    routes = {tuple(rng.sample(AIRPORTS, 2)) for _ in range(10)}
+    flights = [{"航班号": "HU7001", "起飞机场": departure, "降落机场": arrival} for departure, arrival in routes]
+    reachability = FlightReachability.from_records(flights, max_stops=3)
+    for start in AIRPORTS:
+        for end in AIRPORTS:
+            expected = _min_stops(routes, start, end) if start != end else None
+            if expected is not None and expected > 3:
+                expected = None
+            assert reachability.min_stops(start, end) == expected
+            assert reachability.is_reachable(start, end, max_stops=1) == (expected is not None and expected <= 1)
+        assert reachability.reachable_from(start, max_stops=2) == {
+            end: stops for end in AIRPORTS if end != start
+            for stops in [_min_stops(routes, start, end)] if stops is not None and stops <= 2}
+
+
+def test_from_table_matches_from_records():
+    dataset = get_flight_dataset()
+    from_table = FlightReachability.from_table(dataset.table)
+    from_records = FlightReachability.from_records(dataset.flights)
+    for start in from_records.airports:
+        assert from_table.reachable_from(start) == from_records.reachable_from(start)
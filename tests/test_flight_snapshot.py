@@ -0,0 +1,68 @@
+import json
+import os
+
+import flight_snapshot
+from flight_snapshot import get_snapshot_path, load_or_build_snapshot
+
+FLIGHTS = [
+    {"航班号": "HU7001", "起飞机场": "海口", "降落机场": "北京首都", "起飞时间": "8:00", "班期": "1357", "适用产品": "666"},
+    {"航班号": "HU7002", "起飞机场": "北京首都", "降落机场": "海口", "起飞时间": "13:30", "班期": "246", "适用产品": "666/2666"},
+    {"航班号": "GS7858", "起飞机场": "昆明", "降落机场": "西安", "起飞时间": "20:30", "班期": "123567", "适用产品": "2666"},
+]
+
+
+def _write_source(tmp_path):
+    source = tmp_path / 'flights.jsonl'
+    source.write_text(''.join(json.dumps(flight, ensure_ascii=False) + '\n' for flight in FLIGHTS), encoding='utf-8')
+    coords = tmp_path / 'coords.json'
+    coords.write_text(json.dumps({"海口": [20.0, 110.3], "北京首都": [40.1, 116.6]}, ensure_ascii=False),
+                      encoding='utf-8')
+    return source, coords
+
+
+def _rows(snapshot):
+    return [dict(flight) for flight in snapshot.table.rows(range(len(snapshot.table)))]
+
+
+def test_truncated_snapshot_is_rebuilt(tmp_path):
+    source, coords = _write_source(tmp_path)
+    expected = _rows(load_or_build_snapshot(source, coords))
+
+    snapshot_path = get_snapshot_path(source)
+    size = os.path.getsize(snapshot_path)
+    for length in (size - 1, size // 2, 200, 10):
+        with open(snapshot_path, 'r+b') as f:
+            f.truncate(length)
+        snapshot = load_or_build_snapshot(source, coords)
+        assert _rows(snapshot) == expected
+        # 重新编译后快照恢复完整
+        assert os.path.getsize(snapshot_path) == size
+
+
+def test_corrupt_section_directory_is_rebuilt(tmp_path):
+    source, coords = _write_source(tmp_path)
+    expected = _rows(load_or_build_snapshot(source, coords))
+
+    snapshot_path = get_snapshot_path(source)
+    data = bytearray(snapshot_path.read_bytes())
+    # 把段目录中第一段（meta）之后的内容改乱
+    data[400:] = bytes(len(data) - 400)
+    snapshot_path.write_bytes(bytes(data))
+    assert _rows(load_or_build_snapshot(source, coords)) == expected
+
+
+def test_touched_source_updates_header(tmp_path, monkeypatch):
+    source, coords = _write_source(tmp_path)
+    expected = _rows(load_or_build_snapshot(source, coords))
+
+    stat = os.stat(source)
+    os.utime(source, (stat.st_atime, stat.st_mtime + 60))
+    # 内容未变：直接使用快照，并改写文件头中的修改时间
+    assert _rows(load_or_build_snapshot(source, coords)) == expected
+
+    hashed = []
+    original_sha256 = flight_snapshot.file_sha256
+    monkeypatch.setattr(flight_snapshot, 'file_sha256', lambda path: hashed.append(path) or original_sha256(path))
+    assert _rows(load_or_build_snapshot(source, coords)) == expected
+    # 再次加载时只校验机场坐标，不再重新哈希航班数据
+    assert hashed == [coords]
@@ -0,0 +1,138 @@
+import random
+
+import pytest
+
+from flight_timetable import FlightTimetable, itinerary_cost, meet_in_the_middle
+
+AIRPORTS = ['海口', '三亚', '北京首都', '上海虹桥', '西安', '昆明']
+
+
+def _random_flights(seed, count=40):
+    rng = random.Random(seed)
+    flights = []
+    for number in range(count):
+        departure, arrival = rng.sample(AIRPORTS, 2)
+        flights.append({"航班号": f"HU{7000 + number}", "起飞机场": departure, "降落机场": arrival,
+                        "起飞时间": f"{rng.randrange(6, 23)}:{rng.choice(['00', '30'])}",
+                        "班期": ''.join(sorted(rng.sample('1234567', rng.randrange(1, 8)))), "适用产品": "666"})
+    return flights
+
+
+def _block_minutes(departure, arrival):
+    return 60 + 15 * ((AIRPORTS.index(departure) + AIRPORTS.index(arrival)) % 5)
+
+
+def _brute_force(timetable, start, end, max_legs):
+    """枚举不重复经过机场、不超过 max_legs 段的航班组合，返回 {航班序号组合: 行程}"""
+    flights = timetable.flights
+    routes = {}
+
+    def extend(flight_ids, airports):
+        if airports[-1] == end:
+            itinerary = timetable.evaluate([flights[flight_id] for flight_id in flight_ids])
+            if itinerary is not None:
+                routes[tuple(flight_ids)] = itinerary
+            return
+        if len(flight_ids) == max_legs:
+            return
+        for flight_id, flight in enumerate(flights):
+            if flight["起飞机场"] == airports[-1] and flight["降落机场"] not in airports:
+                extend(flight_ids + [flight_id], airports + [flight["降落机场"]])
+
+    extend([], [start])
+    return routes
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('max_stops', [0, 1, 2])
+def test_search_matches_brute_force(seed, max_stops):
+    timetable = FlightTimetable(_random_flights(seed), block_minutes=_block_minutes)
+    for start in AIRPORTS:
+        for end in AIRPORTS:
+            if start == end:
+                continue
+            routes = _brute_force(timetable, start, end, max_stops + 1)
+            itineraries = timetable.search(start, end, max_stops)
+            for itinerary in itineraries:
+                # 每条行程都是可行的航班组合，出发星期和时刻与逐个检查一致
+                route = routes[itinerary.flight_ids]
+                assert itinerary.weekdays & ~route.weekdays == 0
+                assert len(itinerary.waits) == len(route.waits)
+                assert itinerary.total_minutes >= route.total_minutes
+            # 每个中转次数限制下最快的行程与穷举一致
+            for stops in range(max_stops + 1):
+                expected = [route.total_minutes for flight_ids, route in routes.items()
+                            if len(flight_ids) <= stops + 1]
+                found = [itinerary.total_minutes for itinerary in itineraries if itinerary.stops <= stops]
+                assert min(found, default=None) == min(expected, default=None)
+
+
+def _min_cost(timetable, flight_ids):
+    """航班组合在各出发星期中的最低代价"""
+    flights = [timetable.flights[flight_id] for flight_id in flight_ids]
+    costs = []
+    for day in flights[0]["班期"]:
+        itinerary = timetable.evaluate([dict(flights[0], 班期=day)] + flights[1:])
+        if itinerary is not None:
+            costs.append(itinerary_cost(itinerary))
+    return min(costs)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_best_itineraries_match_brute_force(seed, k):
+    timetable = FlightTimetable(_random_flights(seed), block_minutes=_block_minutes)
+    for start in AIRPORTS:
+        for end in AIRPORTS:
+            if start == end:
+                continue
+            routes = _brute_force(timetable, start, end, 3)
+            itineraries = timetable.best_itineraries(start, end, k=k, max_stops=2)
+            assert len({itinerary.flight_ids for itinerary in itineraries}) == len(itineraries)
+            costs = [itinerary_cost(itinerary) for itinerary in itineraries]
+            # 按代价升序返回，代价与穷举的前K个一致，每条行程的代价是该航班组合的最低代价
+            assert costs == sorted(costs)
+            assert costs == sorted(_min_cost(timetable, flight_ids) for flight_ids in routes)[:k]
+            for itinerary, cost in zip(itineraries, costs):
+                assert cost == _min_cost(timetable, itinerary.flight_ids)
+
+
+def _hops(routes, airport, forward=True):
+    """不限层数的广度优先，返回各机场的最少航段数"""
+    hops, frontier = {airport: 0}, [airport]
+    while frontier:
+        next_frontier = []
+        for current in frontier:
+            for departure, arrival in routes:
+                source, target = (departure, arrival) if forward else (arrival, departure)
+                if source == current and target not in hops:
+                    hops[target] = hops[current] + 1
+                    next_frontier.append(target)
+        frontier = next_frontier
+    return hops
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('max_legs', [1, 2, 3, 4])
+def test_meet_in_the_middle_bounds(seed, max_legs):
+    rng = random.Random(seed)
+    routes = {tuple(rng.sample(AIRPORTS, 2)) for _ in range(8)}
+    for start in AIRPORTS:
+        for end in AIRPORTS:
+            if start == end:
+                continue
+            bounds = meet_in_the_middle(
+                start, end, max_legs,
+                lambda airport: [arrival for departure, arrival in routes if departure == airport],
+                lambda airport: [departure for departure, arrival in routes if arrival == airport])
+            from_start, to_end = _hops(routes, start), _hops(routes, end, forward=False)
+            if to_end.get(start, max_legs + 1) > max_legs:
+                assert bounds is None
+                continue
+            # 能在 max_legs 段内连通起终点的机场都在走廊内，且航段数与不限范围的广度优先一致
+            for airport in AIRPORTS:
+                if from_start.get(airport, max_legs + 1) + to_end.get(airport, max_legs + 1) <= max_legs:
+                    assert bounds.legs_from_start(airport) == from_start[airport]
+                    assert bounds.legs_to_end(airport) == to_end[airport]
+                else:
+                    assert bounds.legs_from_start(airport) + bounds.legs_to_end(airport) > max_legs
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import utils  # 登记地图数据生成函数
+from flight_dataset import get_flight_dataset
+from map_data import MAP_DATA_PATH, create_map_data_router
+
+
+@pytest.fixture(scope='module')
+def client():
+    app = FastAPI()
+    app.include_router(create_map_data_router())
+    return TestClient(app)
+
+
+def _get(client, query, namespace='flight_map'):
+    version = get_flight_dataset().version
+    return client.get(f'{MAP_DATA_PATH}/{namespace}/{version}.json',
+                      params={'q': json.dumps(query, ensure_ascii=False)}, follow_redirects=False)
+
+
+@pytest.mark.parametrize('query', [
+    {'weekday': 'x'},
+    {'weekday': 0},
+    {'weekday': 128},
+    {'time_from': '8:00'},
+    {'time_to': 24 * 60},
+    {'lod': 'x'},
+    {'lod': 99},
+    {'lod': True},
+    {'departure': ['海口']},
+    {'sample': -1},
+    {'scope': 'some'},
+    {'unknown': 1},
+])
+def test_invalid_query_is_rejected(client, query):
+    assert _get(client, query).status_code == 400
+
+
+@pytest.mark.parametrize('q', ['not json', '[1]', '"x"'])
+def test_malformed_json_is_rejected(client, q):
+    version = get_flight_dataset().version
+    response = client.get(f'{MAP_DATA_PATH}/flight_map/{version}.json', params={'q': q})
+    assert response.status_code == 400
+
+
+def test_invalid_lod_is_rejected_for_network(client):
+    assert _get(client, {'lod': 'x'}, namespace='route_network').status_code == 400
+
+
+def test_valid_query(client):
+    query = utils.normalize_flight_query('海口', None, None, '135', '6:00', '20:00')
+    response = _get(client, {key: value for key, value in query.items() if value is not None})
+    assert response.status_code == 200
+    assert 'layers' in response.json()
+
+    response = _get(client, {'sample': 100, 'lod': 0})
+    assert response.status_code == 200
@@ -0,0 +1,38 @@
+from render_cache import RenderCache, estimate_size
+
+VALUE = 'x' * 1000
+SIZE = estimate_size(VALUE)
+
+
+def test_evicts_least_recently_used_within_budget():
+    cache = RenderCache(max_bytes=SIZE * 3)
+    for name in 'abc':
+        cache.get_or_create('map', 'v1', name, lambda: VALUE)
+    # 访问 a 后，最久未使用的是 b
+    assert cache.get(cache.make_key('map', 'v1', 'a')) == VALUE
+    cache.get_or_create('map', 'v1', 'd', lambda: VALUE)
+
+    assert sorted(key[2] for key in cache.keys()) == ['a', 'c', 'd']
+    assert cache.total_bytes == SIZE * 3 <= cache.max_bytes
+    stats = cache.get_stats()['namespaces']['map']
+    assert (stats['evictions'], stats['entries'], stats['bytes']) == (1, 3, SIZE * 3)
+
+
+def test_oversized_value_is_not_cached():
+    cache = RenderCache(max_bytes=SIZE - 1)
+    assert cache.get_or_create('map', 'v1', 'a', lambda: VALUE) == VALUE
+    assert cache.keys() == []
+    assert cache.total_bytes == 0
+
+
+def test_carry_forward_keeps_untouched_airports():
+    cache = RenderCache()
+    cache.put(cache.make_key('map', 'v1', '海口'), VALUE, airports=['海口'])
+    cache.put(cache.make_key('map', 'v1', '三亚'), VALUE, airports=['三亚', '北京首都'])
+    cache.put(cache.make_key('map', 'v1', 'all'), VALUE)
+    cache.put(cache.make_key('chart', None, 'static'), VALUE)
+
+    assert cache.carry_forward('v1', 'v2', touched_airports={'北京首都'}) == 1
+    assert sorted(cache.keys()) == [('chart', None, 'static', 0), ('map', 'v2', '海口', 0)]
+    assert cache.total_bytes == SIZE * 2
+    assert cache.get(cache.make_key('map', 'v2', '海口')) == VALUE
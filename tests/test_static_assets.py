@@ -0,0 +1,17 @@
+import re
+
+from map_shell import MapShell
+from static_assets import STATIC_ASSETS_PATH, enable_static_assets, get_static_asset_store
+
+
+def test_vendor_manifest_is_complete():
+    assert get_static_asset_store().missing_files() == []
+
+
+def test_map_shell_uses_only_local_assets():
+    enable_static_assets()
+    document = MapShell('flight').remote_document
+    urls = re.findall(r'(?:src|href)="([^"]+)"', document)
+    assert urls
+    assert [url for url in urls if not url.startswith(STATIC_ASSETS_PATH + '/')] == []
+    assert 'fontawesome-free-6.2.0' in document
@@ -0,0 +1,15 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils import get_system_stats
+
+
+def test_status_endpoint():
+    app = FastAPI()
+    app.add_api_route('/status.json', get_system_stats, methods=['GET'])
+    response = TestClient(app).get('/status.json')
+    assert response.status_code == 200
+    stats = response.json()
+    assert set(stats) == {'datasets', 'render_cache', 'lod_cache', 'route_arcs', 'airport_distances',
+                          'cdn_rewrite', 'map_data', 'static_assets'}
+    assert any(dataset['flight_count'] > 0 for dataset in stats['datasets'].values())
@@ -4,38 +4,88 @@
 航班查询系统工具模块
 """
 
-import json
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from pathlib import Path
+from collections.abc import Mapping
 from map_config import get_available_services, create_tile_layer, add_all_map_layers, add_fallback_layers
-from cdn_replacer import optimize_html_for_china
-from app_resource_manager import create_optimized_map_html_app
+from cdn_replacer import optimize_html_for_china, get_cdn_rewrite_stats
+from app_resource_manager import create_optimized_map_html_app, create_map_container_html_app
+from flight_dataset import get_flight_dataset, get_dataset_stats, on_dataset_swap
+from flight_table import (FlightRows, parse_product_codes, parse_weekday_mask, format_weekday_mask,
+                          parse_time_minutes, format_time_minutes)
+from flight_index import get_flight_index
+from flight_aggregates import get_flight_aggregates
+from render_cache import get_render_cache
+from map_shell import MapShell, DEFAULT_ZOOM
+from route_arcs import get_route_arcs, get_route_arc_cache
+from map_data import get_map_data_store
+from map_lod import LOD_LEVELS, get_level_of_detail, get_lod_cache
 
-# 加载机场坐标数据
+# 加载机场坐标数据（随航班数据快照一起内存映射加载）
 def load_airport_coords():
-    coords_file = Path(__file__).parent / 'data' / 'airport_coords.json'
-    if coords_file.exists():
-        with open(coords_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    return get_flight_dataset().airport_coords
 
 # 机场坐标数据
 airport_coords = load_airport_coords()
 
-# 地图缓存
-_map_cache = {}
-_base_map_templates = {}
-_global_map_instances = {}  # 全局地图实例缓存  # 基础地图模板缓存
+# 会员类型选项
+PRODUCT_CATEGORIES = ["666", "2666", "666/2666"]
+
+# 执飞日期选项（值为班期数字）
+WEEKDAY_CHOICES = [("不限", ""), ("周一", "1"), ("周二", "2"), ("周三", "3"), ("周四", "4"),
+                   ("周五", "5"), ("周六", "6"), ("周日", "7"), ("周末", "67")]
+
+# 起飞时间段选项（每半小时）
+DEPARTURE_TIME_CHOICES = [format_time_minutes(minutes) for minutes in range(0, 24 * 60, 30)]
+
+# 地图渲染逻辑变化时递增，使按旧逻辑渲染的缓存失效
+MAP_RENDERER_VERSION = 9
+
+# 地图命名空间 -> (底图外壳类型, 地图容器类型)
+MAP_RENDER_TARGETS = {
+    'flight_map': ('flight', 'flight_map'),
+    'distribution_map': ('distribution', 'airport_distribution'),
+    'route_network': ('network', 'route_network'),
+}
+
+# 航线网络图每条航线的采样点数（航线数量多，比航班地图少取点）
+NETWORK_ARC_POINTS = 8
+
+# 航班地图逐航班绘制的航班数上限，超过后按缩放级别聚合（见 map_lod.py）
+FLIGHT_MAP_DETAIL_LIMIT = 300
+
+# 渲染缓存（地图HTML、标签页图表、基础地图实例共用，按LRU和字节预算淘汰）
+_render_cache = get_render_cache()
+
+def normalize_flight_query(departure=None, arrival=None, category=None, weekday=None, time_from=None, time_to=None):
+    """规范化航班查询条件（用作缓存键），写法不同但等价的条件得到相同的键"""
+    return {
+        'departure': departure.strip() if departure else None,
+        'arrival': arrival.strip() if arrival else None,
+        'category': '/'.join(sorted(parse_product_codes(category))) if category else None,
+        'weekday': parse_weekday_mask(weekday) or None if weekday else None,
+        'time_from': parse_time_minutes(time_from) if time_from else None,
+        'time_to': parse_time_minutes(time_to) if time_to else None
+    }
+
+def get_cached_render(namespace, query, create_func, dataset=None, airports=()):
+    """
+    按 (命名空间, 数据版本, 查询条件, 渲染器版本) 读取渲染缓存，未命中时渲染并缓存
+
+    Args:
+        airports: 查询限定的起降机场，增量更新时只失效涉及变化机场的缓存
+    """
+    dataset = dataset or get_flight_dataset()
+    return _render_cache.get_or_create(namespace, dataset.version, query, create_func,
+                                       renderer_version=MAP_RENDERER_VERSION, airports=airports)
 
 def clear_map_cache():
     """清理地图缓存"""
-    global _map_cache, _base_map_templates, _global_map_instances
-    _map_cache.clear()
-    _base_map_templates.clear()
-    _global_map_instances.clear()
-    print("🗑️ 地图缓存已清理")
+    namespaces = ('flight_map', 'distribution_map', 'route_network', 'base_map', 'flight_map_fragment',
+                  'flight_map_data', 'distribution_map_data', 'route_network_data')
+    count = sum(_render_cache.invalidate(namespace) for namespace in namespaces)
+    print(f"🗑️ 地图缓存已清理（{count} 项）")
 
 def force_clear_all_caches():
     """强制清理所有缓存（包括标签页缓存）"""
@@ -43,70 +93,61 @@ def force_clear_all_caches():
     clear_tab_map_cache()
     print("🗑️ 所有地图缓存已强制清理")
 
+@on_dataset_swap
+def _on_dataset_swapped(old_dataset, dataset):
+    """航班数据热加载后更新机场坐标，并清理按旧版本生成的渲染缓存"""
+    global airport_coords
+    if dataset is not get_flight_dataset():
+        return
+    airport_coords = dataset.airport_coords
+    delta = dataset.delta
+    if delta is not None and old_dataset is not None and delta.base_version == old_dataset.version:
+        kept = _render_cache.carry_forward(old_dataset.version, dataset.version, delta.touched_airports)
+        print(f"♻️ 增量更新后保留 {kept} 个渲染缓存")
+    else:
+        count = _render_cache.invalidate(keep_version=dataset.version)
+        print(f"🗑️ 已清理 {count} 个旧版本渲染缓存")
+
 def get_cache_stats():
-    """获取缓存统计信息"""
+    """获取缓存统计信息（总大小及各命名空间的命中、未命中、淘汰次数）"""
+    return _render_cache.get_stats()
+
+def get_system_stats():
+    """获取运行状态：数据集、渲染缓存、各级计算缓存、CDN改写、地图数据接口和本地资源的统计"""
+    from airport_distances import get_airport_distance_cache
+    from static_assets import get_static_asset_store
+
     return {
-        'map_cache_size': len(_map_cache),
-        'template_cache_size': len(_base_map_templates),
-        'global_instances_size': len(_global_map_instances),
-        'cached_maps': list(_map_cache.keys()),
-        'cached_templates': list(_base_map_templates.keys()),
-        'global_instances': list(_global_map_instances.keys())
+        'datasets': get_dataset_stats(),
+        'render_cache': get_cache_stats(),
+        'lod_cache': get_lod_cache().get_stats(),
+        'route_arcs': get_route_arc_cache().get_stats(),
+        'airport_distances': get_airport_distance_cache().get_stats(),
+        'cdn_rewrite': get_cdn_rewrite_stats(),
+        'map_data': get_map_data_store().get_stats(),
+        'static_assets': get_static_asset_store().get_stats()
     }
 
 def get_global_map_instance(map_type="flight", location=[35.8617, 104.1954], zoom_start=4):
-    """获取全局地图实例，只初始化一次"""
-    global _global_map_instances
-    
-    # 创建实例键
-    instance_key = f"global_{map_type}"
-    
-    if instance_key not in _global_map_instances:
-        import folium
-        from folium.plugins import Fullscreen
-        
-        # 创建全局地图实例（不添加默认瓦片，让add_all_map_layers处理）
-        global_map = folium.Map(
-            location=location,
-            zoom_start=zoom_start,
-            tiles=None,  # 不添加默认瓦片，让add_all_map_layers处理
-            prefer_canvas=True,
-            control_scale=True
-        )
+    """获取地图类型对应的底图外壳，只渲染一次"""
+    # 外壳与数据版本无关
+    instance_key = _render_cache.make_key('base_map', None, {'map_type': map_type, 'location': location,
+                                                             'zoom': zoom_start}, MAP_RENDERER_VERSION)
+    map_shell = _render_cache.get(instance_key)
+    
+    if map_shell is None:
+        # 预渲染瓦片图层、全屏控件和图层控制器
+        map_shell = MapShell(map_type, location, zoom_start)
         
-        # 添加所有地图图层（只添加一次）
-        add_all_map_layers(global_map)
-        
-        # 添加全屏控件
-        Fullscreen(
-            position='topleft',
-            title='全屏显示',
-            title_cancel='退出全屏',
-            force_separate_button=True
-        ).add_to(global_map)
-        
-        # 缓存全局实例
-        _global_map_instances[instance_key] = global_map
-        print(f"🗺️ 初始化全局地图实例: {map_type}")
+        # 缓存外壳
+        _render_cache.put(instance_key, map_shell)
+        print(f"🗺️ 初始化地图外壳: {map_type}")
     
-    return _global_map_instances[instance_key]
+    return map_shell
 
 def create_base_map(location=[35.8617, 104.1954], zoom_start=4, map_type="flight"):
-    """创建基础地图，使用全局实例"""
-    import copy
-    
-    # 获取全局地图实例
-    global_map = get_global_map_instance(map_type, location, zoom_start)
-    
-    # 创建深拷贝以避免修改原始实例
-    base_map = copy.deepcopy(global_map)
-    
-    # 更新位置和缩放级别（如果需要）
-    if base_map.location != location or base_map.options['zoom'] != zoom_start:
-        base_map.location = location
-        base_map.options['zoom'] = zoom_start
-    
-    return base_map
+    """创建基础地图，叠加元素添加到返回的叠加层地图上，渲染时注入预渲染的底图外壳"""
+    return get_global_map_instance(map_type, location, zoom_start).new_overlay()
 
 def create_map_html(map_obj, config=None):
     """创建地图HTML，应用CDN优化"""
@@ -114,23 +155,24 @@ def create_map_html(map_obj, config=None):
     html = map_obj._repr_html_()
     return optimize_html_for_china(html)
 
-def load_flight_data(file_path):
-    """加载航班数据"""
-    flights = []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if line.strip():
-                flights.append(json.loads(line.strip()))
-    return flights
+def load_flight_data(file_path=None):
+    """加载航班数据（通过数据集注册表共享只读快照，同一文件只读取一次）"""
+    return get_flight_dataset(file_path).flights
 
 def get_unique_airports(flights):
     """获取所有唯一机场"""
+    if isinstance(flights, FlightRows) and flights.indices is None:
+        # 列式数据表直接按驻留ID去重，无需生成字典行
+        table = flights.table
+        departure_airports = sorted(table.airports[i] for i in set(table.departure))
+        arrival_airports = sorted(table.airports[i] for i in set(table.arrival))
+        return departure_airports, arrival_airports
     departure_airports = sorted(list(set(flight['起飞机场'] for flight in flights)))
     arrival_airports = sorted(list(set(flight['降落机场'] for flight in flights)))
     return departure_airports, arrival_airports
 
-def beautify_schedule(schedule_str):
-    """美化班期显示，将数字转换为周一到周日"""
+def _beautify_schedule_text(schedule_str):
+    """把班期数字串转换为周一到周日的显示文本"""
     if not schedule_str:
         return ""
     
@@ -166,8 +208,67 @@ def beautify_schedule(schedule_str):
     # 其他情况按顺序显示
     return " ".join(days)
 
-def query_flights(flights, departure=None, arrival=None, flight_id=None, category=None):
-    """查询航班"""
+# 所有星期位掩码对应的班期显示文本（导入时已把班期解析为位掩码，渲染时直接查表）
+_SCHEDULE_LABELS = tuple(_beautify_schedule_text(format_weekday_mask(mask)) for mask in range(128))
+
+def beautify_weekday_mask(mask):
+    """美化星期位掩码显示"""
+    return _SCHEDULE_LABELS[mask & 0x7F]
+
+def beautify_schedule(schedule_str):
+    """美化班期显示，将数字转换为周一到周日"""
+    if not schedule_str:
+        return ""
+    return beautify_weekday_mask(parse_weekday_mask(schedule_str))
+
+def flights_to_table_rows(flights):
+    """把航班转换为Dataframe行（航班号、起飞机场、降落机场、起飞时间、班期、适用产品）"""
+    if isinstance(flights, FlightRows):
+        # 列式数据表直接读取驻留ID和预解析的班期掩码
+        table = flights.table
+        indices = range(len(table)) if flights.indices is None else flights.indices
+        return [[table.flight_numbers[table.flight_no[i]], table.airports[table.departure[i]],
+                 table.airports[table.arrival[i]], format_time_minutes(table.dep_minutes[i]),
+                 beautify_weekday_mask(table.weekdays[i]), table.products[table.product[i]]]
+                for i in indices]
+    return [[flight['航班号'], flight['起飞机场'], flight['降落机场'],
+             flight['起飞时间'], beautify_schedule(flight['班期']), flight['适用产品']]
+            for flight in flights]
+
+def query_flights(flights, departure=None, arrival=None, flight_id=None, category=None,
+                  weekday=None, time_from=None, time_to=None):
+    """
+    查询航班
+
+    Args:
+        weekday: 班期，如 "5" 表示周五执飞，"67" 表示周六或周日执飞
+        time_from: 最早起飞时间，如 "6:00"
+        time_to: 最晚起飞时间，如 "10:00"，早于最早起飞时间时视为跨越零点
+    """
+    results = query_flights_with_explain(flights, departure, arrival, flight_id, category,
+                                         weekday, time_from, time_to)[0]
+    return list(results)
+
+def query_flights_with_explain(flights, departure=None, arrival=None, flight_id=None, category=None,
+                               weekday=None, time_from=None, time_to=None):
+    """
+    查询航班并返回索引执行统计
+
+    Returns:
+        (航班列表, 执行统计)，完整数据表走位图倒排索引和起飞时间有序索引，返回行视图，
+        执行统计包含各条件候选集大小、结果数和耗时；其他航班列表逐条扫描，执行统计为None
+    """
+    weekday_mask = parse_weekday_mask(weekday) if weekday else None
+    minutes_from = parse_time_minutes(time_from) if time_from else None
+    minutes_to = parse_time_minutes(time_to) if time_to else None
+
+    if isinstance(flights, FlightRows) and flights.indices is None:
+        result = get_flight_index(flights.table).query(departure, arrival, flight_id, category,
+                                                       weekday_mask, minutes_from, minutes_to)
+        return flights.table.rows(result.row_ids), result.explain
+
+    low = 0 if minutes_from is None else minutes_from
+    high = 24 * 60 - 1 if minutes_to is None else minutes_to
     results = []
     for flight in flights:
         match = True
@@ -178,266 +279,351 @@ def query_flights(flights, departure=None, arrival=None, flight_id=None, categor
             match = False
         if flight_id and flight['航班号'] != flight_id:
             match = False
-        if category and category not in flight['适用产品']:
+        if category and not set(parse_product_codes(category)) <= set(parse_product_codes(flight['适用产品'])):
+            match = False
+        if weekday_mask and not weekday_mask & parse_weekday_mask(flight['班期']):
             match = False
+        if minutes_from is not None or minutes_to is not None:
+            minutes = parse_time_minutes(flight['起飞时间'])
+            if not (low <= minutes <= high if low <= high else minutes >= low or minutes <= high):
+                match = False
             
         if match:
             results.append(flight)
     
-    return results
+    return results, None
+
+def get_product_category_choices(flights, departure=None, arrival=None):
+    """
+    获取带航班数的会员类型下拉选项
+
+    Returns:
+        [(显示标签, 会员类型)] 列表，标签中附带当前起降机场条件下的航班数
+    """
+    if isinstance(flights, FlightRows) and flights.indices is None:
+        counts = get_flight_index(flights.table).product_facets(PRODUCT_CATEGORIES, departure, arrival)
+    else:
+        counts = {category: len(query_flights(flights, departure, arrival, None, category))
+                  for category in PRODUCT_CATEGORIES}
+    return [(f"{category}（{counts[category]} 班）", category) for category in PRODUCT_CATEGORIES]
 
-def create_flight_map(flights_data=None):
-    """创建航班地图（带缓存）"""
-    import folium
-    from folium.plugins import GroupedLayerControl, Fullscreen
+def _render_map(namespace, query, build_layers, dataset=None):
+    """
+    渲染地图HTML
+
+    启用地图数据接口且提供了查询条件时，只输出从接口加载外壳和叠加层数据的iframe；
+    否则生成叠加层并注入预渲染的底图外壳
+    """
+    map_type, container_type = MAP_RENDER_TARGETS[namespace]
+    map_data_store = get_map_data_store()
+    if map_data_store.enabled and query is not None:
+        dataset = dataset or get_flight_dataset()
+        map_shell = get_global_map_instance(map_type)
+        map_html = map_shell.remote_html(map_data_store.shell_url(map_shell),
+                                         map_data_store.data_url(namespace, dataset.version, query))
+        return create_map_container_html_app(map_html, container_type)
+    
+    overlay_map = create_base_map(map_type=map_type)
+    for layer in build_layers():
+        layer.add_to(overlay_map)
     
-    # 检查缓存（仅当使用默认数据时）
-    if flights_data is None:
-        cache_key = "flight_map_default"
-        if cache_key in _map_cache:
-            return _map_cache[cache_key]
+    # 使用应用级资源管理器创建优化的地图HTML
+    try:
+        map_html = create_optimized_map_html_app(overlay_map, container_type)
+    except Exception as e:
+        print(f"地图HTML生成失败，使用备用方法: {e}")
+        # 备用方法：直接生成HTML
+        map_html = overlay_map._repr_html_()
     
-    # 如果没有提供数据，加载默认数据
+    return map_html
+
+def query_map_flights(query, dataset=None):
+    """
+    由地图查询条件得到要绘制的航班
+
+    Args:
+        query: normalize_flight_query 的结果，或 {'sample': 数量}（前若干条示例）、{'scope': 'all'}（全部航班）
+    """
+    flights = (dataset or get_flight_dataset()).flights
+    if query.get('sample'):
+        return flights[:int(query['sample'])]
+    if query.get('scope') == 'all':
+        return flights
+    weekday = query.get('weekday')
+    time_from = query.get('time_from')
+    time_to = query.get('time_to')
+    return query_flights(flights, query.get('departure'), query.get('arrival'), None, query.get('category'),
+                         format_weekday_mask(weekday) if weekday else None,
+                         format_time_minutes(time_from) if time_from is not None else None,
+                         format_time_minutes(time_to) if time_to is not None else None)
+
+def create_flight_map(flights_data=None, query=None, dataset=None):
+    """
+    创建航班地图（带缓存）
+
+    Args:
+        flights_data: 要绘制的航班，None表示全部航班
+        query: 得到这些航班的查询条件（见 query_map_flights），
+               启用地图数据接口时地图按该条件从接口加载航线数据
+        dataset: 航班所属的数据集
+    """
+    # 未提供数据时渲染全部航班，结果按数据版本缓存
     if flights_data is None:
-        flights_data = load_flight_data('data/hainan_plus_flights.jsonl')
+        dataset = get_flight_dataset()
+        return get_cached_render('flight_map', {'scope': 'all'},
+                                 lambda: create_flight_map(dataset.flights, {'scope': 'all'}, dataset), dataset)
     
-    print(f"🗺️ 创建航班地图，数据量: {len(flights_data)}")
+    return _render_map('flight_map', query, lambda: build_flight_layers(flights_data), dataset)
+
+def build_flight_layers(flights_data, level_url=None):
+    """
+    生成航班地图的叠加层
+
+    航班数不超过 FLIGHT_MAP_DETAIL_LIMIT 时逐航班绘制；否则按缩放级别切换，
+    缩小时绘制机场聚类和合并后的往返航线，放大到最细级别才逐航班绘制
+
+    Args:
+        level_url: level_url(级别序号) -> 该级别的数据接口地址，None表示全部级别内联
+    """
+    if flights_data and len(flights_data) > FLIGHT_MAP_DETAIL_LIMIT:
+        return [_level_of_detail_layer(lambda level: build_flight_level_layers(flights_data, level), level_url,
+                                       name='航线和机场')]
+    return _build_flight_detail_layers(flights_data)
+
+def build_flight_level_layers(flights_data, level):
+    """生成航班地图一个细节级别的图层"""
+    if level.cell_degrees <= 0:
+        return _build_flight_detail_layers(flights_data)
+    lod = get_level_of_detail(get_flight_aggregates(flights_data), airport_coords, level)
+    return [_cluster_layer(
+        lod,
+        styles={
+            'route': {'color': '#6366f1', 'opacity': 0.6},
+            'cluster': {'color': '#ef4444', 'fill': True, 'fillOpacity': 0.7, 'weight': 2}
+        },
+        name='航线和机场'
+    )]
+
+def _build_flight_detail_layers(flights_data):
+    """逐航班生成航线和起降机场图层"""
+    from map_overlays import FeatureCollectionLayer, point_feature
     
-    # 初始化已显示机场集合
-    shown_airports = set()
-    # 创建基础地图
-    flight_map = create_base_map(location=[35.8617, 104.1954], zoom_start=4, map_type="flight")
+    print(f"🗺️ 创建航班地图，数据量: {len(flights_data)}")
     
-    # 创建航线图层组
-    flight_group = folium.FeatureGroup(
-        name='航线和机场',
-        overlay=True,
-        control=True,
-        show=True
-    )
+    # 航线和机场要素（整体作为一个GeoJSON图层渲染）
+    features = []
     
     if flights_data and len(flights_data) > 0:
         print(f"🗺️ 处理航班数据，共 {len(flights_data)} 条记录")
-        # 首先按起降点对航班进行分组
-        route_groups = {}
-        for flight in flights_data:
-            # 处理字典格式的数据
-            if isinstance(flight, dict):
-                dep = flight['起飞机场']
-                arr = flight['降落机场']
-                flight_id = flight['航班号']
-                flight_time = flight['起飞时间']
-                flight_schedule = flight['班期']
-            else:
-                # 处理列表格式的数据（向后兼容）
-                dep = flight[1]
-                arr = flight[2]
-                flight_id = flight[0]
-                flight_time = flight[3]
-                flight_schedule = flight[4]
-            
-            route_key = (dep, arr)
-            if route_key not in route_groups:
-                route_groups[route_key] = []
-            route_groups[route_key].append(flight)
+        # 机场起降航班数从聚合统计读取
+        aggregates = get_flight_aggregates(flights_data)
         
-        print(f"🗺️ 找到 {len(route_groups)} 条航线")
-        # 为每个起降点对绘制航线
-        valid_routes = 0
-        for route_key, flights in route_groups.items():
-            dep, arr = route_key
-            if dep in airport_coords and arr in airport_coords:
-                valid_routes += 1
-                dep_coords = airport_coords[dep]
-                arr_coords = airport_coords[arr]
-                
-                # 计算基础距离和方向
-                dist = ((dep_coords[1] - arr_coords[1]) ** 2 + 
-                       (dep_coords[0] - arr_coords[0]) ** 2) ** 0.5
-                base_curve = dist * 0.15
-                
-                # 根据同航线数量调整曲率
-                num_flights = len(flights)
-                for idx, flight in enumerate(flights):
-                    # 提取航班信息
-                    if isinstance(flight, dict):
-                        flight_id = flight['航班号']
-                        flight_time = flight['起飞时间']
-                        flight_schedule = flight['班期']
-                    else:
-                        flight_id = flight[0]
-                        flight_time = flight[3]
-                        flight_schedule = flight[4]
-                    
-                    # 计算每条航线的偏移量
-                    if num_flights > 1:
-                        # 将多条航线分散开
-                        offset = (idx - (num_flights - 1) / 2) * (base_curve * 0.5)
-                    else:
-                        offset = 0
-                    
-                    # 计算中点位置
-                    mid_lat = (dep_coords[0] + arr_coords[0]) / 2
-                    mid_lon = (dep_coords[1] + arr_coords[1]) / 2
-                    
-                    # 根据经度和航班索引调整曲率方向
-                    if (dep_coords[1] + arr_coords[1]) / 2 < 105:
-                        mid_lat += base_curve + offset
-                    else:
-                        mid_lat -= base_curve + offset
-                    
-                    # 创建弧线坐标列表
-                    line_coords = [
-                        dep_coords,
-                        [mid_lat, mid_lon],
-                        arr_coords
-                    ]
-                    
-                    # 生成渐变色
-                    color = f'#{hash(flight_id) % 0xFFFFFF:06x}'  # 根据航班号生成不同颜色
-                    
-                    # 添加航线
-                    folium.PolyLine(
-                        locations=line_coords,
-                        weight=3,
-                        color=color,
-                        opacity=0.7,
-                        popup=f"""
-                        <div style='font-family: Arial; font-size: 12px;'>
-                            <b>航班号:</b> {flight_id}<br>
-                            <b>航线:</b> {dep} → {arr}<br>
-                            <b>时间:</b> {flight_time}<br>
-                            <b>班期:</b> {flight_schedule}
-                        </div>
-                        """,
-                        tooltip=f"{flight_id}: {dep} → {arr}",
-                        smooth_factor=0.2,
-                        dash_array='5, 10'
-                    ).add_to(flight_group)
-                
-                # 只添加一次起降点标记
-                if dep not in shown_airports:
-                    # 计算起飞机场的航班数
-                    if isinstance(flights_data[0], dict):
-                        dep_count = len([f for f in flights_data if f['起飞机场'] == dep])
-                    else:
-                        dep_count = len([f for f in flights_data if f[1] == dep])
-                    
-                    folium.CircleMarker(
-                        location=dep_coords,
-                        radius=6,
-                        color='#ef4444',
-                        fill=True,
-                        fillOpacity=0.7,
-                        weight=2,
-                        popup=f"""
-                        <div style='font-family: Arial; font-size: 12px;'>
-                            <b>{dep}</b><br>
-                            起飞机场<br>
-                            航班数: {dep_count}
-                        </div>
-                        """,
-                        tooltip=dep
-                    ).add_to(flight_group)
-                    shown_airports.add(dep)
-                
-                if arr not in shown_airports:
-                    # 计算降落机场的航班数
-                    if isinstance(flights_data[0], dict):
-                        arr_count = len([f for f in flights_data if f['降落机场'] == arr])
-                    else:
-                        arr_count = len([f for f in flights_data if f[2] == arr])
-                    
-                    folium.CircleMarker(
-                        location=arr_coords,
-                        radius=6,
-                        color='#22c55e',
-                        fill=True,
-                        fillOpacity=0.7,
-                        weight=2,
-                        popup=f"""
-                        <div style='font-family: Arial; font-size: 12px;'>
-                            <b>{arr}</b><br>
-                            降落机场<br>
-                            航班数: {arr_count}
-                        </div>
-                        """,
-                        tooltip=arr
-                    ).add_to(flight_group)
-                    shown_airports.add(arr)
+        # 当前数据集的查询结果由按机场缓存的航线片段拼接，其他航班列表直接生成
+        line_features = _compose_flight_lines(flights_data, aggregates)
+        if line_features is None:
+            route_groups = _group_flights_by_route(flights_data)
+            print(f"🗺️ 找到 {len(route_groups)} 条航线")
+            line_features = [feature for _, feature in _flight_line_features(route_groups)]
+        features.extend(line_features)
         
-        print(f"🗺️ 有效航线数量: {valid_routes}，显示机场数量: {len(shown_airports)}")
-    
-    # 添加航线图层组到地图
-    flight_group.add_to(flight_map)
-    
-    # 添加图层控制器
-    folium.LayerControl(
-        position='topright',
-        collapsed=False
-    ).add_to(flight_map)
-    
-    # 全屏控件已在全局地图实例中添加，无需重复添加
-    
-    # 使用应用级资源管理器创建优化的地图HTML
-    try:
-        map_html = create_optimized_map_html_app(flight_map, "flight_map")
-    except Exception as e:
-        print(f"地图HTML生成失败，使用备用方法: {e}")
-        # 备用方法：直接生成HTML
-        map_html = flight_map._repr_html_()
-    
-    # 缓存结果（仅当使用默认数据时）
-    if flights_data is None:
-        _map_cache["flight_map_default"] = map_html
-    
-    return map_html
+        # 起降机场标记，每个机场只添加一次（同时有起降时显示为起飞机场），按机场名排序，
+        # 行视图和字典列表的聚合统计顺序不同，排序后输出一致
+        shown_airports = set()
+        for airport, dep_count in sorted(aggregates.dep_counts.items()):
+            if airport in airport_coords:
+                features.append(point_feature(airport_coords[airport], 'departure',
+                                              data={'name': airport, 'count': dep_count}))
+                shown_airports.add(airport)
+        for airport, arr_count in sorted(aggregates.arr_counts.items()):
+            if airport in airport_coords and airport not in shown_airports:
+                features.append(point_feature(airport_coords[airport], 'arrival',
+                                              data={'name': airport, 'count': arr_count}))
+                shown_airports.add(airport)
+        
+        print(f"🗺️ 航线数量: {len(line_features)}，显示机场数量: {len(shown_airports)}")
+    
+    # 航线图层，同类要素共用样式
+    return [FeatureCollectionLayer(
+        features,
+        styles={
+            'flight': {'weight': 3, 'opacity': 0.7, 'dashArray': '5, 10', 'smoothFactor': 0.2},
+            'departure': {'radius': 6, 'color': '#ef4444', 'fill': True, 'fillOpacity': 0.7, 'weight': 2},
+            'arrival': {'radius': 6, 'color': '#22c55e', 'fill': True, 'fillOpacity': 0.7, 'weight': 2}
+        },
+        name='航线和机场',
+        popups={
+            'flight': "<div class='fm-popup'><b>航班号:</b> {id}<br><b>航线:</b> {dep} → {arr}<br>"
+                      "<b>时间:</b> {time}<br><b>班期:</b> {schedule}</div>",
+            'departure': "<div class='fm-popup'><b>{name}</b><br>起飞机场<br>航班数: {count}</div>",
+            'arrival': "<div class='fm-popup'><b>{name}</b><br>降落机场<br>航班数: {count}</div>"
+        },
+        tooltips={'flight': '{id}: {dep} → {arr}', 'departure': '{name}', 'arrival': '{name}'}
+    )]
+
+def _group_flights_by_route(flights_data):
+    """按 (起飞机场, 降落机场) 对航班分组"""
+    route_groups = {}
+    for flight in flights_data:
+        # 处理字典格式和列表格式（向后兼容）的数据
+        if isinstance(flight, Mapping):
+            route_key = (flight['起飞机场'], flight['降落机场'])
+        else:
+            route_key = (flight[1], flight[2])
+        route_groups.setdefault(route_key, []).append(flight)
+    return route_groups
+
+def _flight_line_properties(flight):
+    """航线要素的样式和模板数据（不含几何，与同航线的航班数无关）"""
+    # 处理字典格式和列表格式（向后兼容）的数据
+    if isinstance(flight, Mapping):
+        flight_id = flight['航班号']
+        dep, arr = flight['起飞机场'], flight['降落机场']
+        flight_time = flight['起飞时间']
+        flight_schedule = flight['班期']
+    else:
+        flight_id, dep, arr, flight_time, flight_schedule = flight[:5]
+    
+    # 生成渐变色
+    color = f'#{hash(flight_id) % 0xFFFFFF:06x}'  # 根据航班号生成不同颜色
+    return {'color': color}, {'id': flight_id, 'dep': dep, 'arr': arr, 'time': flight_time, 'schedule': flight_schedule}
+
+def _flight_line_features(route_groups, properties_of=_flight_line_properties):
+    """
+    生成航线要素，同航线的航班沿大圆弧线展开成扇形
+
+    Args:
+        route_groups: {(起飞机场, 降落机场): [航班, ...]}，扇形按每条航线实际绘制的航班数分配位置
+        properties_of: properties_of(航班) -> (样式, 模板数据)
+
+    Returns:
+        [(航班, 航线要素)]，起降机场没有坐标的航班不绘制
+    """
+    from map_overlays import line_feature
+    
+    # 一次性批量计算所有航线的大圆弧线
+    route_arcs = get_route_arcs(airport_coords, [
+        (dep, arr, len(flights)) for (dep, arr), flights in route_groups.items()
+        if dep in airport_coords and arr in airport_coords
+    ])
+    result = []
+    for (dep, arr), flights in route_groups.items():
+        if dep not in airport_coords or arr not in airport_coords:
+            continue
+        arcs = route_arcs[(dep, arr, len(flights))]
+        for idx, flight in enumerate(flights):
+            style, data = properties_of(flight)
+            result.append((flight, line_feature(arcs[idx], 'flight', style=style, data=data)))
+    return result
+
+def get_flight_map_fragment(side, airport, dataset=None):
+    """
+    获取机场的航线片段：从该机场起飞（side='departure'）或在该机场降落（side='arrival'）的
+    全部航班的航线样式和模板数据，按数据版本缓存，增量更新只失效涉及的机场
+
+    片段不含几何：扇形位置取决于查询结果中同航线的航班数，拼接时再分配
+
+    Returns:
+        {行号: ((起飞机场, 降落机场), 样式, 模板数据)}
+    """
+    dataset = dataset or get_flight_dataset()
+    
+    def build():
+        index = get_flight_index(dataset.table)
+        if side == 'departure':
+            row_ids = index.query(departure=airport).row_ids
+        else:
+            row_ids = index.query(arrival=airport).row_ids
+        fragment = {}
+        for row_id, flight in zip(row_ids, dataset.table.rows(row_ids)):
+            style, data = _flight_line_properties(flight)
+            fragment[row_id] = ((data['dep'], data['arr']), style, data)
+        return fragment
+    
+    return _render_cache.get_or_create('flight_map_fragment', dataset.version, {side: airport}, build,
+                                       renderer_version=MAP_RENDERER_VERSION, airports=(airport,))
+
+def _compose_flight_lines(flights_data, aggregates):
+    """
+    由机场航线片段拼接查询结果的航线要素，结果与逐航班生成相同
+
+    Returns:
+        航线要素列表；航班不是当前数据集的行视图时返回None
+    """
+    dataset = get_flight_dataset()
+    if not isinstance(flights_data, FlightRows) or flights_data.table is not dataset.table:
+        return None
+    
+    table = dataset.table
+    # 选用涉及机场较少的一侧（如"从X出发"的查询只需X的起飞片段）
+    if len(aggregates.arr_counts) < len(aggregates.dep_counts):
+        side, column, airports = 'arrival', table.arrival, aggregates.arr_counts
+    else:
+        side, column, airports = 'departure', table.departure, aggregates.dep_counts
+    fragments = {airport: get_flight_map_fragment(side, airport, dataset) for airport in airports}
+    
+    # 按查询结果中的行分组，扇形位置按各航线选中的航班数重新分配
+    route_groups = {}
+    row_ids = range(len(table)) if flights_data.indices is None else flights_data.indices
+    for row_id in row_ids:
+        route, style, data = fragments[table.airports[column[row_id]]][row_id]
+        route_groups.setdefault(route, []).append((style, data))
+    return [feature for _, feature in _flight_line_features(route_groups, properties_of=lambda entry: entry)]
 
 def create_airport_distribution_map():
     """创建机场分布地图（带缓存）"""
-    import folium
-    from folium.plugins import HeatMap
-    
-    # 检查缓存
-    cache_key = "airport_distribution_map"
-    if cache_key in _map_cache:
-        return _map_cache[cache_key]
-    
-    # 加载航班数据（只加载一次）
-    flights_data = load_flight_data('data/hainan_plus_flights.jsonl')
+    # 结果按数据版本缓存
+    dataset = get_flight_dataset()
+    return get_cached_render('distribution_map', None, lambda: _render_airport_distribution_map(dataset), dataset)
+
+def _render_airport_distribution_map(dataset):
+    """渲染机场分布地图"""
+    return _render_map('distribution_map', {}, lambda: build_distribution_layers(dataset), dataset)
+
+# 机场分布图的机场卡片弹窗（样式见 map_overlays.POPUP_CSS）
+AIRPORT_CARD_POPUP = (
+    "<div class='fm-card'>"
+    "<div class='fm-card-title'>✈️ {name}</div>"
+    "<div class='fm-card-body'>"
+    "<div class='fm-card-row'><span class='fm-card-dep'>🛫 起飞:</span><span>{dep} 班</span></div>"
+    "<div class='fm-card-row'><span class='fm-card-arr'>🛬 降落:</span><span>{arr} 班</span></div>"
+    "<hr>"
+    "<div class='fm-card-row fm-card-total'><span>📊 总计:</span><span>{total} 班</span></div>"
+    "</div>"
+    "<div class='fm-card-footer'>📍 坐标: {lat}, {lng}</div>"
+    "</div>"
+)
+
+def build_distribution_layers(dataset):
+    """生成机场分布地图的叠加层（航班密度热力图和机场标记）"""
+    from map_overlays import FeatureCollectionLayer, HeatLayer, point_feature
     
-    # 创建基础地图
-    distribution_map = create_base_map(location=[35.8617, 104.1954], zoom_start=4, map_type="distribution")
+    # 使用共享数据快照的聚合统计
+    aggregates = get_flight_aggregates(dataset.flights)
+    layers = []
     
     # 准备热力图数据
     heat_data = []
     airport_stats = {}  # 缓存机场统计
     
     for airport, coords in airport_coords.items():
-        # 计算该机场的航班数量
-        dep_count = len([f for f in flights_data if f['起飞机场'] == airport])
-        arr_count = len([f for f in flights_data if f['降落机场'] == airport])
-        total_count = dep_count + arr_count
-        
-        airport_stats[airport] = {'dep': dep_count, 'arr': arr_count, 'total': total_count}
+        # 该机场的航班数量
+        airport_stats[airport] = aggregates.airport_stats(airport)
+        total_count = airport_stats[airport]['total']
         
         if total_count > 0:
             heat_data.append([coords[0], coords[1], total_count])
     
-    # 创建热力图图层组
-    heatmap_group = folium.FeatureGroup(name='机场航班密度', show=True)
-    
     # 添加热力图
-    if heat_data:
-        HeatMap(
-            heat_data,
-            name='机场航班密度',
-            min_opacity=0.3,
-            max_opacity=0.8,
-            max_zoom=18,
-            radius=30,
-            blur=20,
-            gradient={
+    layers.append(HeatLayer(
+        heat_data,
+        name='机场航班密度',
+        options={
+            'minOpacity': 0.3,
+            'maxOpacity': 0.8,
+            'maxZoom': 18,
+            'radius': 30,
+            'blur': 20,
+            'gradient': {
                 0.0: 'blue',      # 低密度 - 蓝色
                 0.2: 'cyan',      # 中低密度 - 青色
                 0.4: 'lime',      # 中密度 - 绿色
@@ -445,13 +631,11 @@ def create_airport_distribution_map():
                 0.8: 'orange',    # 高密度 - 橙色
                 1.0: 'red'        # 极高密度 - 红色
             }
-        ).add_to(heatmap_group)
-    
-    # 添加热力图图层组到地图
-    heatmap_group.add_to(distribution_map)
+        }
+    ))
     
-    # 创建机场标记图层组
-    airport_markers_group = folium.FeatureGroup(name='机场标记', show=True)
+    # 机场标记要素
+    marker_features = []
     
     # 添加机场标记
     for airport, coords in airport_coords.items():
@@ -477,223 +661,205 @@ def create_airport_distribution_map():
                 fill_color = '#2ecc71'
             
             # 创建机场标记
-            folium.CircleMarker(
-                location=coords,
-                radius=radius,
-                popup=folium.Popup(
-                    f"""
-                    <div style='
-                        font-family: "Segoe UI", Arial, sans-serif;
-                        font-size: 14px;
-                        line-height: 1.4;
-                        min-width: 200px;
-                        padding: 10px;
-                    '>
-                        <div style='
-                            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                            color: white;
-                            padding: 8px 12px;
-                            margin: -10px -10px 10px -10px;
-                            border-radius: 5px 5px 0 0;
-                            font-weight: bold;
-                            font-size: 16px;
-                            text-align: center;
-                        '>
-                            ✈️ {airport}
-                        </div>
-                        <div style='padding: 5px 0;'>
-                            <div style='display: flex; justify-content: space-between; margin: 5px 0;'>
-                                <span style='color: #e74c3c; font-weight: bold;'>🛫 起飞:</span>
-                                <span style='font-weight: bold;'>{stats['dep']} 班</span>
-                            </div>
-                            <div style='display: flex; justify-content: space-between; margin: 5px 0;'>
-                                <span style='color: #27ae60; font-weight: bold;'>🛬 降落:</span>
-                                <span style='font-weight: bold;'>{stats['arr']} 班</span>
-                            </div>
-                            <hr style='margin: 10px 0; border: none; border-top: 2px solid #ecf0f1;'>
-                            <div style='display: flex; justify-content: space-between; margin: 5px 0;'>
-                                <span style='color: #2c3e50; font-weight: bold; font-size: 15px;'>📊 总计:</span>
-                                <span style='font-weight: bold; font-size: 15px; color: #e74c3c;'>{total_count} 班</span>
-                            </div>
-                        </div>
-                        <div style='
-                            background: #f8f9fa;
-                            padding: 8px;
-                            margin: 10px -10px -10px -10px;
-                            border-radius: 0 0 5px 5px;
-                            font-size: 12px;
-                            color: #6c757d;
-                            text-align: center;
-                        '>
-                            📍 坐标: {coords[0]:.4f}, {coords[1]:.4f}
-                        </div>
-                    </div>
-                    """,
-                    max_width=250
-                ),
-                tooltip=f"{airport} ({total_count} 班)",
-                color=color,
-                fill=True,
-                fillColor=fill_color,
-                fillOpacity=0.8,
-                weight=2
-            ).add_to(airport_markers_group)
-    
-    # 添加机场标记图层组到地图
-    airport_markers_group.add_to(distribution_map)
-    
-    # 添加图层控制器
-    folium.LayerControl(
-        position='topright',
-        collapsed=False,
-        autoZIndex=True
-    ).add_to(distribution_map)
-    
-    # 使用应用级资源管理器创建优化的地图HTML
-    try:
-        map_html = create_optimized_map_html_app(distribution_map, "airport_distribution")
-    except Exception as e:
-        print(f"地理分布地图HTML生成失败，使用备用方法: {e}")
-        # 备用方法：直接生成HTML
-        map_html = distribution_map._repr_html_()
+            marker_features.append(point_feature(
+                coords,
+                'airport',
+                style={'radius': radius, 'color': color, 'fillColor': fill_color},
+                data={'name': airport, 'dep': stats['dep'], 'arr': stats['arr'], 'total': total_count}
+            ))
+    
+    # 机场标记图层
+    layers.append(FeatureCollectionLayer(
+        marker_features,
+        styles={'airport': {'fill': True, 'fillOpacity': 0.8, 'weight': 2, 'popupMaxWidth': 250}},
+        name='机场标记',
+        popups={'airport': AIRPORT_CARD_POPUP},
+        tooltips={'airport': '{name} ({total} 班)'}
+    ))
     
-    # 缓存结果
-    _map_cache[cache_key] = map_html
-    return map_html
+    return layers
 
 def create_route_network_chart(flights_data=None):
     """创建航线网络图（带缓存）"""
-    import folium
-    
-    # 检查缓存
-    cache_key = "route_network_map"
-    if cache_key in _map_cache and flights_data is None:
-        return _map_cache[cache_key]
-    
-    # 如果没有提供数据，加载默认数据
+    # 未提供数据时使用全部航班，结果按数据版本缓存
     if flights_data is None:
-        flights_data = load_flight_data('data/hainan_plus_flights.jsonl')
+        dataset = get_flight_dataset()
+        return get_cached_render('route_network', None,
+                                 lambda: _render_map('route_network', {}, lambda: build_network_layers(dataset.flights),
+                                                     dataset), dataset)
     
-    # 创建基础地图
-    network_map = create_base_map(location=[35.8617, 104.1954], zoom_start=4, map_type="network")
-    
-    # 统计航线频次
-    route_counts = {}
-    for flight in flights_data:
-        dep = flight['起飞机场']
-        arr = flight['降落机场']
-        route = f"{dep} → {arr}"
-        route_counts[route] = route_counts.get(route, 0) + 1
-    
-    # 统计机场使用频次
-    airport_usage = {}
-    for route, count in route_counts.items():
-        dep, arr = route.split(' → ')
-        if dep in airport_coords and arr in airport_coords:
-            airport_usage[dep] = airport_usage.get(dep, 0) + count
-            airport_usage[arr] = airport_usage.get(arr, 0) + count
-    
-    # 绘制航线
-    for route, count in route_counts.items():
-        dep, arr = route.split(' → ')
-        if dep in airport_coords and arr in airport_coords:
-            dep_coords = airport_coords[dep]
-            arr_coords = airport_coords[arr]
-            
+    return _render_map('route_network', None, lambda: build_network_layers(flights_data))
+
+def build_network_layers(flights_data, level_url=None):
+    """
+    生成航线网络图的叠加层（航线、机场标记和名称标签），按缩放级别切换聚合程度
+
+    Args:
+        level_url: level_url(级别序号) -> 该级别的数据接口地址，None表示全部级别内联
+    """
+    return [_level_of_detail_layer(lambda level: build_network_level_layers(flights_data, level), level_url,
+                                   name='航线网络', control=False)]
+
+def build_network_level_layers(flights_data, level):
+    """生成航线网络图一个细节级别的图层"""
+    lod = get_level_of_detail(get_flight_aggregates(flights_data), airport_coords, level)
+    return [_cluster_layer(
+        lod,
+        styles={
+            'route': {'color': '#3186cc', 'opacity': 0.6},
+            'cluster': {'color': '#e74c3c', 'fill': True, 'fillOpacity': 0.8, 'weight': 2},
+            'label': {'iconSize': [60, 20], 'iconAnchor': [30, 10]}
+        },
+        name='航线网络',
+        control=False,
+        label_css=(
+            'font-family: Arial, sans-serif; font-size: 11px; font-weight: bold; color: #2c3e50; '
+            'background-color: rgba(255, 255, 255, 0.8); padding: 2px 4px; border-radius: 3px; '
+            'border: 1px solid #bdc3c7; white-space: nowrap; text-shadow: 1px 1px 1px rgba(255, 255, 255, 0.8);'
+        )
+    )]
+
+def _cluster_layer(lod, styles, **kwargs):
+    """
+    由细节级别生成图层：机场聚类标记、聚类之间合并的往返航线和前N个名称标签
+
+    Args:
+        lod: map_lod.MapLevelOfDetail
+        styles: route / cluster / label 要素类型的样式
+    """
+    from map_overlays import FeatureCollectionLayer, line_feature, point_feature
+    from route_arcs import great_circle_arcs
+    
+    # 航线、机场标记和名称标签要素（整体作为一个GeoJSON图层渲染）
+    features = []
+    
+    # 航线按大圆绘制，往返航线合并为一条
+    if lod.edges:
+        arcs = great_circle_arcs([lod.clusters[a].center for a, _, _ in lod.edges],
+                                 [lod.clusters[b].center for _, b, _ in lod.edges], NETWORK_ARC_POINTS)
+        for (a, b, count), arc in zip(lod.edges, arcs):
             # 根据频次调整线条粗细
-            weight = max(1, min(8, count / 5))
-            
-            # 绘制航线
-            folium.PolyLine(
-                locations=[dep_coords, arr_coords],
-                weight=weight,
-                color='#3186cc',
-                opacity=0.6,
-                popup=f"""
-                <div style='font-family: Arial; font-size: 12px;'>
-                    <b>{route}</b><br>
-                    航班数: {count}
-                </div>
-                """,
-                tooltip=f"{route}: {count} 班"
-            ).add_to(network_map)
-    
-    # 添加机场标记和名称标签
-    for airport, coords in airport_coords.items():
-        if airport in airport_usage:
-            usage_count = airport_usage[airport]
-            
-            # 根据使用频次调整标记大小
-            radius = max(4, min(12, usage_count / 20))
-            
-            # 添加机场标记
-            folium.CircleMarker(
-                location=coords,
-                radius=radius,
-                color='#e74c3c',
-                fill=True,
-                fillOpacity=0.8,
-                weight=2,
-                popup=f"""
-                <div style='font-family: Arial; font-size: 12px;'>
-                    <b>{airport}</b><br>
-                    总航班数: {usage_count}
-                </div>
-                """,
-                tooltip=airport
-            ).add_to(network_map)
-            
-            # 添加机场名称标签
-            folium.Marker(
-                location=[coords[0] + 0.5, coords[1] + 0.5],  # 稍微偏移避免重叠
-                icon=folium.DivIcon(
-                    html=f"""
-                    <div style="
-                        font-family: Arial, sans-serif;
-                        font-size: 11px;
-                        font-weight: bold;
-                        color: #2c3e50;
-                        background-color: rgba(255, 255, 255, 0.8);
-                        padding: 2px 4px;
-                        border-radius: 3px;
-                        border: 1px solid #bdc3c7;
-                        white-space: nowrap;
-                        text-shadow: 1px 1px 1px rgba(255, 255, 255, 0.8);
-                    ">
-                        {airport}
-                    </div>
-                    """,
-                    icon_size=(60, 20),
-                    icon_anchor=(30, 10)
-                )
-            ).add_to(network_map)
-    
-    # 使用应用级资源管理器创建优化的地图HTML
-    try:
-        map_html = create_optimized_map_html_app(network_map, "route_network")
-    except Exception as e:
-        print(f"航线网络地图HTML生成失败，使用备用方法: {e}")
-        # 备用方法：直接生成HTML
-        map_html = network_map._repr_html_()
-    
-    # 缓存结果（仅当使用默认数据时）
-    if flights_data is None:
-        _map_cache[cache_key] = map_html
-    
-    return map_html
+            features.append(line_feature(arc, 'route', style={'weight': max(1, min(8, count / 5))},
+                                         data={'a': lod.clusters[a].name, 'b': lod.clusters[b].name, 'count': count}))
+    
+    # 机场（聚类）标记，根据航班数调整大小
+    for cluster in lod.clusters:
+        features.append(point_feature(cluster.center, 'cluster', style={'radius': max(4, min(12, cluster.count / 20))},
+                                      data={'name': cluster.name, 'count': cluster.count}))
+    
+    # 名称标签（稍微偏移避免重叠）
+    if 'label' in styles:
+        for index in lod.labels:
+            cluster = lod.clusters[index]
+            features.append(point_feature([cluster.center[0] + 0.5, cluster.center[1] + 0.5], 'label',
+                                          label=cluster.name))
+    
+    return FeatureCollectionLayer(
+        features,
+        styles=styles,
+        popups={
+            'route': "<div class='fm-popup'><b>{a} ↔ {b}</b><br>往返航班数: {count}</div>",
+            'cluster': "<div class='fm-popup'><b>{name}</b><br>总航班数: {count}</div>"
+        },
+        tooltips={'route': '{a} ↔ {b}: {count} 班', 'cluster': '{name}'},
+        **kwargs
+    )
+
+def _level_of_detail_layer(build_level, level_url=None, **kwargs):
+    """
+    创建按缩放级别切换的图层
+
+    Args:
+        build_level: build_level(LodLevel) -> 该级别的图层列表
+        level_url: 远程加载时各级别的数据接口地址，只内联初始缩放级别
+    """
+    from map_overlays import LevelOfDetailLayer
+    
+    levels = []
+    for index, level in enumerate(LOD_LEVELS):
+        entry = {'minZoom': level.min_zoom, 'maxZoom': level.max_zoom}
+        if level_url is None or level.contains(DEFAULT_ZOOM):
+            entry['layers'] = build_level(level)
+        else:
+            entry['url'] = level_url(index)
+        levels.append(entry)
+    return LevelOfDetailLayer(levels, **kwargs)
+
+# 地图数据接口按查询条件重新生成叠加层
+def _map_layer_specs(layers):
+    return {'layers': [layer.to_spec() for layer in layers]}
+
+# 地图数据地址中的查询条件（normalize_flight_query 的结果，或示例、全部航班、细节级别）
+MAP_QUERY_FIELDS = {
+    'departure': str, 'arrival': str, 'category': str,
+    'weekday': int, 'time_from': int, 'time_to': int,
+    'sample': int, 'scope': str, 'lod': int
+}
+
+def check_map_query(query):
+    """检查地图数据地址中的查询条件，字段未知、类型或取值范围不对时抛出ValueError"""
+    for key, value in query.items():
+        expected = MAP_QUERY_FIELDS.get(key)
+        if expected is None:
+            raise ValueError(f"未知的查询字段: {key}")
+        if value is None:
+            continue
+        # bool 是 int 的子类，不能当作数值
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ValueError(f"查询字段 {key} 应为 {expected.__name__}: {value!r}")
+    weekday = query.get('weekday')
+    if weekday is not None and not 0 < weekday < 1 << 7:
+        raise ValueError(f"班期位掩码超出范围: {weekday}")
+    for key in ('time_from', 'time_to'):
+        if query.get(key) is not None and not 0 <= query[key] < 24 * 60:
+            raise ValueError(f"起飞时间超出范围: {query[key]}")
+    if query.get('sample') is not None and query['sample'] <= 0:
+        raise ValueError(f"示例航班数应为正数: {query['sample']}")
+    if query.get('scope') is not None and query['scope'] != 'all':
+        raise ValueError(f"未知的航班范围: {query['scope']}")
+    if query.get('lod') is not None and not 0 <= query['lod'] < len(LOD_LEVELS):
+        raise ValueError(f"细节级别超出范围: {query['lod']}")
+
+def _query_level(query):
+    """查询条件中的细节级别（lod 为级别序号），没有时返回None"""
+    if query.get('lod') is None:
+        return None
+    return LOD_LEVELS[query['lod']]
+
+def _level_urls(namespace, query, dataset):
+    return lambda index: _map_data_store.data_url(namespace, dataset.version, dict(query, lod=index))
+
+def _flight_map_data(query, dataset):
+    flights = query_map_flights(query, dataset)
+    level = _query_level(query)
+    if level is not None:
+        return _map_layer_specs(build_flight_level_layers(flights, level))
+    return _map_layer_specs(build_flight_layers(flights, _level_urls('flight_map', query, dataset)))
+
+def _route_network_data(query, dataset):
+    level = _query_level(query)
+    if level is not None:
+        return _map_layer_specs(build_network_level_layers(dataset.flights, level))
+    return _map_layer_specs(build_network_layers(dataset.flights, _level_urls('route_network', query, dataset)))
+
+_map_data_store = get_map_data_store()
+_map_data_store.register_builder('flight_map', _flight_map_data, MAP_RENDERER_VERSION,
+                                 airports_of=lambda query: (query.get('departure'), query.get('arrival')),
+                                 check_query=check_map_query)
+_map_data_store.register_builder(
+    'distribution_map', lambda query, dataset: _map_layer_specs(build_distribution_layers(dataset)),
+    MAP_RENDERER_VERSION, check_query=check_map_query)
+_map_data_store.register_builder('route_network', _route_network_data, MAP_RENDERER_VERSION,
+                                 check_query=check_map_query)
 
 def create_airport_bubble_chart(flights_data=None):
     """创建机场气泡图（使用经纬度坐标）"""
     if not flights_data:
-        flights_data = load_flight_data('data/hainan_plus_flights.jsonl')
+        flights_data = get_flight_dataset().flights
     
-    # 统计机场航班数
-    airport_counts = {}
-    for flight in flights_data:
-        dep = flight['起飞机场']
-        arr = flight['降落机场']
-        airport_counts[dep] = airport_counts.get(dep, 0) + 1
-        airport_counts[arr] = airport_counts.get(arr, 0) + 1
+    # 机场航班数
+    aggregates = get_flight_aggregates(flights_data)
+    airport_counts = {airport: aggregates.total_count(airport) for airport in aggregates.airports}
     
     # 准备经纬度数据
     lats = []
@@ -755,24 +921,15 @@ def create_airport_bubble_chart(flights_data=None):
 def create_stats_chart(flights_data=None):
     """创建统计图表"""
     if not flights_data:
-        flights_data = load_flight_data('data/hainan_plus_flights.jsonl')
+        flights_data = get_flight_dataset().flights
     
-    # 统计起飞机场
-    dep_counts = {}
-    arr_counts = {}
-    
-    for flight in flights_data:
-        dep = flight['起飞机场']
-        arr = flight['降落机场']
-        dep_counts[dep] = dep_counts.get(dep, 0) + 1
-        arr_counts[arr] = arr_counts.get(arr, 0) + 1
-    
-    # 获取所有机场
-    all_airports = sorted(set(dep_counts.keys()) | set(arr_counts.keys()))
+    # 机场起降航班数
+    aggregates = get_flight_aggregates(flights_data)
+    all_airports = aggregates.airports
     
     # 准备数据
-    dep_values = [dep_counts.get(airport, 0) for airport in all_airports]
-    arr_values = [arr_counts.get(airport, 0) for airport in all_airports]
+    dep_values = [aggregates.dep_count(airport) for airport in all_airports]
+    arr_values = [aggregates.arr_count(airport) for airport in all_airports]
     
     # 创建柱状图
     fig = go.Figure()
@@ -815,30 +972,24 @@ def create_stats_chart(flights_data=None):
     return fig
 
 # 标签页地图缓存
-_tab_map_cache = {}
-
 def get_cached_tab_map(map_type, create_func, *args, **kwargs):
     """获取缓存的标签页地图"""
-    global _tab_map_cache
-    
-    cache_key = f"tab_{map_type}"
-    
-    if cache_key not in _tab_map_cache:
+    def create():
         print(f"🗺️ 创建标签页地图缓存: {map_type}")
-        _tab_map_cache[cache_key] = create_func(*args, **kwargs)
+        return create_func(*args, **kwargs)
     
-    return _tab_map_cache[cache_key]
+    return get_cached_render('tab', {'map_type': map_type}, create)
 
 def clear_tab_map_cache():
     """清空标签页地图缓存"""
-    global _tab_map_cache
-    _tab_map_cache.clear()
+    _render_cache.invalidate('tab')
     print("🗑️ 标签页地图缓存已清理")
 
 def get_tab_cache_stats():
     """获取标签页缓存统计"""
-    global _tab_map_cache
+    keys = _render_cache.keys('tab')
     return {
-        'tab_cache_size': len(_tab_map_cache),
-        'cached_tabs': list(_tab_map_cache.keys())
+        'tab_cache_size': len(keys),
+        'cached_tabs': [dict(key[2]).get('map_type') for key in keys],
+        'stats': _render_cache.get_stats()['namespaces'].get('tab', {})
     }